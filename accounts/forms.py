@@ -20,6 +20,19 @@ class MultipleFileField(forms.FileField):
             if file:
                 cleaned_files.append(super().clean(file, initial))
         return cleaned_files
+class DirectUploadFormMixin:
+    """
+    При direct_upload=1 файлы загружаются браузером напрямую в бакет
+    и подтверждаются отдельно, поэтому файловые поля формы не обязательны.
+    """
+    direct_upload_fields = ("logo", "creatives", "proofs", "video")
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.is_direct_upload = self.data.get("direct_upload") == "1"
+        if self.is_direct_upload:
+            for field_name in self.direct_upload_fields:
+                if field_name in self.fields:
+                    self.fields[field_name].required = False
 class RegisterForm(forms.ModelForm):
     hp_field = forms.CharField(required=False, label="", widget=forms.TextInput(attrs={
         "autocomplete": "off",
@@ -68,7 +81,7 @@ class LoginForm(forms.Form):
         if hp_value:
             raise forms.ValidationError("Обнаружена подозрительная активность.")
         return cleaned_data
-class StartupForm(forms.ModelForm):
+class StartupForm(DirectUploadFormMixin, forms.ModelForm):
     logo = forms.ImageField(
         label="Логотип *",
         required=True,
@@ -279,7 +292,7 @@ class StartupForm(forms.ModelForm):
             cleaned_data["creatives"] = [creatives]
         else:
             cleaned_data["creatives"] = creatives if creatives else []
-        if len(cleaned_data.get("creatives", [])) == 0:
+        if len(cleaned_data.get("creatives", [])) == 0 and not self.is_direct_upload:
             self.add_error("creatives", "Загрузите хотя бы одно изображение (до 3 файлов).")
         elif len(cleaned_data.get("creatives", [])) > 3:
             self.add_error("creatives", "Можно прикрепить не более 3 изображений.")
@@ -291,7 +304,7 @@ class StartupForm(forms.ModelForm):
             cleaned_data["proofs"] = [proofs]
         else:
             cleaned_data["proofs"] = proofs if proofs else []
-        if len(cleaned_data.get("proofs", [])) == 0:
+        if len(cleaned_data.get("proofs", [])) == 0 and not self.is_direct_upload:
             self.add_error("proofs", "Загрузите хотя бы один документ (до 10 файлов).")
         elif len(cleaned_data.get("proofs", [])) > 10:
             self.add_error("proofs", "Можно прикрепить не более 10 документов.")
@@ -304,7 +317,7 @@ class StartupForm(forms.ModelForm):
         else:
             cleaned_data["video"] = videos if videos else []
 
-        if len(cleaned_data.get("video", [])) == 0:
+        if len(cleaned_data.get("video", [])) == 0 and not self.is_direct_upload:
             self.add_error("video", "Загрузите хотя бы одно видео (до 3 файлов).")
         elif len(cleaned_data.get("video", [])) > 3:
             self.add_error("video", "Можно прикрепить не более 3 видео.")
@@ -324,7 +337,7 @@ class DirectionModelChoiceField(forms.ModelChoiceField):
         }
         return translations.get(getattr(obj, "direction_name", str(obj)), getattr(obj, "direction_name", str(obj)))
 
-class FranchiseForm(forms.ModelForm):
+class FranchiseForm(DirectUploadFormMixin, forms.ModelForm):
     logo = forms.ImageField(label="Логотип *", required=True)
     creatives = MultipleFileField(required=True, help_text="Загрузите изображения (до 3 файлов: PNG, JPEG)")
     proofs = MultipleFileField(required=True, help_text="Загрузите документы (до 3 файлов: PDF, DOC, TXT)")
@@ -432,7 +445,7 @@ class FranchiseForm(forms.ModelForm):
             cleaned_data["proofs"] = proofs if proofs else []
         return cleaned_data
 
-class AgencyForm(forms.ModelForm):
+class AgencyForm(DirectUploadFormMixin, forms.ModelForm):
     logo = forms.ImageField(label="Логотип *", required=True)
     creatives = MultipleFileField(required=True, help_text="Загрузите изображения (до 3 файлов: PNG, JPEG)")
     proofs = MultipleFileField(required=True, help_text="Загрузите документы (до 3 файлов: PDF, DOC, TXT)")
@@ -522,7 +535,7 @@ class AgencyForm(forms.ModelForm):
             cleaned_data["proofs"] = proofs if proofs else []
         return cleaned_data
 
-class SpecialistForm(forms.ModelForm):
+class SpecialistForm(DirectUploadFormMixin, forms.ModelForm):
     logo = forms.ImageField(label="Логотип *", required=True)
     creatives = MultipleFileField(required=True, help_text="Загрузите изображения (до 3 файлов: PNG, JPEG)")
     proofs = MultipleFileField(required=True, help_text="Загрузите документы (до 3 файлов: PDF, DOC, TXT)")
@@ -0,0 +1,86 @@
+"""
+Management command для заполнения поля object_key у существующих файлов
+"""
+import collections
+from botocore.exceptions import ClientError
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from accounts.models import FileStorage
+from accounts.utils import _list_prefix_keys, _prefix_for
+class Command(BaseCommand):
+    help = 'Заполняет поле object_key для существующих файлов по листингу S3 (один листинг на префикс)'
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Показать что будет сделано, но не применять изменения'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Размер пакета для bulk_update'
+        )
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        batch_size = options['batch_size']
+        files_to_update = (
+            FileStorage.objects.filter(Q(object_key__isnull=True) | Q(object_key=""))
+            .exclude(file_url__isnull=True)
+            .select_related("entity_type", "file_type")
+        )
+        groups = collections.defaultdict(list)
+        for file_storage in files_to_update:
+            entity_type_name = file_storage.entity_type.type_name if file_storage.entity_type else "startup"
+            file_type_name = file_storage.file_type.type_name if file_storage.file_type else None
+            entity_id = file_storage.entity_id or file_storage.startup_id
+            if not file_type_name or not entity_id:
+                self.stdout.write(
+                    self.style.WARNING(f'Файл {file_storage.file_id}: не хватает типа файла или сущности')
+                )
+                continue
+            groups[(entity_type_name, entity_id, file_type_name)].append(file_storage)
+        total_files = sum(len(rows) for rows in groups.values())
+        self.stdout.write(f'Найдено {total_files} файлов без object_key в {len(groups)} префиксах')
+        if total_files == 0:
+            self.stdout.write(self.style.SUCCESS('Все файлы уже имеют object_key'))
+            return
+        updated = []
+        missing_count = 0
+        error_count = 0
+        for (entity_type_name, entity_id, file_type_name), rows in groups.items():
+            prefix = _prefix_for(entity_type_name, entity_id, file_type_name)
+            try:
+                found = _list_prefix_keys(prefix)
+                if entity_type_name != "startup" and file_type_name != "avatar" and len(found) < len(rows):
+                    legacy = _list_prefix_keys(f"startups/{entity_id}/{file_type_name}s/")
+                    for file_id, key in legacy.items():
+                        found.setdefault(file_id, key)
+            except ClientError as e:
+                self.stdout.write(self.style.ERROR(f'Ошибка листинга {prefix}: {e}'))
+                error_count += len(rows)
+                continue
+            for file_storage in rows:
+                key = found.get(str(file_storage.file_url))
+                if not key:
+                    missing_count += 1
+                    self.stdout.write(
+                        self.style.WARNING(f'Файл {file_storage.file_id}: объект не найден по префиксу {prefix}')
+                    )
+                    continue
+                if dry_run:
+                    self.stdout.write(f'Файл {file_storage.file_id}: "{file_storage.file_url}" -> "{key}"')
+                file_storage.object_key = key
+                updated.append(file_storage)
+        if not dry_run and updated:
+            FileStorage.objects.bulk_update(updated, ["object_key"], batch_size=batch_size)
+        if dry_run:
+            self.stdout.write(
+                self.style.SUCCESS(f'Dry run завершен. Будет обновлено {len(updated)} файлов')
+            )
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Обновлено {len(updated)} файлов. Не найдено: {missing_count}. Ошибок: {error_count}'
+                )
+            )
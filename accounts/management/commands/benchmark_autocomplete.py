@@ -0,0 +1,71 @@
+"""
+Management command для замера индекса автодополнения названий в памяти:
+время построения, оценка занимаемой памяти и задержка поиска на синтетических названиях.
+БД не используется.
+"""
+import random
+import statistics
+import time
+import tracemalloc
+from django.core.management.base import BaseCommand
+from accounts.search import TitlePrefixIndex
+from accounts.management.commands.benchmark_search import WORDS
+class Command(BaseCommand):
+    help = 'Замеряет построение и поиск индекса автодополнения на синтетических названиях'
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=100000,
+            help='Сколько синтетических названий проиндексировать'
+        )
+        parser.add_argument(
+            '--lookups',
+            type=int,
+            default=10000,
+            help='Сколько поисковых запросов выполнить'
+        )
+        parser.add_argument(
+            '--budget-mb',
+            type=int,
+            default=64,
+            help='Бюджет памяти индекса в мегабайтах'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Зерно генератора случайных значений'
+        )
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        entity_types = ("startup", "franchise", "agency", "specialist")
+        entries = [
+            (entity_types[i % len(entity_types)], i, " ".join(rng.sample(WORDS, 3)).capitalize() + f" {i}")
+            for i in range(options['rows'])
+        ]
+        index = TitlePrefixIndex(options['budget_mb'] * 1024 * 1024)
+        tracemalloc.start()
+        started = time.perf_counter()
+        index.rebuild(entries)
+        elapsed = time.perf_counter() - started
+        allocated, _peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(f'Построение: {elapsed:.2f} с, фактически выделено {allocated / 1024 / 1024:.1f} МБ, {index.stats()}')
+        prefixes = [rng.choice(WORDS)[:rng.randint(2, 5)] for _ in range(options['lookups'])]
+        timings = []
+        for prefix in prefixes:
+            started = time.perf_counter()
+            index.lookup(prefix, 10)
+            timings.append((time.perf_counter() - started) * 1_000_000)
+        timings.sort()
+        self.stdout.write(
+            f'Поиск: медиана {statistics.median(timings):.1f} мкс, '
+            f'p99 {timings[int(len(timings) * 0.99) - 1]:.1f} мкс, максимум {timings[-1]:.1f} мкс'
+        )
+        started = time.perf_counter()
+        for i in range(1000):
+            index.upsert("startup", options['rows'] + i, f"Новый стартап {i}")
+        self.stdout.write(self.style.SUCCESS(
+            f'Инкрементальное добавление: {(time.perf_counter() - started) * 1000:.2f} мкс на запись'
+        ))
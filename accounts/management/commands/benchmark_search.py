@@ -0,0 +1,98 @@
+"""
+Management command для замера глобального поиска на синтетическом каталоге:
+сравнивает полнотекстовый UNION-запрос (tsvector + GIN) с прежним поиском через icontains.
+Синтетические записи создаются внутри транзакции и по умолчанию откатываются.
+"""
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from accounts.models import Agencies, Franchises, Specialists, Startups
+from accounts.search import fulltext_search_rows, icontains_search_rows
+WORDS = [
+    "доставка", "кофе", "робот", "финансы", "здоровье", "обучение", "маркетинг", "дизайн",
+    "логистика", "аналитика", "платформа", "сервис", "агентство", "студия", "фитнес", "красота",
+    "energy", "cloud", "smart", "data", "green", "city", "food", "travel", "pixel", "nova",
+]
+DEFAULT_QUERIES = ["кофе", "доставк", "smart", "робот сервис", "green energy", "нетакогослова"]
+class Command(BaseCommand):
+    help = 'Сравнивает полнотекстовый поиск и icontains на синтетическом каталоге'
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=100000,
+            help='Сколько синтетических записей создать (поровну на четыре типа сущностей)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Сколько раз выполнить каждый запрос'
+        )
+        parser.add_argument(
+            '--query',
+            action='append',
+            help='Поисковый запрос (можно повторять); по умолчанию — встроенный набор'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Зерно генератора случайных значений'
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Не откатывать созданные записи'
+        )
+    def handle(self, *args, **options):
+        fulltext = connection.vendor == "postgresql"
+        if not fulltext:
+            self.stdout.write(self.style.WARNING('Полнотекстовый поиск доступен только на PostgreSQL, замеряется только icontains'))
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            started = time.perf_counter()
+            self.populate(options['rows'], rng)
+            self.stdout.write(f'Создано {options["rows"]} записей за {time.perf_counter() - started:.1f} с')
+            if fulltext:
+                with connection.cursor() as cursor:
+                    cursor.execute("ANALYZE users, startups, franchises, agencies, specialists")
+            for query in options['query'] or DEFAULT_QUERIES:
+                line = f'{query!r}: icontains {self.measure(icontains_search_rows, query, options["repeat"])}'
+                if fulltext:
+                    line += f', fulltext {self.measure(fulltext_search_rows, query, options["repeat"])}'
+                self.stdout.write(line)
+            if not options['keep']:
+                transaction.set_rollback(True)
+                self.stdout.write(self.style.SUCCESS('Синтетические записи откачены'))
+    @staticmethod
+    def measure(search, query, repeat):
+        timings = []
+        found = 0
+        for _ in range(max(1, repeat)):
+            started = time.perf_counter()
+            found = len(search(query))
+            timings.append((time.perf_counter() - started) * 1000)
+        return f'медиана {statistics.median(timings):.1f} мс, найдено {found}'
+    @staticmethod
+    def populate(rows, rng):
+        now = timezone.now()
+        models = (Startups, Franchises, Agencies, Specialists)
+        for index, model in enumerate(models):
+            count = rows // len(models) + (1 if index < rows % len(models) else 0)
+            batch = [
+                model(
+                    title=" ".join(rng.sample(WORDS, 2)).capitalize() + f" {i}",
+                    short_description=" ".join(rng.choices(WORDS, k=12)),
+                    status="approved",
+                    created_at=now,
+                    updated_at=now,
+                    total_voters=0,
+                    sum_votes=0,
+                )
+                for i in range(count)
+            ]
+            model.objects.bulk_create(batch, batch_size=2000)
@@ -0,0 +1,35 @@
+"""
+Management command для пересборки таблицы похожих карточек (similar_entities).
+Рассчитан на запуск по расписанию, например раз в час из cron.
+"""
+import time
+from django.core.management.base import BaseCommand
+from accounts.recommendations import SIMILAR_BATCH_SIZE, SIMILAR_SOURCES, SIMILAR_TOP_K, build_similarities
+class Command(BaseCommand):
+    help = 'Пересчитывает соседей одобренных карточек для каруселей «похожие»'
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--type',
+            action='append',
+            choices=sorted(SIMILAR_SOURCES),
+            help='Тип карточек (можно повторять); по умолчанию — все типы'
+        )
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=SIMILAR_TOP_K,
+            help='Сколько соседей хранить для каждой карточки'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=SIMILAR_BATCH_SIZE,
+            help='Сколько карточек обрабатывать и записывать за один пакет'
+        )
+    def handle(self, *args, **options):
+        for entity_type in options['type'] or SIMILAR_SOURCES:
+            started = time.perf_counter()
+            entities, written = build_similarities(entity_type, options['top_k'], options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f'{entity_type}: {entities} карточек, {written} связей за {time.perf_counter() - started:.1f} с'
+            ))
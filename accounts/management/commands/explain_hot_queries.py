@@ -0,0 +1,70 @@
+"""
+Management command для вывода планов выполнения (EXPLAIN) основных запросов каталога,
+чата и инвестиций. Запускается до и после миграции индексов, чтобы сравнить планы.
+"""
+from django.core.management.base import BaseCommand
+from accounts.models import (
+    Agencies,
+    ChatParticipants,
+    Comments,
+    Franchises,
+    InvestmentTransactions,
+    Messages,
+    Specialists,
+    Startups,
+    UserVotes,
+)
+class Command(BaseCommand):
+    help = 'Печатает EXPLAIN для горячих запросов списков, чата, инвестиций и голосов'
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--analyze',
+            action='store_true',
+            help='Выполнить запросы (EXPLAIN ANALYZE) и показать фактическое время'
+        )
+        parser.add_argument('--user-id', type=int, default=None, help='Пользователь для запросов чата и инвестиций')
+        parser.add_argument('--startup-id', type=int, default=None, help='Стартап для запросов голосов и комментариев')
+        parser.add_argument('--conversation-id', type=int, default=None, help='Диалог для запроса сообщений')
+    def handle(self, *args, **options):
+        user_id = options['user_id'] or (
+            ChatParticipants.objects.exclude(user__isnull=True).values_list("user_id", flat=True).first() or 1
+        )
+        startup_id = options['startup_id'] or (
+            Startups.objects.filter(status="approved").values_list("startup_id", flat=True).first() or 1
+        )
+        conversation_id = options['conversation_id'] or (
+            Messages.objects.exclude(conversation__isnull=True).values_list("conversation_id", flat=True).first() or 1
+        )
+        queries = [
+            ("startups_list: новые", Startups.card_queryset().filter(status="approved").order_by("-created_at")[:6]),
+            (
+                "startups_list: фильтр по рейтингу",
+                Startups.card_queryset().filter(status="approved", rating_avg__gte=3).order_by("rating_avg", "-created_at")[:6],
+            ),
+            (
+                "startups_list: фильтр по цели",
+                Startups.card_queryset().filter(status="approved", funding_goal__gte=100000).order_by("funding_goal", "-created_at")[:6],
+            ),
+            ("franchises_list: новые", Franchises.card_queryset().filter(status="approved").order_by("-created_at")[:6]),
+            ("agencies_list: новые", Agencies.card_queryset().filter(status="approved").order_by("-created_at")[:6]),
+            ("specialists_list: новые", Specialists.card_queryset().filter(status="approved").order_by("-created_at")[:6]),
+            ("чат: сообщения диалога", Messages.objects.filter(conversation_id=conversation_id).order_by("created_at")),
+            ("чат: диалоги пользователя", ChatParticipants.objects.filter(user_id=user_id)),
+            (
+                "инвестиции: инвестор в стартапе",
+                InvestmentTransactions.objects.filter(investor_id=user_id, startup_id=startup_id),
+            ),
+            ("голоса: голос пользователя", UserVotes.objects.filter(startup_id=startup_id, user_id=user_id)),
+            (
+                "startup_detail: комментарии",
+                Comments.objects.filter(startup_id=startup_id, parent_comment_id__isnull=True).order_by("-created_at"),
+            ),
+        ]
+        for title, queryset in queries:
+            self.stdout.write(self.style.SUCCESS(f'== {title}'))
+            self.stdout.write(str(queryset.query))
+            try:
+                self.stdout.write(queryset.explain(analyze=options['analyze']))
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'Не удалось получить план: {e}'))
+            self.stdout.write('')
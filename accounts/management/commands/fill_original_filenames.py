@@ -4,7 +4,7 @@ Management command для заполнения поля original_file_name у с
 from django.core.management.base import BaseCommand
 from django.db import connection
 from accounts.models import FileStorage
-from accounts.utils import get_file_info
+from accounts.utils import get_file_info, invalidate_file_cache
 class Command(BaseCommand):
     help = 'Заполняет поле original_file_name для существующих файлов из S3'
     def add_arguments(self, parser):
@@ -68,6 +68,7 @@ class Command(BaseCommand):
                         try:
                             file_storage.original_file_name = original_name
                             file_storage.save(update_fields=['original_file_name'])
+                            invalidate_file_cache(file_storage.file_url, startup_id, file_type_name)
                             self.stdout.write(
                                 f'Обновлен файл {file_storage.file_id}: "{original_name}"'
                             )
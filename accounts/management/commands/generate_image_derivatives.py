@@ -0,0 +1,86 @@
+"""
+Management command для построения миниатюр (WebP + JPEG) у уже загруженных изображений
+"""
+import io
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from accounts.models import FileStorage
+from accounts.utils import (
+    IMAGE_DERIVATIVE_TYPES,
+    get_s3_client,
+    invalidate_file_cache,
+    try_generate_image_derivatives,
+)
+class Command(BaseCommand):
+    help = 'Строит миниатюры для логотипов, креативов и аватаров, у которых их ещё нет'
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Показать что будет сделано, но не применять изменения'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Количество параллельных потоков'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Обработать не более указанного количества файлов'
+        )
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        files = (
+            FileStorage.objects.filter(
+                has_derivatives=False,
+                file_type__type_name__in=IMAGE_DERIVATIVE_TYPES,
+                object_key__isnull=False,
+            )
+            .exclude(object_key="")
+            .select_related("entity_type", "file_type")
+            .order_by("file_id")
+        )
+        if options['limit']:
+            files = files[:options['limit']]
+        files = list(files)
+        self.stdout.write(f'Найдено {len(files)} изображений без миниатюр')
+        if not files:
+            self.stdout.write(self.style.SUCCESS('Все изображения уже имеют миниатюры'))
+            return
+        if dry_run:
+            for file_storage in files:
+                self.stdout.write(f'Файл {file_storage.file_id}: {file_storage.object_key}')
+            self.stdout.write(self.style.SUCCESS(f'Dry run завершен. Будет обработано {len(files)} файлов'))
+            return
+        s3_client = get_s3_client()
+        bucket_name = settings.AWS_STORAGE_BUCKET_NAME
+        def process(file_storage):
+            try:
+                response = s3_client.get_object(Bucket=bucket_name, Key=file_storage.object_key)
+                body = io.BytesIO(response["Body"].read())
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'Файл {file_storage.file_id}: не удалось скачать: {e}'))
+                return None
+            if not try_generate_image_derivatives(body, file_storage.object_key):
+                self.stdout.write(self.style.WARNING(f'Файл {file_storage.file_id}: миниатюры не построены'))
+                return None
+            return file_storage
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as executor:
+            updated = [file_storage for file_storage in executor.map(process, files) if file_storage]
+        for file_storage in updated:
+            file_storage.has_derivatives = True
+        FileStorage.objects.bulk_update(updated, ["has_derivatives"], batch_size=500)
+        for file_storage in updated:
+            invalidate_file_cache(
+                file_storage.file_url,
+                file_storage.entity_id or file_storage.startup_id,
+                file_storage.file_type.type_name,
+                file_storage.entity_type.type_name if file_storage.entity_type else "startup",
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f'Миниатюры построены для {len(updated)} файлов. Ошибок: {len(files) - len(updated)}')
+        )
@@ -0,0 +1,37 @@
+"""
+Management command для обновления кэша каталога планет (choosable_planets/).
+Воркеры увидят новый каталог, только если кэш по умолчанию общий (Redis, база данных):
+с LocMemCache команда заполняет лишь кэш собственного процесса.
+"""
+from botocore.exceptions import BotoCoreError, ClientError
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from accounts.utils import PLANET_CATALOG_PREFIX, _load_planet_catalog, refresh_planet_catalog
+class Command(BaseCommand):
+    help = 'Перечитывает каталог планет из S3 и обновляет кэш, из которого читают формы'
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Показать найденные планеты, но не обновлять кэш'
+        )
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        try:
+            planets = _load_planet_catalog() if dry_run else refresh_planet_catalog()
+        except (BotoCoreError, ClientError) as e:
+            self.stdout.write(self.style.ERROR(f'Ошибка листинга {PLANET_CATALOG_PREFIX}: {e}'))
+            return
+        if not planets:
+            self.stdout.write(self.style.WARNING(f'В {PLANET_CATALOG_PREFIX} не найдено ни одной планеты'))
+        if dry_run:
+            for planet in planets:
+                self.stdout.write(planet)
+            self.stdout.write(self.style.SUCCESS(f'Dry run завершен. Найдено {len(planets)} планет'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Каталог планет обновлен: {len(planets)} планет'))
+            if getattr(settings, 'CACHE_IS_PER_WORKER', False):
+                self.stdout.write(self.style.WARNING(
+                    'Кэш по умолчанию — LocMemCache: воркеры не увидят обновление, '
+                    'настройте общий бэкенд через DJANGO_CACHE_BACKEND'
+                ))
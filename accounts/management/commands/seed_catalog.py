@@ -0,0 +1,142 @@
+"""
+Management command для наполнения каталога демонстрационными франшизами,
+агентствами и специалистами (для staging). Данные детерминированы: при одинаковом
+--seed и одинаковом наборе стартапов создаются одни и те же записи.
+"""
+import random
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from accounts.models import Agencies, Directions, Franchises, Specialists, Startups
+FRANCHISE_NAMES = [
+    "БургерХаус", "КофеМир", "ПиццаПлюс", "СушиБар", "ШаурмаСтар", "КебабКинг",
+    "БлинХаус", "ПельменХаус", "СупБар", "СалатСтар", "ДесертХаус", "МороженоМир",
+    "ЧайХаус", "СокБар", "СпортХаус", "ФитнесСтар", "ЙогаБар", "КрасотаХаус",
+]
+AGENCY_NAMES = [
+    "Orbit Digital", "NovaLab Studio", "Cometix", "PixelFoundry",
+    "NeuroCraft", "Skyline Media", "Quantum Works", "AstroBrand",
+    "DeepWave", "Hyperlink", "BlueOrbit", "MetaForge",
+    "Brandverse", "CodeSmiths", "UXia Lab", "Visionary",
+    "IdeaGarden", "EchoPixel", "CraftLabs", "MotionQuark",
+]
+AGENCY_CATEGORIES = [
+    "Веб-разработка", "Мобильная разработка", "Дизайн",
+    "Маркетинг", "ИИ", "Брендинг", "Видео и мультимедиа",
+]
+SPECIALIST_NAMES = [
+    "Анна Орлова", "Игорь Миронов", "Мария Соколова", "Дмитрий Лебедев",
+    "Елена Кузнецова", "Павел Волков", "Ольга Морозова", "Сергей Новиков",
+    "Наталья Попова", "Алексей Смирнов", "Ирина Васильева", "Максим Фёдоров",
+]
+SPECIALIST_CATEGORIES = [
+    "Разработчик", "Дизайнер", "Маркетолог", "Аналитик", "Юрист", "Финансист",
+]
+class Command(BaseCommand):
+    help = 'Создаёт демонстрационные франшизы, агентства и специалистов для staging'
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Показать что будет сделано, но не применять изменения'
+        )
+        parser.add_argument(
+            '--count',
+            type=int,
+            default=18,
+            help='Сколько одобренных записей каждого типа должно быть в каталоге'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Зерно генератора случайных значений'
+        )
+        parser.add_argument(
+            '--only',
+            choices=['franchises', 'agencies', 'specialists'],
+            action='append',
+            help='Наполнить только указанные разделы (можно повторять)'
+        )
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        count = options['count']
+        sections = options['only'] or ['franchises', 'agencies', 'specialists']
+        rng = random.Random(options['seed'])
+        startups = list(
+            Startups.objects.filter(status="approved").select_related("owner").order_by("startup_id")[:100]
+        )
+        directions = list(Directions.objects.order_by("direction_id"))
+        now = timezone.now()
+        builders = {
+            'franchises': (Franchises, self.build_franchise),
+            'agencies': (Agencies, self.build_agency),
+            'specialists': (Specialists, self.build_specialist),
+        }
+        with transaction.atomic():
+            for section in sections:
+                model, build = builders[section]
+                missing = max(0, count - model.objects.filter(status="approved").count())
+                rows = [
+                    build(i, startups[i % len(startups)] if startups else None, directions, rng, now)
+                    for i in range(missing)
+                ]
+                if dry_run:
+                    self.stdout.write(f'{section}: будет создано {len(rows)} записей')
+                    continue
+                model.objects.bulk_create(rows)
+                self.stdout.write(self.style.SUCCESS(f'{section}: создано {len(rows)} записей'))
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS('Dry run завершен'))
+    @staticmethod
+    def common_fields(st, now):
+        return {
+            "short_description": st.short_description if st else None,
+            "description": st.description if st else None,
+            "terms": st.terms if st else None,
+            "stage": st.stage if st else None,
+            "pitch_deck_url": st.pitch_deck_url if st else None,
+            "created_at": now,
+            "updated_at": now,
+            "status": "approved",
+            "total_voters": 0,
+            "sum_votes": 0,
+            "logo_urls": st.logo_urls if st else [],
+            "creatives_urls": st.creatives_urls if st else [],
+            "proofs_urls": st.proofs_urls if st else [],
+            "video_urls": st.video_urls if st else [],
+            "planet_image": st.planet_image if st else None,
+            "owner": st.owner if st else None,
+        }
+    def build_franchise(self, i, st, directions, rng, now):
+        return Franchises(
+            title=f"{FRANCHISE_NAMES[i % len(FRANCHISE_NAMES)]} {rng.randint(100, 999)}",
+            direction=directions[i % len(directions)] if directions else None,
+            investment_size=st.funding_goal if st else 0,
+            payback_period=rng.choice([6, 12, 18, 24, 36]),
+            own_businesses=rng.randint(1, 10),
+            franchise_businesses=rng.randint(5, 50),
+            valuation=st.valuation if st else 0,
+            total_invested=0,
+            info_url=st.info_url if st else None,
+            percent_amount=st.percent_amount if st else 0,
+            customization_data={},
+            is_edited=False,
+            step_number=1,
+            franchise_cost=0,
+            **self.common_fields(st, now),
+        )
+    def build_agency(self, i, st, directions, rng, now):
+        return Agencies(
+            title=f"{AGENCY_NAMES[i % len(AGENCY_NAMES)]} {rng.randint(100, 999)}",
+            direction=st.direction if st else None,
+            customization_data={"agency_category": rng.choice(AGENCY_CATEGORIES)},
+            **self.common_fields(st, now),
+        )
+    def build_specialist(self, i, st, directions, rng, now):
+        return Specialists(
+            title=f"{SPECIALIST_NAMES[i % len(SPECIALIST_NAMES)]} {rng.randint(100, 999)}",
+            direction=st.direction if st else None,
+            customization_data={"specialist_category": rng.choice(SPECIALIST_CATEGORIES)},
+            **self.common_fields(st, now),
+        )
@@ -2,6 +2,7 @@ from django.http import HttpResponsePermanentRedirect
 import json
 from urllib.parse import urlencode
 import logging
+from .utils import start_s3_call_count
 
 logger = logging.getLogger(__name__)
 
@@ -101,3 +102,22 @@ class TelegramCallbackCompatMiddleware:
         except Exception as e:
             logger.error(f"Ошибка в TelegramCallbackCompatMiddleware: {str(e)}")
         return self.get_response(request)
+
+
+class S3CallCounterMiddleware:
+    """
+    Считает обращения к S3 за время обработки запроса, пишет их в лог
+    и отдаёт в заголовке X-S3-Calls.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_calls = start_s3_call_count()
+        response = self.get_response(request)
+        total_calls = sum(request_calls.values())
+        if total_calls:
+            logger.info(f"S3 вызовов за запрос {request.path}: {total_calls} {dict(request_calls)}")
+        response["X-S3-Calls"] = str(total_calls)
+        return response
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0049_update_telegram_social_app'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filestorage',
+            name='object_key',
+            field=models.CharField(blank=True, max_length=1024, null=True),
+        ),
+    ]
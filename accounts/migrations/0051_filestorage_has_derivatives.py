@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0050_filestorage_object_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filestorage',
+            name='has_derivatives',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,52 @@
+from django.db import migrations, models
+
+
+def fill_counters(apps, schema_editor):
+    Startups = apps.get_model('accounts', 'Startups')
+    InvestmentTransactions = apps.get_model('accounts', 'InvestmentTransactions')
+    Comments = apps.get_model('accounts', 'Comments')
+    investors = dict(
+        InvestmentTransactions.objects.exclude(startup__isnull=True)
+        .values('startup')
+        .annotate(count=models.Count('investor', distinct=True))
+        .values_list('startup', 'count')
+    )
+    comments = dict(
+        Comments.objects.values('startup_id')
+        .annotate(count=models.Count('comment_id'))
+        .values_list('startup_id', 'count')
+    )
+    startups = list(Startups.objects.only('startup_id', 'sum_votes', 'total_voters'))
+    for startup in startups:
+        startup.rating_avg = (startup.sum_votes / startup.total_voters) if startup.total_voters else 0
+        startup.investors_count = investors.get(startup.startup_id, 0)
+        startup.comments_count = comments.get(startup.startup_id, 0)
+    Startups.objects.bulk_update(
+        startups, ['rating_avg', 'investors_count', 'comments_count'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0051_filestorage_has_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='startups',
+            name='rating_avg',
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='startups',
+            name='investors_count',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='startups',
+            name='comments_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+
+INDEXES = [
+    ("startups_approved_created_idx", "startups", "(created_at DESC)", "WHERE status = 'approved'"),
+    ("startups_approved_goal_idx", "startups", "(funding_goal)", "WHERE status = 'approved'"),
+    ("startups_status_idx", "startups", "(status)", ""),
+    ("startups_owner_idx", "startups", "(owner_id)", ""),
+    ("franchises_approved_created_idx", "franchises", "(created_at DESC)", "WHERE status = 'approved'"),
+    ("franchises_status_idx", "franchises", "(status)", ""),
+    ("agencies_approved_created_idx", "agencies", "(created_at DESC)", "WHERE status = 'approved'"),
+    ("agencies_status_idx", "agencies", "(status)", ""),
+    ("specialists_approved_created_idx", "specialists", "(created_at DESC)", "WHERE status = 'approved'"),
+    ("specialists_status_idx", "specialists", "(status)", ""),
+    ("messages_conversation_created_idx", "messages", "(conversation_id, created_at)", ""),
+    ("chat_participants_user_idx", "chat_participants", "(user_id)", ""),
+    ("chat_participants_conversation_user_idx", "chat_participants", "(conversation_id, user_id)", ""),
+    ("investment_tx_investor_startup_idx", "investment_transactions", "(investor_id, startup_id)", ""),
+    ("investment_tx_startup_idx", "investment_transactions", "(startup_id)", ""),
+    ("startup_votes_startup_user_idx", "startup_votes", "(startup_id, user_id)", ""),
+    ("comments_startup_created_idx", "comments", "(startup_id, created_at DESC)", ""),
+]
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0052_startups_counters'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {columns} {where}".strip(),
+            reverse_sql=f"DROP INDEX CONCURRENTLY IF EXISTS {name}",
+        )
+        for name, table, columns, where in INDEXES
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+from accounts.search import SEARCH_VECTORS
+
+
+class Migration(migrations.Migration):
+    # GIN-индексы по выражению to_tsvector(...) вместо генерируемой STORED-колонки:
+    # ADD COLUMN ... GENERATED ALWAYS ... STORED переписывает всю таблицу под
+    # ACCESS EXCLUSIVE, а CREATE INDEX CONCURRENTLY не блокирует запись. CONCURRENTLY
+    # невозможно внутри транзакции. Выражения берутся из accounts.search.SEARCH_VECTORS,
+    # чтобы условие поиска буква в букву совпадало с индексом
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0053_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {table}_search_tsv_idx ON {table} USING GIN (({expression}))",
+            reverse_sql=f"DROP INDEX CONCURRENTLY IF EXISTS {table}_search_tsv_idx",
+        )
+        for table, expression in SEARCH_VECTORS.items()
+    ]
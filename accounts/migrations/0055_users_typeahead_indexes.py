@@ -0,0 +1,33 @@
+from django.db import migrations
+
+
+TYPEAHEAD_COLUMNS = ["first_name", "last_name", "email"]
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0054_search_vectors'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="CREATE EXTENSION IF NOT EXISTS pg_trgm",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ] + [
+        # Префиксный проход: istartswith в Django превращается в UPPER(col::text) LIKE 'X%'
+        migrations.RunSQL(
+            sql=f"CREATE INDEX CONCURRENTLY IF NOT EXISTS users_{column}_upper_prefix_idx ON users (UPPER({column}::text) text_pattern_ops)",
+            reverse_sql=f"DROP INDEX CONCURRENTLY IF EXISTS users_{column}_upper_prefix_idx",
+        )
+        for column in TYPEAHEAD_COLUMNS
+    ] + [
+        migrations.RunSQL(
+            sql=f"CREATE INDEX CONCURRENTLY IF NOT EXISTS users_{column}_trgm_idx ON users USING GIN ({column} gin_trgm_ops)",
+            reverse_sql=f"DROP INDEX CONCURRENTLY IF EXISTS users_{column}_trgm_idx",
+        )
+        for column in TYPEAHEAD_COLUMNS
+    ]
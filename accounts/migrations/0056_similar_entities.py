@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0055_users_typeahead_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SimilarEntities",
+            fields=[
+                ("similarity_id", models.AutoField(primary_key=True, serialize=False)),
+                ("entity_type", models.CharField(max_length=20)),
+                ("entity_id", models.IntegerField()),
+                ("similar_id", models.IntegerField()),
+                ("rank", models.SmallIntegerField()),
+                ("score", models.FloatField()),
+            ],
+            options={
+                "db_table": "similar_entities",
+                "managed": True,
+                "unique_together": {("entity_type", "entity_id", "similar_id")},
+            },
+        ),
+    ]
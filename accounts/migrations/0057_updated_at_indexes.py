@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+# Опрос индекса автодополнения выбирает изменённые карточки по updated_at >= отметки
+TABLES = ["startups", "franchises", "agencies", "specialists"]
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0056_similar_entities'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {table}_updated_at_idx ON {table} (updated_at)",
+            reverse_sql=f"DROP INDEX CONCURRENTLY IF EXISTS {table}_updated_at_idx",
+        )
+        for table in TABLES
+    ]
@@ -3,10 +3,32 @@ import os
 from django.contrib.auth.hashers import check_password, make_password
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
 from django.db import models
+from django.db.models import Case, Count, F, FloatField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.utils.text import slugify
-from accounts.utils import get_file_url, is_uuid
+from accounts.utils import get_file_url, invalidate_card_fragment, invalidate_planet_snapshot, is_uuid
 logger = logging.getLogger(__name__)
+CARD_OWNER_FIELDS = ("owner__user_id", "owner__username", "owner__profile_picture_url")
+def comments_count_expression(comment_model, field):
+    """
+    Число комментариев сущности коррелированным подзапросом (без GROUP BY по основному запросу).
+    """
+    return Coalesce(
+        Subquery(
+            comment_model.objects.filter(**{field: OuterRef("pk")})
+            .values(field)
+            .annotate(count=Count("comment_id"))
+            .values("count")[:1]
+        ),
+        0,
+    )
+def rating_expression():
+    return Case(
+        When(total_voters__gt=0, then=F("sum_votes") * 1.0 / F("total_voters")),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
 class Actions(models.Model):
     action_id = models.AutoField(primary_key=True)
     action_name = models.CharField(unique=True, max_length=100)
@@ -94,6 +116,10 @@ class FileStorage(models.Model):
     original_file_name = models.CharField(
         max_length=255, blank=True, null=True
     )
+    object_key = models.CharField(
+        max_length=1024, blank=True, null=True
+    )
+    has_derivatives = models.BooleanField(default=False)
     class Meta:
         managed = True
         db_table = "file_storage"
@@ -367,9 +393,93 @@ class Startups(models.Model):
     proofs_urls = models.JSONField(blank=True, null=True, default=list)
     video_urls = models.JSONField(blank=True, null=True, default=list)
     planet_image = models.CharField(max_length=50, blank=True, null=True)
+    rating_avg = models.FloatField(default=0, db_index=True)
+    investors_count = models.IntegerField(default=0, db_index=True)
+    comments_count = models.IntegerField(default=0)
     class Meta:
         managed = True
         db_table = "startups"
+    COUNTER_FIELDS = ("rating_avg", "investors_count", "comments_count")
+    CARD_FIELDS = (
+        "startup_id", "title", "short_description", "planet_image", "logo_urls", "status",
+        "created_at", "updated_at", "total_voters", "sum_votes", "rating_avg", "comments_count",
+        "investors_count", "funding_goal", "amount_raised", "valuation", "percent_amount",
+        "micro_investment_available", "both_mode", "only_invest", "only_buy", "direction__direction_name",
+        "stage__stage_name",
+    ) + CARD_OWNER_FIELDS
+    @classmethod
+    def card_queryset(cls):
+        """
+        Queryset для карточек и списков: только колонки, которые читают шаблоны карточек,
+        направление, стадия и владелец подтягиваются JOIN-ом; description, terms и JSON-поля
+        кроме logo_urls не грузятся.
+        """
+        return (
+            cls.objects.select_related("direction", "stage", "owner")
+            .only(*cls.CARD_FIELDS)
+            .annotate(average_rating=F("rating_avg"))
+        )
+    @staticmethod
+    def counter_expressions():
+        """
+        Выражения пересчёта денормализованных счётчиков из исходных таблиц.
+        """
+        return {
+            "rating_avg": rating_expression(),
+            "investors_count": Coalesce(
+                Subquery(
+                    InvestmentTransactions.objects.filter(startup=OuterRef("pk"))
+                    .values("startup")
+                    .annotate(count=Count("investor", distinct=True))
+                    .values("count")[:1]
+                ),
+                0,
+            ),
+            "comments_count": Coalesce(
+                Subquery(
+                    Comments.objects.filter(startup_id=OuterRef("pk"))
+                    .values("startup_id")
+                    .annotate(count=Count("comment_id"))
+                    .values("count")[:1]
+                ),
+                0,
+            ),
+        }
+    def update_counters(self, *fields):
+        """
+        Пересчитывает указанные счётчики (по умолчанию все) одним UPDATE
+        и подтягивает новые значения в экземпляр.
+        """
+        fields = fields or self.COUNTER_FIELDS
+        expressions = self.counter_expressions()
+        Startups.objects.filter(pk=self.pk).update(**{field: expressions[field] for field in fields})
+        self.refresh_from_db(fields=list(fields))
+        invalidate_card_fragment("startup", self.pk)
+        invalidate_planet_snapshot()
+    def add_vote(self, rating, previous_rating=None):
+        """
+        Атомарно учитывает оценку пользователя (или её изменение) в sum_votes,
+        total_voters и rating_avg одним UPDATE.
+        """
+        if previous_rating is None:
+            Startups.objects.filter(pk=self.pk).update(
+                total_voters=F("total_voters") + 1,
+                sum_votes=F("sum_votes") + rating,
+                rating_avg=(F("sum_votes") + rating) * 1.0 / (F("total_voters") + 1),
+            )
+        else:
+            delta = rating - int(previous_rating or 0)
+            Startups.objects.filter(pk=self.pk).update(
+                sum_votes=F("sum_votes") + delta,
+                rating_avg=Case(
+                    When(total_voters__gt=0, then=(F("sum_votes") + delta) * 1.0 / F("total_voters")),
+                    default=Value(0.0),
+                    output_field=FloatField(),
+                ),
+            )
+        self.refresh_from_db(fields=["total_voters", "sum_votes", "rating_avg"])
+        invalidate_card_fragment("startup", self.pk)
+        invalidate_planet_snapshot()
     def get_average_rating(self):
         if self.total_voters > 0:
             return float(self.sum_votes) / self.total_voters
@@ -508,6 +618,8 @@ class Users(AbstractBaseUser):
     def has_module_perms(self, app_label):
         return self.is_staff
     def get_profile_picture_url(self):
+        if "resolved_profile_picture_url" in self.__dict__:
+            return self.resolved_profile_picture_url
         url_value = (self.profile_picture_url or "").strip()
         if not url_value:
             return None
@@ -719,6 +831,27 @@ class Franchises(models.Model):
         managed = True
         db_table = "franchises"
 
+    CARD_FIELDS = (
+        "franchise_id", "title", "planet_image", "logo_urls", "status", "created_at", "updated_at",
+        "total_voters", "sum_votes", "investment_size", "payback_period", "own_businesses", "franchise_businesses", "direction__direction_name",
+        "stage__stage_name",
+    ) + CARD_OWNER_FIELDS
+
+    @classmethod
+    def card_queryset(cls):
+        """
+        Queryset для карточек и списков: только отображаемые колонки, направление,
+        стадия и владелец одним JOIN, число комментариев и рейтинг — аннотациями.
+        """
+        return (
+            cls.objects.select_related("direction", "stage", "owner")
+            .only(*cls.CARD_FIELDS)
+            .annotate(
+                comments_count=comments_count_expression(FranchiseComments, "franchise"),
+                average_rating=rating_expression(),
+            )
+        )
+
     def get_average_rating(self):
         if self.total_voters > 0:
             return self.sum_votes / self.total_voters
@@ -830,6 +963,27 @@ class Agencies(models.Model):
         managed = True
         db_table = "agencies"
 
+    CARD_FIELDS = (
+        "agency_id", "title", "planet_image", "logo_urls", "status", "created_at", "updated_at",
+        "total_voters", "sum_votes", "short_description", "customization_data", "direction__direction_name",
+        "stage__stage_name",
+    ) + CARD_OWNER_FIELDS
+
+    @classmethod
+    def card_queryset(cls):
+        """
+        Queryset для карточек и списков: только отображаемые колонки, направление,
+        стадия и владелец одним JOIN, число комментариев и рейтинг — аннотациями.
+        """
+        return (
+            cls.objects.select_related("direction", "stage", "owner")
+            .only(*cls.CARD_FIELDS)
+            .annotate(
+                comments_count=comments_count_expression(AgencyComments, "agency"),
+                average_rating=rating_expression(),
+            )
+        )
+
     @property
     def franchise_id(self):
         return self.agency_id
@@ -870,6 +1024,27 @@ class Specialists(models.Model):
         managed = True
         db_table = "specialists"
 
+    CARD_FIELDS = (
+        "specialist_id", "title", "planet_image", "logo_urls", "status", "created_at", "updated_at",
+        "total_voters", "sum_votes", "short_description", "customization_data", "direction__direction_name",
+        "stage__stage_name",
+    ) + CARD_OWNER_FIELDS
+
+    @classmethod
+    def card_queryset(cls):
+        """
+        Queryset для карточек и списков: только отображаемые колонки, направление,
+        стадия и владелец одним JOIN, число комментариев и рейтинг — аннотациями.
+        """
+        return (
+            cls.objects.select_related("direction", "stage", "owner")
+            .only(*cls.CARD_FIELDS)
+            .annotate(
+                comments_count=comments_count_expression(SpecialistComments, "specialist"),
+                average_rating=rating_expression(),
+            )
+        )
+
     def get_average_rating(self):
         if self.total_voters > 0:
             return self.sum_votes / self.total_voters
@@ -971,4 +1146,24 @@ class AgencyComments(models.Model):
         db_table = "agency_comments"
 
     def __str__(self) -> str:
-        return f"AgencyComment {self.comment_id} by {self.user}"
\ No newline at end of file
+        return f"AgencyComment {self.comment_id} by {self.user}"
+
+class SimilarEntities(models.Model):
+    """
+    Предвычисленные соседи карточки для каруселей «похожие».
+    Таблицу целиком пересобирает команда build_similarities.
+    """
+    similarity_id = models.AutoField(primary_key=True)
+    entity_type = models.CharField(max_length=20)
+    entity_id = models.IntegerField()
+    similar_id = models.IntegerField()
+    rank = models.SmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        managed = True
+        db_table = "similar_entities"
+        unique_together = ("entity_type", "entity_id", "similar_id")
+
+    def __str__(self):
+        return f"{self.entity_type} {self.entity_id} -> {self.similar_id} ({self.score:.3f})"
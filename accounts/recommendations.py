@@ -0,0 +1,177 @@
+"""
+Рекомендации для каруселей «похожие»: офлайн-построение соседей карточек по
+контентным признакам (TF-IDF названия и описания, направление, стадия, диапазон
+суммы, режим инвестирования) и выборка готовых соседей одним индексным запросом.
+"""
+import bisect
+import collections
+import heapq
+import logging
+import math
+import re
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from accounts.models import Agencies, Franchises, SimilarEntities, Specialists, Startups
+from accounts.search import normalize_search_query
+from accounts.utils import CATALOG_AMOUNT_EDGES
+logger = logging.getLogger(__name__)
+SIMILAR_TOP_K = 8
+SIMILAR_CAROUSEL_SIZE = 4
+SIMILAR_BATCH_SIZE = 500
+# Вес косинусной близости текста и бонусы за совпадение структурных признаков
+SIMILAR_TEXT_WEIGHT = 0.4
+SIMILAR_FEATURE_WEIGHTS = {"group": 0.35, "stage": 0.1, "amount": 0.1, "mode": 0.05}
+# Термы, встречающиеся чаще чем в этой доле документов, не различают карточки
+SIMILAR_MAX_DF = 0.5
+# Сколько самых весомых термов документа участвуют в поиске кандидатов
+SIMILAR_QUERY_TERMS = 16
+# Сколько документов с наибольшим весом терма хранится в его списке (champion list)
+SIMILAR_POSTINGS_LIMIT = 100
+# Сколько лучших по тексту кандидатов переоценивается с учётом признаков
+SIMILAR_TEXT_CANDIDATES = 64
+# Сколько карточек той же группы добавляется в кандидаты без общих термов
+SIMILAR_GROUP_CANDIDATES = 50
+# Грубое усечение словоформ вместо стемминга
+SIMILAR_STEM_LENGTH = 6
+TOKEN_RE = re.compile(r"[^\W\d_]{3,}")
+def _startup_features(row):
+    mode = "both" if row["both_mode"] else "buy" if row["only_buy"] else "invest" if row["only_invest"] else None
+    return row["direction_id"], row["stage_id"], row["funding_goal"], mode
+def _franchise_features(row):
+    return row["direction_id"], row["stage_id"], row["investment_size"], None
+def _category_features(category_field):
+    def features(row):
+        data = row["customization_data"] if isinstance(row["customization_data"], dict) else {}
+        return data.get(category_field) or row["direction_id"], row["stage_id"], None, None
+    return features
+SIMILAR_SOURCES = {
+    "startup": (Startups, ("funding_goal", "only_invest", "only_buy", "both_mode"), _startup_features),
+    "franchise": (Franchises, ("investment_size",), _franchise_features),
+    "agency": (Agencies, ("customization_data",), _category_features("agency_category")),
+    "specialist": (Specialists, ("customization_data",), _category_features("specialist_category")),
+}
+def tokenize(text):
+    """
+    Термы текста: casefold, ё -> е, только буквенные слова от трёх символов,
+    усечённые до SIMILAR_STEM_LENGTH.
+    """
+    return [token[:SIMILAR_STEM_LENGTH] for token in TOKEN_RE.findall(normalize_search_query(text))]
+def _amount_bucket(amount):
+    if amount is None:
+        return None
+    return bisect.bisect_right(CATALOG_AMOUNT_EDGES, amount)
+def tfidf_vectors(documents, max_df=SIMILAR_MAX_DF):
+    """
+    Разреженные TF-IDF векторы ({терм: вес}, L2-нормированные) для списков термов.
+    Сублинейный TF, сглаженный IDF; слишком частые термы отбрасываются.
+    """
+    df = collections.Counter()
+    for tokens in documents:
+        df.update(set(tokens))
+    total = len(documents)
+    limit = max(2, max_df * total)
+    idf = {term: math.log((1 + total) / (1 + count)) + 1 for term, count in df.items() if count <= limit}
+    vectors = []
+    for tokens in documents:
+        weights = {
+            term: (1 + math.log(count)) * idf[term]
+            for term, count in collections.Counter(tokens).items()
+            if term in idf
+        }
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        vectors.append({term: weight / norm for term, weight in weights.items()} if norm else {})
+    return vectors
+def _load_documents(entity_type):
+    model, extra_fields, features = SIMILAR_SOURCES[entity_type]
+    rows = (
+        model.objects.filter(status="approved")
+        .order_by("-created_at")
+        .values("pk", "title", "short_description", "description", "direction_id", "stage_id", *extra_fields)
+    )
+    ids, documents, feature_rows = [], [], []
+    for row in rows:
+        group, stage, amount, mode = features(row)
+        ids.append(row["pk"])
+        title = row["title"] or ""
+        documents.append(tokenize(title) * 2 + tokenize(f"{row['short_description'] or ''} {row['description'] or ''}"))
+        feature_rows.append({"group": group, "stage": stage, "amount": _amount_bucket(amount), "mode": mode})
+    return ids, documents, feature_rows
+def _feature_bonus(left, right):
+    return sum(
+        weight for name, weight in SIMILAR_FEATURE_WEIGHTS.items()
+        if left[name] is not None and left[name] == right[name]
+    )
+def compute_neighbours(ids, documents, feature_rows, top_k=SIMILAR_TOP_K, batch_size=SIMILAR_BATCH_SIZE):
+    """
+    Генератор пачек соседей [(entity_id, similar_id, rank, score), ...] по batch_size документов.
+    Кандидаты — документы с общими термами (через инвертированный индекс по
+    SIMILAR_QUERY_TERMS самым весомым термам, в каждом терме не больше
+    SIMILAR_POSTINGS_LIMIT документов; лучшие SIMILAR_TEXT_CANDIDATES из них)
+    и первые карточки той же группы;
+    итоговая оценка — взвешенный косинус текста плюс бонусы за совпавшие признаки.
+    """
+    vectors = tfidf_vectors(documents)
+    postings = collections.defaultdict(list)
+    for index, vector in enumerate(vectors):
+        for term, weight in vector.items():
+            postings[term].append((index, weight))
+    for term, documents_weights in postings.items():
+        postings[term] = heapq.nlargest(SIMILAR_POSTINGS_LIMIT, documents_weights, key=lambda item: item[1])
+    groups = collections.defaultdict(list)
+    for index, features in enumerate(feature_rows):
+        if features["group"] is not None and len(groups[features["group"]]) < SIMILAR_GROUP_CANDIDATES:
+            groups[features["group"]].append(index)
+    for start in range(0, len(ids), batch_size):
+        batch = []
+        for index in range(start, min(start + batch_size, len(ids))):
+            text_scores = collections.defaultdict(float)
+            query_terms = heapq.nlargest(SIMILAR_QUERY_TERMS, vectors[index].items(), key=lambda item: item[1])
+            for term, weight in query_terms:
+                for other, other_weight in postings[term]:
+                    text_scores[other] += weight * other_weight
+            candidates = set(heapq.nlargest(SIMILAR_TEXT_CANDIDATES, text_scores, key=text_scores.get))
+            candidates.update(groups.get(feature_rows[index]["group"], ()))
+            candidates.discard(index)
+            scored = (
+                (SIMILAR_TEXT_WEIGHT * text_scores.get(other, 0.0) + _feature_bonus(feature_rows[index], feature_rows[other]), other)
+                for other in candidates
+            )
+            for rank, (score, other) in enumerate(heapq.nlargest(top_k, scored)):
+                if score > 0:
+                    batch.append((ids[index], ids[other], rank, score))
+        yield batch
+def build_similarities(entity_type, top_k=SIMILAR_TOP_K, batch_size=SIMILAR_BATCH_SIZE):
+    """
+    Пересчитывает соседей всех одобренных карточек типа и атомарно заменяет
+    ими строки similar_entities этого типа. Возвращает (карточек, записано строк).
+    """
+    ids, documents, feature_rows = _load_documents(entity_type)
+    written = 0
+    with transaction.atomic():
+        SimilarEntities.objects.filter(entity_type=entity_type).delete()
+        for batch in compute_neighbours(ids, documents, feature_rows, top_k, batch_size):
+            SimilarEntities.objects.bulk_create(
+                [
+                    SimilarEntities(entity_type=entity_type, entity_id=entity_id, similar_id=similar_id, rank=rank, score=score)
+                    for entity_id, similar_id, rank, score in batch
+                ],
+                batch_size=2000,
+            )
+            written += len(batch)
+    logger.info(f"Похожие {entity_type}: {len(ids)} карточек, {written} связей")
+    return len(ids), written
+def similar_entities(entity_type, entity_id, queryset, fallback=None, limit=SIMILAR_CAROUSEL_SIZE):
+    """
+    Готовые соседи карточки из similar_entities в порядке ранга — один запрос
+    по индексу (entity_type, entity_id, similar_id). Если для карточки соседей
+    ещё нет (создана после последней сборки), карточки берутся из fallback().
+    """
+    neighbours = SimilarEntities.objects.filter(entity_type=entity_type, entity_id=entity_id)
+    items = list(
+        queryset.filter(pk__in=Subquery(neighbours.order_by("rank").values("similar_id")[:limit * 2]))
+        .annotate(similar_rank=Subquery(neighbours.filter(similar_id=OuterRef("pk")).values("rank")[:1]))
+        .order_by("similar_rank")[:limit]
+    )
+    if not items and fallback is not None:
+        items = list(fallback())
+    return items
@@ -0,0 +1,593 @@
+"""
+Полнотекстовый поиск по пользователям и каталогу (стартапы, франшизы, агентства,
+специалисты). На PostgreSQL используются GIN-индексы по выражению to_tsvector
+(конфигурации russian + simple), и все типы сущностей ищутся одним UNION-запросом
+с ранжированием; пользователи дополнительно находятся по префиксу email. На других СУБД — запасной вариант через icontains.
+Подсказки по пользователям (typeahead) идут через префиксные и триграммные индексы,
+автодополнение названий — через индекс префиксов в памяти процесса. Ответы поисковых
+эндпоинтов кэшируются на короткое время по нормализованному запросу.
+"""
+import bisect
+import collections
+import hashlib
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.postgres.lookups import TrigramSimilar
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+from django.urls import reverse
+from django.utils import timezone
+logger = logging.getLogger(__name__)
+SEARCH_RESULT_LIMIT = 5
+SEARCH_MIN_QUERY_LENGTH = 2
+TYPEAHEAD_FIELDS = ("first_name", "last_name", "email")
+TYPEAHEAD_LIMIT = 10
+TYPEAHEAD_MAX_LIMIT = 50
+TYPEAHEAD_TRIGRAM_MIN_LENGTH = 3
+# Раздел ответа -> (таблица, первичный ключ, выражение названия, условие видимости)
+SEARCH_SOURCES = {
+    "users": (
+        "users",
+        "user_id",
+        "coalesce(nullif(trim(coalesce(first_name, '') || ' ' || coalesce(last_name, '')), ''), email)",
+        "",
+    ),
+    "startups": ("startups", "startup_id", "title", "AND status = 'approved' AND title <> ''"),
+    "franchises": ("franchises", "franchise_id", "title", "AND status = 'approved' AND title <> ''"),
+    "agencies": ("agencies", "startup_id", "title", "AND status = 'approved' AND title <> ''"),
+    "specialists": ("specialists", "startup_id", "title", "AND status = 'approved' AND title <> ''"),
+}
+SEARCH_RESULT_TYPES = {
+    "users": ("user", "user_profile", "user_id"),
+    "startups": ("startup", "startup_detail", "startup_id"),
+    "franchises": ("franchise", "franchise_detail", "franchise_id"),
+    "agencies": ("agency", "agency_detail", "franchise_id"),
+    "specialists": ("specialist", "specialist_detail", "specialist_id"),
+}
+def _weighted_vector(column, weight):
+    return (
+        f"setweight(to_tsvector('russian', coalesce({column}, '')), '{weight}') || "
+        f"setweight(to_tsvector('simple', coalesce({column}, '')), '{weight}')"
+    )
+# Раздел -> выражение tsvector. Должно буква в букву совпадать с выражениями
+# индексов *_search_tsv_idx: миграция 0054 строит индексы по этим же строкам
+_CATALOG_VECTOR = f"{_weighted_vector('title', 'A')} || {_weighted_vector('short_description', 'B')}"
+SEARCH_VECTORS = {
+    "users": f"{_weighted_vector('first_name', 'A')} || {_weighted_vector('last_name', 'A')}",
+    "startups": _CATALOG_VECTOR,
+    "franchises": _CATALOG_VECTOR,
+    "agencies": _CATALOG_VECTOR,
+    "specialists": _CATALOG_VECTOR,
+}
+def empty_results():
+    return {section: [] for section in SEARCH_SOURCES}
+def build_prefix_tsquery(query):
+    """
+    Превращает пользовательский ввод в текст tsquery: каждое слово ищется по префиксу,
+    слова объединяются через AND. Возвращает None, если в запросе нет слов.
+    """
+    words = re.findall(r"\w+", query.lower())
+    if not words:
+        return None
+    return " & ".join(f"{word}:*" for word in words[:8])
+def _union_sql(sections, limit):
+    """
+    Текст UNION-запроса по разделам. Параметры: tsquery дважды (russian и simple),
+    затем шаблон префикса email, если среди разделов есть пользователи.
+    """
+    parts = []
+    for section in sections:
+        table, pk, name_sql, condition = SEARCH_SOURCES[section]
+        vector = SEARCH_VECTORS[section]
+        match = f"({vector}) @@ q.query"
+        if section == "users":
+            # email не разбирается на слова, поэтому частичный email ищется по
+            # префиксу через индекс users_email_upper_prefix_idx (UPPER(email) LIKE 'X%')
+            match = f"({match} OR UPPER(email::text) LIKE UPPER(%s))"
+        parts.append(
+            f"(SELECT '{section}' AS section, {pk} AS id, {name_sql} AS name, "
+            f"ts_rank_cd({vector}, q.query) AS rank "
+            f"FROM {table}, q WHERE {match} {condition} "
+            f"ORDER BY rank DESC, {pk} DESC LIMIT {int(limit)})"
+        )
+    return (
+        "WITH q AS (SELECT to_tsquery('russian', %s) || to_tsquery('simple', %s) AS query) "
+        + " UNION ALL ".join(parts)
+    )
+def _like_prefix(query):
+    return re.sub(r"([\\%_])", r"\\\1", query) + "%"
+def fulltext_search_rows(query, sections=None, limit=SEARCH_RESULT_LIMIT):
+    """
+    Выполняет поиск одним запросом к PostgreSQL. Возвращает список кортежей
+    (раздел, id, название, ранг), внутри раздела — по убыванию ранга.
+    """
+    tsquery = build_prefix_tsquery(query)
+    if not tsquery:
+        return []
+    sections = sections or list(SEARCH_SOURCES)
+    params = [tsquery, tsquery] + [_like_prefix(query) for section in sections if section == "users"]
+    with connection.cursor() as cursor:
+        cursor.execute(_union_sql(sections, limit), params)
+        return cursor.fetchall()
+def icontains_search_rows(query, sections=None, limit=SEARCH_RESULT_LIMIT):
+    """
+    Запасной поиск через icontains для СУБД без полнотекстового поиска (локальный sqlite).
+    """
+    from accounts.models import Agencies, Franchises, Specialists, Startups, Users
+    rows = []
+    sections = sections or list(SEARCH_SOURCES)
+    if "users" in sections:
+        users = Users.objects.filter(
+            Q(first_name__icontains=query) | Q(last_name__icontains=query) | Q(email__icontains=query)
+        ).only("user_id", "first_name", "last_name", "email")[:limit]
+        for user in users:
+            name = f"{user.first_name or ''} {user.last_name or ''}".strip() or user.email
+            rows.append(("users", user.user_id, name, 0.0))
+    for section, model in (
+        ("startups", Startups),
+        ("franchises", Franchises),
+        ("agencies", Agencies),
+        ("specialists", Specialists),
+    ):
+        if section not in sections:
+            continue
+        entities = (
+            model.objects.filter(Q(title__icontains=query) | Q(short_description__icontains=query))
+            .filter(status="approved")
+            .exclude(title__isnull=True)
+            .exclude(title="")
+            .values_list("pk", "title")[:limit]
+        )
+        rows.extend((section, pk, title, 0.0) for pk, title in entities)
+    return rows
+_section_executor = None
+_section_executor_lock = threading.Lock()
+def _get_section_executor():
+    global _section_executor
+    with _section_executor_lock:
+        if _section_executor is None:
+            _section_executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "GLOBAL_SEARCH_WORKERS", 10),
+                thread_name_prefix="global-search",
+            )
+        return _section_executor
+def _search_section(query, section, limit, deadline_ms):
+    """
+    Поиск одного раздела в потоке пула на собственном соединении с БД. На PostgreSQL
+    запрос ограничен statement_timeout, чтобы опоздавший раздел не держал соединение.
+    Возвращает (строки, время в мс).
+    """
+    close_old_connections()
+    started = time.perf_counter()
+    try:
+        if connection.vendor == "postgresql":
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT set_config('statement_timeout', %s, true)", [str(int(deadline_ms))])
+                rows = fulltext_search_rows(query, [section], limit)
+        else:
+            rows = icontains_search_rows(query, [section], limit)
+        return rows, (time.perf_counter() - started) * 1000
+    finally:
+        close_old_connections()
+def global_search_results(query, sections=None, limit=SEARCH_RESULT_LIMIT):
+    """
+    Результаты глобального поиска в формате ответа global_search:
+    {'users': [...], 'startups': [...], ..., 'partial': bool}, элемент — {'id', 'name', 'type', 'url'}.
+    Разделы ищутся параллельно; раздел, не уложившийся в GLOBAL_SEARCH_SECTION_DEADLINE_MS
+    или упавший с ошибкой, возвращается пустым, а 'partial' становится True.
+    Вторым значением возвращает {раздел: (мс, статус)} для заголовка Server-Timing.
+    """
+    results = empty_results()
+    results["partial"] = False
+    timings = {}
+    if len(query) < SEARCH_MIN_QUERY_LENGTH:
+        return results, timings
+    sections = sections or list(SEARCH_SOURCES)
+    deadline_ms = getattr(settings, "GLOBAL_SEARCH_SECTION_DEADLINE_MS", 300)
+    executor = _get_section_executor()
+    futures = {
+        executor.submit(_search_section, query, section, limit, deadline_ms): section
+        for section in sections
+    }
+    done, pending = wait(futures, timeout=deadline_ms / 1000)
+    for future in pending:
+        future.cancel()
+        timings[futures[future]] = (deadline_ms, "timeout")
+        results["partial"] = True
+    for future in done:
+        section = futures[future]
+        try:
+            rows, elapsed_ms = future.result()
+        except Exception as e:
+            logger.error(f"Ошибка при поиске в разделе {section}: {e}")
+            timings[section] = (deadline_ms, "error")
+            results["partial"] = True
+            continue
+        timings[section] = (elapsed_ms, "ok")
+        for _section, entity_id, name, _rank in rows:
+            result_type, url_name, url_kwarg = SEARCH_RESULT_TYPES[section]
+            results[section].append({
+                "id": entity_id,
+                "name": name,
+                "type": result_type,
+                "url": reverse(url_name, kwargs={url_kwarg: entity_id}),
+            })
+    return results, timings
+def server_timing_header(timings):
+    """
+    Значение заголовка Server-Timing: 'startups;dur=4.2, users;desc="timeout";dur=300.0'.
+    """
+    parts = []
+    for section, (elapsed_ms, status) in timings.items():
+        desc = f';desc="{status}"' if status != "ok" else ""
+        parts.append(f"{section}{desc};dur={elapsed_ms:.1f}")
+    return ", ".join(parts)
+def typeahead_users(queryset, query, limit=TYPEAHEAD_LIMIT):
+    """
+    Подсказки пользователей по имени, фамилии и email из переданного queryset.
+    Сначала префиксный проход (istartswith по индексам UPPER(col) text_pattern_ops),
+    затем, если лимит не набран, триграммное сходство (оператор % по GIN-индексам
+    pg_trgm) с порогом TYPEAHEAD_SIMILARITY_THRESHOLD. Результатов не больше limit,
+    но и не больше TYPEAHEAD_MAX_LIMIT.
+    """
+    query = (query or "").strip()
+    try:
+        limit = int(limit or TYPEAHEAD_LIMIT)
+    except (TypeError, ValueError):
+        limit = TYPEAHEAD_LIMIT
+    limit = max(1, min(limit, TYPEAHEAD_MAX_LIMIT))
+    if len(query) < SEARCH_MIN_QUERY_LENGTH:
+        return []
+    prefix_filter = Q()
+    for field in TYPEAHEAD_FIELDS:
+        prefix_filter |= Q(**{f"{field}__istartswith": query})
+    users = list(queryset.filter(prefix_filter).order_by("user_id")[:limit])
+    if len(users) >= limit or len(query) < TYPEAHEAD_TRIGRAM_MIN_LENGTH:
+        return users
+    remaining = queryset.exclude(user_id__in=[user.user_id for user in users])
+    if connection.vendor != "postgresql":
+        contains_filter = Q()
+        for field in TYPEAHEAD_FIELDS:
+            contains_filter |= Q(**{f"{field}__icontains": query})
+        return users + list(remaining.filter(contains_filter).order_by("user_id")[:limit - len(users)])
+    similar_filter = Q()
+    for field in TYPEAHEAD_FIELDS:
+        similar_filter |= Q(TrigramSimilar(F(field), query))
+    threshold = getattr(settings, "TYPEAHEAD_SIMILARITY_THRESHOLD", 0.3)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT set_config('pg_trgm.similarity_threshold', %s, true)", [str(threshold)])
+        similar = list(
+            remaining.filter(similar_filter)
+            .annotate(similarity=Greatest(*(TrigramSimilarity(field, query) for field in TYPEAHEAD_FIELDS)))
+            .order_by("-similarity", "user_id")[:limit - len(users)]
+        )
+    return users + similar
+AUTOCOMPLETE_ENTITY_SECTIONS = {
+    "startup": "startups",
+    "franchise": "franchises",
+    "agency": "agencies",
+    "specialist": "specialists",
+}
+_normalize_re = re.compile(r"[^\w]+")
+def normalize_title(title):
+    return _normalize_re.sub(" ", (title or "").lower().replace("ё", "е")).strip()
+class TitlePrefixIndex:
+    """
+    Индекс префиксов названий в памяти процесса: отсортированный список ключей
+    (нормализованный хвост названия с начала каждого слова, обрезанный до key_length,
+    тип, id) и поиск через bisect. Запись добавляется, только пока оценка занимаемой
+    памяти укладывается в budget_bytes.
+    """
+    ENTRY_OVERHEAD = 120
+    def __init__(self, budget_bytes, max_title_length=80, key_length=24):
+        self.budget_bytes = budget_bytes
+        self.max_title_length = max_title_length
+        self.key_length = key_length
+        self._keys = []
+        self._titles = {}
+        self._bytes = 0
+        self._skipped = 0
+        self._lock = threading.Lock()
+    def _entry_keys(self, entity_type, entity_id, title):
+        normalized = normalize_title(title)[:self.max_title_length]
+        words = normalized.split(" ")
+        return [
+            (" ".join(words[position:])[:self.key_length], entity_type, entity_id)
+            for position in range(len(words))
+            if words[position]
+        ]
+    def _entry_size(self, keys, title):
+        return sum(len(key[0]) * 2 + self.ENTRY_OVERHEAD for key in keys) + len(title) * 2 + self.ENTRY_OVERHEAD
+    def _remove_locked(self, entity_type, entity_id):
+        title = self._titles.pop((entity_type, entity_id), None)
+        if title is None:
+            return
+        keys = self._entry_keys(entity_type, entity_id, title)
+        for key in keys:
+            position = bisect.bisect_left(self._keys, key)
+            if position < len(self._keys) and self._keys[position] == key:
+                del self._keys[position]
+        self._bytes -= self._entry_size(keys, title)
+    def _add_locked(self, entity_type, entity_id, title):
+        keys = self._entry_keys(entity_type, entity_id, title)
+        if not keys:
+            return
+        size = self._entry_size(keys, title)
+        if self._bytes + size > self.budget_bytes:
+            self._skipped += 1
+            return
+        for key in keys:
+            bisect.insort(self._keys, key)
+        self._titles[(entity_type, entity_id)] = title
+        self._bytes += size
+    def upsert(self, entity_type, entity_id, title, visible=True):
+        """
+        Добавляет, обновляет или (visible=False) удаляет название сущности.
+        """
+        with self._lock:
+            self._remove_locked(entity_type, entity_id)
+            if visible and title:
+                self._add_locked(entity_type, entity_id, title)
+    def remove(self, entity_type, entity_id):
+        with self._lock:
+            self._remove_locked(entity_type, entity_id)
+    def apply(self, changes):
+        """
+        Пакетно применяет изменения [(тип, id, название, видима ли), ...]: ключи
+        затронутых сущностей отбрасываются одним проходом, новые дописываются,
+        и список сортируется один раз вместо вставки каждого ключа через insort.
+        """
+        changes = {(entity_type, entity_id): (title, visible) for entity_type, entity_id, title, visible in changes}
+        if not changes:
+            return
+        with self._lock:
+            keys = [key for key in self._keys if (key[1], key[2]) not in changes]
+            for (entity_type, entity_id), (title, visible) in changes.items():
+                old_title = self._titles.pop((entity_type, entity_id), None)
+                if old_title is not None:
+                    self._bytes -= self._entry_size(self._entry_keys(entity_type, entity_id, old_title), old_title)
+                if not (visible and title):
+                    continue
+                entry_keys = self._entry_keys(entity_type, entity_id, title)
+                if not entry_keys:
+                    continue
+                size = self._entry_size(entry_keys, title)
+                if self._bytes + size > self.budget_bytes:
+                    self._skipped += 1
+                    continue
+                keys.extend(entry_keys)
+                self._titles[(entity_type, entity_id)] = title
+                self._bytes += size
+            keys.sort()
+            self._keys = keys
+    def rebuild(self, entries):
+        """
+        Полностью перестраивает индекс из итерируемого (тип, id, название).
+        Ключи собираются и сортируются один раз, без поэлементной вставки.
+        """
+        keys = []
+        titles = {}
+        used = 0
+        skipped = 0
+        for entity_type, entity_id, title in entries:
+            entry_keys = self._entry_keys(entity_type, entity_id, title)
+            if not entry_keys:
+                continue
+            size = self._entry_size(entry_keys, title)
+            if used + size > self.budget_bytes:
+                skipped += 1
+                continue
+            keys.extend(entry_keys)
+            titles[(entity_type, entity_id)] = title
+            used += size
+        keys.sort()
+        with self._lock:
+            self._keys, self._titles, self._bytes, self._skipped = keys, titles, used, skipped
+    def lookup(self, prefix, limit=TYPEAHEAD_LIMIT):
+        """
+        Возвращает до limit кортежей (тип, id, название), у которых какое-либо слово
+        названия (вместе с продолжением) начинается с prefix.
+        """
+        prefix = normalize_title(prefix)
+        if not prefix:
+            return []
+        key_prefix = prefix[:self.key_length]
+        results = []
+        seen = set()
+        with self._lock:
+            position = bisect.bisect_left(self._keys, (key_prefix,))
+            while position < len(self._keys) and len(results) < limit:
+                key, entity_type, entity_id = self._keys[position]
+                if not key.startswith(key_prefix):
+                    break
+                position += 1
+                if (entity_type, entity_id) in seen:
+                    continue
+                title = self._titles[(entity_type, entity_id)]
+                if len(prefix) > self.key_length and f" {prefix}" not in f" {normalize_title(title)}":
+                    continue
+                seen.add((entity_type, entity_id))
+                results.append((entity_type, entity_id, title))
+        return results
+    def stats(self):
+        with self._lock:
+            return {
+                "entities": len(self._titles),
+                "keys": len(self._keys),
+                "estimated_bytes": self._bytes,
+                "budget_bytes": self.budget_bytes,
+                "skipped": self._skipped,
+            }
+_title_index = None
+_title_index_lock = threading.Lock()
+_title_index_state = {"built_at": 0.0, "polled_at": 0.0, "watermark": None, "polling": False}
+def _autocomplete_models():
+    from accounts.models import Agencies, Franchises, Specialists, Startups
+    return {"startup": Startups, "franchise": Franchises, "agency": Agencies, "specialist": Specialists}
+def _approved_titles():
+    for entity_type, model in _autocomplete_models().items():
+        rows = model.objects.filter(status="approved").order_by("-updated_at").values_list("pk", "title")
+        for entity_id, title in rows.iterator(chunk_size=2000):
+            yield entity_type, entity_id, title
+def rebuild_title_index():
+    """
+    Перестраивает индекс названий процесса из БД и запоминает отметку updated_at
+    для последующего опроса изменений.
+    """
+    global _title_index
+    index = _title_index or TitlePrefixIndex(
+        getattr(settings, "AUTOCOMPLETE_MEMORY_BUDGET_MB", 64) * 1024 * 1024
+    )
+    now = timezone.now()
+    index.rebuild(_approved_titles())
+    _title_index = index
+    _title_index_state.update(built_at=time.monotonic(), polled_at=time.monotonic(), watermark=now)
+    logger.info(f"Индекс автодополнения построен: {index.stats()}")
+    return index
+def poll_title_index_changes():
+    """
+    Применяет к индексу сущности, изменённые после последнего опроса (updated_at,
+    индексы *_updated_at_idx), чтобы воркеры подхватывали одобрения и правки,
+    сделанные в других процессах. Выполняется в фоновом потоке: запросы к БД идут
+    без глобальной блокировки, а изменения применяются к индексу одним пакетом.
+    """
+    try:
+        watermark = _title_index_state["watermark"]
+        now = timezone.now()
+        changes = []
+        for entity_type, model in _autocomplete_models().items():
+            changed = model.objects.filter(updated_at__gte=watermark).values_list("pk", "title", "status")
+            changes.extend(
+                (entity_type, entity_id, title, status == "approved") for entity_id, title, status in changed
+            )
+        _title_index.apply(changes)
+        _title_index_state.update(watermark=now)
+    finally:
+        _title_index_state.update(polled_at=time.monotonic(), polling=False)
+def _run_in_background(func, name):
+    def run():
+        try:
+            func()
+        except Exception as e:
+            logger.error(f"Ошибка фонового построения индекса автодополнения: {e}")
+        finally:
+            connection.close()
+    threading.Thread(target=run, name=name, daemon=True).start()
+def get_title_index():
+    """
+    Индекс названий текущего процесса: строится при первом обращении, раз в
+    AUTOCOMPLETE_POLL_SECONDS догоняет изменения по updated_at и раз в
+    AUTOCOMPLETE_REBUILD_SECONDS перестраивается целиком (удаления, пропущенные опросом).
+    Опрос и перестройка запускаются в фоновых потоках, запрос их не ждёт.
+    """
+    with _title_index_lock:
+        if _title_index is None:
+            return rebuild_title_index()
+        now = time.monotonic()
+        if now - _title_index_state["built_at"] > getattr(settings, "AUTOCOMPLETE_REBUILD_SECONDS", 1800):
+            _title_index_state["built_at"] = now
+            _run_in_background(rebuild_title_index, "title-index-rebuild")
+        elif (
+            not _title_index_state["polling"]
+            and now - _title_index_state["polled_at"] > getattr(settings, "AUTOCOMPLETE_POLL_SECONDS", 30)
+        ):
+            _title_index_state["polling"] = True
+            _run_in_background(poll_title_index_changes, "title-index-poll")
+        return _title_index
+def update_title_index(entity_type, entity_id, title, visible):
+    """
+    Точечное обновление индекса из сигналов одобрения, редактирования и удаления.
+    """
+    if _title_index is not None:
+        _title_index.upsert(entity_type, entity_id, title, visible)
+def start_title_index_warmup():
+    """
+    Строит индекс в фоновом потоке при старте воркера, не задерживая первый запрос.
+    """
+    _run_in_background(get_title_index, "title-index-warmup")
+def autocomplete_titles(query, limit=TYPEAHEAD_LIMIT):
+    """
+    Подсказки по названиям одобренных стартапов, франшиз, агентств и специалистов
+    из индекса в памяти: [{'id', 'name', 'type', 'url'}].
+    """
+    results = []
+    for entity_type, entity_id, title in get_title_index().lookup(query, limit):
+        _result_type, url_name, url_kwarg = SEARCH_RESULT_TYPES[AUTOCOMPLETE_ENTITY_SECTIONS[entity_type]]
+        results.append({
+            "id": entity_id,
+            "name": title,
+            "type": entity_type,
+            "url": reverse(url_name, kwargs={url_kwarg: entity_id}),
+        })
+    return results
+SEARCH_CACHE_SCOPE_PUBLIC = "public"
+SEARCH_CACHE_GENERATION_KEY = "search_cache:generation"
+# Поля, изменение которых влияет на выдачу поиска
+SEARCH_ENTITY_FIELDS = frozenset({"title", "short_description", "status"})
+SEARCH_USER_FIELDS = frozenset({"first_name", "last_name", "email"})
+_search_cache_totals = collections.Counter()
+_search_cache_totals_lock = threading.Lock()
+def normalize_search_query(query):
+    """
+    Ключ кэша запроса: casefold, ё -> е, пробелы схлопнуты.
+    """
+    return " ".join((query or "").casefold().replace("ё", "е").split())
+def _search_cache_key(endpoint, scope, normalized):
+    generation = cache.get_or_set(SEARCH_CACHE_GENERATION_KEY, 1, None)
+    digest = hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+    return f"search_cache:{generation}:{endpoint}:{scope}:{digest}"
+def cached_search(endpoint, query, compute, scope=SEARCH_CACHE_SCOPE_PUBLIC):
+    """
+    Возвращает (значение, статус) для поискового эндпоинта из кэша или через compute().
+    compute() возвращает (значение, пусто ли, можно ли кэшировать); пустой результат
+    кэшируется на SEARCH_NEGATIVE_CACHE_TTL, непустой — на SEARCH_CACHE_TTL.
+    Статус: 'hit', 'negative_hit' или 'miss'.
+    """
+    key = _search_cache_key(endpoint, scope, normalize_search_query(query))
+    entry = cache.get(key)
+    if entry is not None:
+        status = "negative_hit" if entry[0] else "hit"
+        value = entry[1]
+    else:
+        status = "miss"
+        value, empty, cacheable = compute()
+        if cacheable:
+            ttl_setting = "SEARCH_NEGATIVE_CACHE_TTL" if empty else "SEARCH_CACHE_TTL"
+            cache.set(key, (empty, value), getattr(settings, ttl_setting, 10 if empty else 30))
+    with _search_cache_totals_lock:
+        _search_cache_totals[(endpoint, status)] += 1
+    return value, status
+def invalidate_search_cache():
+    """
+    Сбрасывает все закэшированные ответы поиска, сменив поколение ключей.
+    Старые записи дотирают по TTL. С LocMemCache поколение меняется только
+    в текущем воркере, поэтому в остальных выдача устаревает не дольше
+    SEARCH_CACHE_TTL, ограниченного CACHE_PER_WORKER_MAX_TIMEOUT.
+    """
+    try:
+        cache.incr(SEARCH_CACHE_GENERATION_KEY)
+    except ValueError:
+        cache.set(SEARCH_CACHE_GENERATION_KEY, 2, None)
+def get_search_cache_stats():
+    """
+    Попадания, отрицательные попадания, промахи и доля попаданий по эндпоинтам
+    за время жизни процесса.
+    """
+    with _search_cache_totals_lock:
+        totals = dict(_search_cache_totals)
+    stats = {}
+    for (endpoint, status), count in totals.items():
+        stats.setdefault(endpoint, {"hit": 0, "negative_hit": 0, "miss": 0})[status] = count
+    for counters in stats.values():
+        requests_count = sum(counters.values())
+        counters["hit_ratio"] = round((counters["hit"] + counters["negative_hit"]) / requests_count, 3)
+    return stats
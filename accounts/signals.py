@@ -1,6 +1,29 @@
 from allauth.socialaccount.signals import pre_social_login
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from .utils import update_user_from_telegram
+from .models import (
+    AgencyComments,
+    Agencies,
+    Comments,
+    FranchiseComments,
+    Franchises,
+    SpecialistComments,
+    Specialists,
+    Startups,
+    Users,
+)
+from .search import (
+    SEARCH_ENTITY_FIELDS,
+    SEARCH_USER_FIELDS,
+    invalidate_search_cache,
+    update_title_index,
+)
+from .utils import (
+    invalidate_card_fragment,
+    invalidate_catalog_facets,
+    invalidate_planet_snapshot,
+    update_user_from_telegram,
+)
 import logging
 logger = logging.getLogger(__name__)
 @receiver(pre_social_login)
@@ -12,3 +35,73 @@ def handle_telegram_login_update(request, sociallogin, **kwargs):
     if sociallogin and sociallogin.user.pk:
         logger.info(f"Signal pre_social_login caught for user {sociallogin.user.pk}. Triggering update.")
         update_user_from_telegram(sociallogin.user, sociallogin)
+CARD_ENTITY_TYPES = {
+    Startups: "startup",
+    Franchises: "franchise",
+    Agencies: "agency",
+    Specialists: "specialist",
+}
+@receiver([post_save, post_delete], sender=Startups)
+@receiver([post_save, post_delete], sender=Franchises)
+@receiver([post_save, post_delete], sender=Agencies)
+@receiver([post_save, post_delete], sender=Specialists)
+def invalidate_catalog_card(sender, instance, **kwargs):
+    """
+    Сбрасывает закэшированную карточку, фасеты каталога и снимок планетарной системы
+    при сохранении или удалении сущности (одобрение, отклонение, редактирование, голосование).
+    """
+    invalidate_card_fragment(CARD_ENTITY_TYPES[sender], instance.pk)
+    invalidate_catalog_facets(CARD_ENTITY_TYPES[sender])
+    if sender is Startups:
+        invalidate_planet_snapshot()
+@receiver(post_save, sender=Startups)
+@receiver(post_save, sender=Franchises)
+@receiver(post_save, sender=Agencies)
+@receiver(post_save, sender=Specialists)
+def update_title_autocomplete(sender, instance, **kwargs):
+    """
+    Обновляет индекс автодополнения процесса и сбрасывает кэш поиска при одобрении,
+    отклонении и правке названия.
+    """
+    update_fields = kwargs.get("update_fields")
+    if update_fields is None or SEARCH_ENTITY_FIELDS & set(update_fields):
+        invalidate_search_cache()
+    if {"title", "status"} & instance.get_deferred_fields():
+        return
+    update_title_index(CARD_ENTITY_TYPES[sender], instance.pk, instance.title, instance.status == "approved")
+@receiver(post_delete, sender=Startups)
+@receiver(post_delete, sender=Franchises)
+@receiver(post_delete, sender=Agencies)
+@receiver(post_delete, sender=Specialists)
+def remove_title_autocomplete(sender, instance, **kwargs):
+    """
+    Убирает удалённую сущность из индекса автодополнения процесса и сбрасывает кэш поиска.
+    """
+    update_title_index(CARD_ENTITY_TYPES[sender], instance.pk, None, False)
+    invalidate_search_cache()
+@receiver([post_save, post_delete], sender=Users)
+def invalidate_user_search(sender, instance, **kwargs):
+    """
+    Сбрасывает кэш поиска при изменении имени или email пользователя.
+    """
+    update_fields = kwargs.get("update_fields")
+    if update_fields is None or SEARCH_USER_FIELDS & set(update_fields):
+        invalidate_search_cache()
+COMMENT_ENTITY_FIELDS = {
+    Comments: ("startup", "startup_id_id"),
+    FranchiseComments: ("franchise", "franchise_id"),
+    AgencyComments: ("agency", "agency_id"),
+    SpecialistComments: ("specialist", "specialist_id"),
+}
+@receiver([post_save, post_delete], sender=Comments)
+@receiver([post_save, post_delete], sender=FranchiseComments)
+@receiver([post_save, post_delete], sender=AgencyComments)
+@receiver([post_save, post_delete], sender=SpecialistComments)
+def invalidate_commented_card(sender, instance, **kwargs):
+    """
+    Сбрасывает карточку сущности, у которой изменился список комментариев.
+    """
+    entity_type, field = COMMENT_ENTITY_FIELDS[sender]
+    entity_id = getattr(instance, field, None)
+    if entity_id:
+        invalidate_card_fragment(entity_type, entity_id)
@@ -1,6 +1,5 @@
 from django import template
-from accounts.utils import get_file_url, get_file_info, is_uuid
-from accounts.models import FileStorage, FileTypes
+from accounts.utils import get_file_url, get_original_file_name, is_uuid
 register = template.Library()
 @register.simple_tag
 def get_file_url_tag(file_id, startup_id, file_type, entity_type: str = "startup"):
@@ -16,25 +15,11 @@ def get_file_url_tag(file_id, startup_id, file_type, entity_type: str = "startup
 @register.simple_tag
 def get_file_original_name(file_id, startup_id, file_type, entity_type: str = "startup"):
     """
-    Получает оригинальное имя файла из базы данных или S3.
+    Получает оригинальное имя файла из кэша, базы данных или S3.
     """
     if not file_id:
         return ""
     if not is_uuid(file_id):
         return file_id.split('/')[-1] if '/' in file_id else file_id
-    if hasattr(FileStorage, 'original_file_name'):
-        try:
-            file_type_obj = FileTypes.objects.get(type_name=file_type)
-            file_storage = FileStorage.objects.filter(
-                startup_id=startup_id,
-                file_type=file_type_obj,
-                file_url=file_id
-            ).first()
-            if file_storage and hasattr(file_storage, 'original_file_name') and file_storage.original_file_name:
-                return file_storage.original_file_name
-        except FileTypes.DoesNotExist:
-            pass
-        except Exception:
-            pass
-    file_info = get_file_info(file_id, startup_id, file_type, entity_type=entity_type)
-    return file_info['original_name'] if file_info else f"{file_type}_{file_id[:8]}"
+    original_name = get_original_file_name(file_id, startup_id, file_type, entity_type=entity_type)
+    return original_name or f"{file_type}_{file_id[:8]}"
@@ -0,0 +1,444 @@
+import importlib.util
+import json
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from unittest import mock, skipUnless
+import requests
+from boto3.s3.transfer import TransferConfig
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from accounts import search, utils
+from accounts.models import (
+    Agencies,
+    Directions,
+    FileStorage,
+    Franchises,
+    ReviewStatuses,
+    Roles,
+    SimilarEntities,
+    Specialists,
+    Startups,
+    Users,
+    UserStatuses,
+)
+from accounts.recommendations import build_similarities, similar_entities
+from accounts.search import global_search_results
+from accounts.utils import (
+    PLANET_CATALOG_CACHE_KEY,
+    PLANET_SNAPSHOT_VERSION_KEY,
+    get_planet_urls,
+    get_s3_client,
+    refresh_planet_catalog,
+    stream_upload,
+)
+CARD_MODELS = (Startups, Franchises, Agencies, Specialists)
+class CardQuerysetTests(SimpleTestCase):
+    """
+    card_queryset выбирает из таблицы сущности только колонки CARD_FIELDS
+    (плюс первичный ключ и внешние ключи для JOIN), тяжёлые поля остаются отложенными.
+    """
+    def test_only_card_fields_are_selected(self):
+        for model in CARD_MODELS:
+            with self.subTest(model=model.__name__):
+                queryset = model.card_queryset()
+                allowed = {name.split("__")[0] for name in model.CARD_FIELDS} | {model._meta.pk.name}
+                deferred = {
+                    field for field in model._meta.concrete_fields if field.name not in allowed
+                }
+                self.assertTrue(deferred)
+                sql, _params = queryset.query.get_compiler(connection=connection).as_sql()
+                table = connection.ops.quote_name(model._meta.db_table)
+                for field in deferred:
+                    self.assertNotIn(f"{table}.{connection.ops.quote_name(field.column)}", sql)
+                for name in allowed:
+                    column = model._meta.get_field(name).column
+                    self.assertIn(f"{table}.{connection.ops.quote_name(column)}", sql)
+    def test_heavy_startup_fields_are_deferred(self):
+        startup = Startups.card_queryset().query
+        loaded, defer = startup.deferred_loading
+        self.assertFalse(defer)
+        for name in ("description", "terms", "customization_data", "creatives_urls", "proofs_urls", "video_urls"):
+            self.assertNotIn(name, loaded)
+class CardListQueryCountTests(TestCase):
+    """
+    Число запросов списков карточек не зависит от количества карточек на странице:
+    направление и владелец приходят JOIN-ом, комментарии и рейтинг — аннотациями.
+    """
+    CARDS_PER_TYPE = 8
+    # Сколько байт колонок строки карточки допустимо выбирать из базы
+    CARD_BYTES_BUDGET = 1024
+    # Имя URL -> (запросов при рендере страницы, запросов при AJAX-догрузке по курсору)
+    EXPECTED_QUERIES = {
+        "startups_list": (4, 2),
+        "franchises_list": (3, 2),
+        "agencies_list": (2, 1),
+        "specialists_list": (2, 1),
+    }
+    @classmethod
+    def setUpTestData(cls):
+        UserStatuses.objects.get_or_create(status_id=1, defaults={"status_name": "active"})
+        ReviewStatuses.objects.get_or_create(status_id=3, defaults={"status_name": "approved"})
+        direction = Directions.objects.create(direction_name="Technology")
+        owner = Users.objects.create(email="owner@example.com", first_name="Иван", last_name="Петров")
+        for model in CARD_MODELS:
+            for number in range(cls.CARDS_PER_TYPE):
+                model.objects.create(
+                    title=f"{model.__name__} {number}",
+                    short_description="Описание",
+                    status="approved",
+                    owner=owner,
+                    direction=direction,
+                    logo_urls=[],
+                )
+    def setUp(self):
+        cache.clear()
+    @staticmethod
+    def _fetched_bytes(queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return sum(len(str(value).encode()) for row in cursor.fetchall() for value in row if value is not None)
+    def test_card_page_fetched_bytes(self):
+        for model in CARD_MODELS:
+            model.objects.update(description="Подробное описание проекта. " * 200, terms="Условия сделки. " * 100)
+        for model in CARD_MODELS:
+            with self.subTest(model=model.__name__):
+                card_bytes = self._fetched_bytes(model.card_queryset().order_by("pk")[:6])
+                full_bytes = self._fetched_bytes(model.objects.select_related("direction", "stage", "owner").order_by("pk")[:6])
+                self.assertLess(card_bytes, 6 * self.CARD_BYTES_BUDGET)
+                self.assertLess(card_bytes * 10, full_bytes)
+    def test_list_pages_query_count(self):
+        for url_name, (page_queries, _cursor_queries) in self.EXPECTED_QUERIES.items():
+            with self.subTest(url_name=url_name):
+                cache.clear()
+                with self.assertNumQueries(page_queries):
+                    response = self.client.get(reverse(url_name))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.context["page_obj"]), 6)
+                self.assertIsNotNone(response.context["next_cursor"])
+    def test_cursor_pages_query_count(self):
+        for url_name, (_page_queries, cursor_queries) in self.EXPECTED_QUERIES.items():
+            with self.subTest(url_name=url_name):
+                cache.clear()
+                next_cursor = self.client.get(reverse(url_name)).context["next_cursor"]
+                cache.clear()
+                with self.assertNumQueries(cursor_queries):
+                    response = self.client.get(
+                        reverse(url_name),
+                        {"cursor": next_cursor},
+                        HTTP_X_REQUESTED_WITH="XMLHttpRequest",
+                    )
+                data = response.json()
+                self.assertFalse(data["has_next"])
+                self.assertIsNone(data["next_cursor"])
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+MOTO_SERVER_AVAILABLE = bool(importlib.util.find_spec("moto") and importlib.util.find_spec("flask"))
+class MotoS3ServerMixin:
+    """
+    Поднимает сервер moto в отдельном процессе и направляет на него S3-клиент приложения.
+    """
+    BUCKET = "accounts-test"
+    @classmethod
+    def s3_settings(cls):
+        return {}
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        port = _free_port()
+        cls.server = subprocess.Popen(
+            [sys.executable, "-m", "moto.server", "-H", "127.0.0.1", "-p", str(port)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        cls.addClassCleanup(cls.server.wait)
+        cls.addClassCleanup(cls.server.terminate)
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+        cls.settings_override = override_settings(
+            AWS_S3_ENDPOINT_URL=f"http://127.0.0.1:{port}",
+            AWS_S3_ADDRESSING_STYLE="path",
+            AWS_S3_REGION_NAME="us-east-1",
+            AWS_ACCESS_KEY_ID="testing",
+            AWS_SECRET_ACCESS_KEY="testing",
+            AWS_STORAGE_BUCKET_NAME=cls.BUCKET,
+            **cls.s3_settings(),
+        )
+        cls.settings_override.enable()
+        cls.addClassCleanup(cls.settings_override.disable)
+        utils._s3_client = None
+        cls.addClassCleanup(setattr, utils, "_s3_client", None)
+        get_s3_client().create_bucket(Bucket=cls.BUCKET)
+@skipUnless(MOTO_SERVER_AVAILABLE, "нужен moto[server]")
+class StreamUploadMemoryTests(MotoS3ServerMixin, SimpleTestCase):
+    """
+    stream_upload отправляет большой файл multipart-частями и держит в памяти
+    не больше max_in_memory_upload_chunks частей. Сервер moto работает в отдельном
+    процессе, поэтому хранимые им части не попадают в замер tracemalloc.
+    """
+    CHUNKSIZE = 5 * 1024 * 1024
+    CONCURRENCY = 2
+    FILE_SIZE = 96 * 1024 * 1024
+    @classmethod
+    def s3_settings(cls):
+        transfer_config = TransferConfig(
+            multipart_threshold=cls.CHUNKSIZE,
+            multipart_chunksize=cls.CHUNKSIZE,
+            max_concurrency=cls.CONCURRENCY,
+        )
+        transfer_config.max_in_memory_upload_chunks = cls.CONCURRENCY * 2
+        return {"AWS_S3_TRANSFER_CONFIG": transfer_config}
+    def test_peak_memory_is_bounded_by_transfer_config(self):
+        block = b"\0" * (1024 * 1024)
+        with tempfile.TemporaryFile() as file_obj:
+            for _ in range(self.FILE_SIZE // len(block)):
+                file_obj.write(block)
+            del block
+            get_s3_client()
+            tracemalloc.start()
+            try:
+                stream_upload(file_obj, "large/video.mp4", "video/mp4")
+                _current, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+        head = get_s3_client().head_object(Bucket=self.BUCKET, Key="large/video.mp4")
+        self.assertEqual(head["ContentLength"], self.FILE_SIZE)
+        self.assertEqual(head["ContentType"], "video/mp4")
+        # Пик зависит от настроек передачи, а не от размера файла; двойной запас — на копии частей в botocore
+        bound = 2 * self.CONCURRENCY * 2 * self.CHUNKSIZE
+        self.assertLess(bound, self.FILE_SIZE / 2)
+        self.assertLess(peak, bound)
+@skipUnless(MOTO_SERVER_AVAILABLE, "нужен moto[server]")
+class DirectUploadTests(MotoS3ServerMixin, TestCase):
+    """
+    Прямая загрузка: presign выдаёт политику POST, браузер кладёт файл в бакет,
+    confirm записывает FileStorage и id файлов в *_urls сущности ровно один раз.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        UserStatuses.objects.get_or_create(status_id=1, defaults={"status_name": "active"})
+        ReviewStatuses.objects.get_or_create(status_id=3, defaults={"status_name": "approved"})
+        cls.owner = Users.objects.create(email="owner@example.com", first_name="Иван", last_name="Петров")
+        cls.franchise = Franchises.objects.create(title="Кофейня", status="pending", owner=cls.owner, logo_urls=[])
+    def setUp(self):
+        self.client.force_login(self.owner)
+    def _post_json(self, url_name, payload):
+        return self.client.post(reverse(url_name), json.dumps(payload), content_type="application/json")
+    def test_presign_upload_and_confirm(self):
+        files = {
+            "logo": ("logo.png", b"\x89PNG logo", "image/png"),
+            "proof": ("deck.pdf", b"%PDF-1.4 deck", "application/pdf"),
+        }
+        response = self._post_json("presign_upload", {
+            "entity_type": "franchise",
+            "entity_id": self.franchise.pk,
+            "files": [
+                {"file_type": file_type, "name": name, "content_type": content_type, "size": len(content)}
+                for file_type, (name, content, content_type) in files.items()
+            ],
+        })
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["errors"], [])
+        uploaded = []
+        for upload in data["uploads"]:
+            name, content, content_type = files[upload["file_type"]]
+            self.assertTrue(upload["key"].startswith(f"franchises/{self.franchise.pk}/"))
+            storage_response = requests.post(upload["url"], data=upload["fields"], files={"file": (name, content, content_type)})
+            self.assertLess(storage_response.status_code, 300)
+            uploaded.append({"file_id": upload["file_id"], "file_type": upload["file_type"], "key": upload["key"], "name": name})
+        stored = get_s3_client().get_object(Bucket=self.BUCKET, Key=uploaded[0]["key"])
+        self.assertEqual(stored["Body"].read(), files[uploaded[0]["file_type"]][1])
+        ids = {item["file_type"]: item["file_id"] for item in uploaded}
+        payload = {"entity_type": "franchise", "entity_id": self.franchise.pk, "files": uploaded}
+        for _attempt in range(2):
+            response = self._post_json("confirm_upload", payload)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["file_save_errors"], [])
+        self.franchise.refresh_from_db()
+        self.assertEqual(self.franchise.logo_urls, [ids["logo"]])
+        self.assertEqual(self.franchise.proofs_urls, [ids["proof"]])
+        self.assertEqual(
+            sorted(FileStorage.objects.filter(entity_id=self.franchise.pk).values_list("file_url", flat=True)),
+            sorted(ids.values()),
+        )
+    def test_create_franchise_with_direct_upload_returns_entity(self):
+        ReviewStatuses.objects.get_or_create(status_name="Pending")
+        self.owner.role = Roles.objects.create(role_name="startuper")
+        self.owner.save(update_fields=["role"])
+        direction = Directions.objects.create(direction_name="Cafe")
+        response = self.client.post(reverse("create_franchise"), {
+            "title": "Пекарня",
+            "short_description": "Пекарня у дома",
+            "description": "Подробное описание",
+            "terms": "Условия",
+            "direction": direction.pk,
+            "agree_rules": "on",
+            "agree_data_processing": "on",
+            "direct_upload": "1",
+        }, HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        franchise = Franchises.objects.get(pk=data["entity_id"])
+        self.assertEqual(data["entity_type"], "franchise")
+        self.assertEqual(data["redirect_url"], reverse("franchises_list"))
+        self.assertEqual((franchise.title, franchise.owner_id), ("Пекарня", self.owner.pk))
+    def test_confirm_rejects_missing_object(self):
+        file_id = "0d9c8a54-9f1f-4c55-8a41-5d0b3b1f6e10"
+        response = self._post_json("confirm_upload", {
+            "entity_type": "franchise",
+            "entity_id": self.franchise.pk,
+            "files": [{
+                "file_id": file_id,
+                "file_type": "proof",
+                "key": f"franchises/{self.franchise.pk}/proofs/{file_id}_deck.pdf",
+                "name": "deck.pdf",
+            }],
+        })
+        self.assertEqual(response.json()["confirmed"], [])
+        self.assertEqual(len(response.json()["file_save_errors"]), 1)
+        self.assertFalse(FileStorage.objects.filter(entity_id=self.franchise.pk).exists())
+    def test_presign_requires_owner(self):
+        stranger = Users.objects.create(email="stranger@example.com")
+        self.client.force_login(stranger)
+        response = self._post_json("presign_upload", {
+            "entity_type": "franchise",
+            "entity_id": self.franchise.pk,
+            "files": [{"file_type": "logo", "name": "logo.png", "content_type": "image/png", "size": 10}],
+        })
+        self.assertEqual(response.status_code, 403)
+class StartupCommentCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        UserStatuses.objects.get_or_create(status_id=1, defaults={"status_name": "active"})
+        ReviewStatuses.objects.get_or_create(status_id=3, defaults={"status_name": "approved"})
+        cls.user = Users.objects.create(email="reader@example.com", first_name="Анна")
+        cls.startup = Startups.objects.create(title="Ракета", status="approved", owner=cls.user, logo_urls=[])
+    def test_new_comment_updates_counter_and_planet_snapshot(self):
+        cache.clear()
+        version = cache.get_or_set(PLANET_SNAPSHOT_VERSION_KEY, 1, None)
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse("startup_detail", kwargs={"startup_id": self.startup.pk}),
+            {"content": "Отличный проект"},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.startup.refresh_from_db()
+        self.assertEqual(self.startup.comments_count, 1)
+        self.assertGreater(cache.get(PLANET_SNAPSHOT_VERSION_KEY), version)
+@override_settings(GLOBAL_SEARCH_SECTION_DEADLINE_MS=5000)
+class GlobalSearchResultsTests(TransactionTestCase):
+    """
+    Разделы глобального поиска ищутся в потоках на своих соединениях,
+    поэтому данные должны быть закоммичены — отсюда TransactionTestCase.
+    """
+    def test_agency_hit_links_to_agency_detail(self):
+        agency = Agencies.objects.create(title="Агентство Ромашка", short_description="Маркетинг", status="approved")
+        results, timings = global_search_results("Ромашка")
+        self.assertFalse(results["partial"])
+        self.assertEqual(timings["agencies"][1], "ok")
+        self.assertEqual(results["agencies"], [{
+            "id": agency.pk,
+            "name": "Агентство Ромашка",
+            "type": "agency",
+            "url": reverse("agency_detail", kwargs={"franchise_id": agency.pk}),
+        }])
+class TitleAutocompleteTests(TestCase):
+    def setUp(self):
+        search._title_index = None
+        self.addCleanup(setattr, search, "_title_index", None)
+    def test_agency_title_suggestion(self):
+        agency = Agencies.objects.create(title="Агентство Ромашка", short_description="Маркетинг", status="approved")
+        response = self.client.get(reverse("title_autocomplete"), {"q": "агентство ром"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["suggestions"], [{
+            "id": agency.pk,
+            "name": "Агентство Ромашка",
+            "type": "agency",
+            "url": reverse("agency_detail", kwargs={"franchise_id": agency.pk}),
+        }])
+class PlanetCatalogTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        utils._planet_catalog = None
+        self.addCleanup(setattr, utils, "_planet_catalog", None)
+    def test_empty_listing_keeps_previous_catalog(self):
+        with mock.patch("accounts.utils._load_planet_catalog", side_effect=[["1.png", "2.png"], []]):
+            self.assertEqual(refresh_planet_catalog(), ["1.png", "2.png"])
+            self.assertEqual(refresh_planet_catalog(), [])
+        self.assertEqual(get_planet_urls(), ["1.png", "2.png"])
+        self.assertEqual(cache.get(PLANET_CATALOG_CACHE_KEY), ["1.png", "2.png"])
+    @override_settings(PLANET_CATALOG_EMPTY_TIMEOUT=0)
+    def test_empty_listing_is_retried(self):
+        with mock.patch("accounts.utils._load_planet_catalog", side_effect=[[], ["1.png"]]) as load:
+            self.assertEqual(get_planet_urls(), [])
+            self.assertIsNone(cache.get(PLANET_CATALOG_CACHE_KEY))
+            self.assertEqual(get_planet_urls(), ["1.png"])
+        self.assertEqual(load.call_count, 2)
+class SimilarEntitiesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        UserStatuses.objects.get_or_create(status_id=1, defaults={"status_name": "active"})
+        ReviewStatuses.objects.get_or_create(status_id=3, defaults={"status_name": "approved"})
+        owner = Users.objects.create(email="owner@example.com")
+        cafe = Directions.objects.create(direction_name="Cafe")
+        delivery = Directions.objects.create(direction_name="Delivery")
+        cards = {
+            "cafe": ("Кофейня у дома", "Свежий кофе и выпечка каждое утро", cafe),
+            "roastery": ("Кофейня с обжаркой", "Обжариваем кофе и продаём зерно", cafe),
+            "robots": ("Роботы доставки", "Беспилотные роботы доставляют еду", delivery),
+            "couriers": ("Доставка роботами", "Роботы-курьеры развозят заказы по городу", delivery),
+        }
+        cls.startups = {
+            name: Startups.objects.create(
+                title=title, short_description=text, direction=direction,
+                status="approved", owner=owner, logo_urls=[],
+            )
+            for name, (title, text, direction) in cards.items()
+        }
+    def _neighbours(self, name):
+        return list(
+            SimilarEntities.objects.filter(entity_type="startup", entity_id=self.startups[name].pk)
+            .order_by("rank")
+            .values_list("similar_id", flat=True)
+        )
+    def test_build_ranks_closest_card_first(self):
+        entities, written = build_similarities("startup")
+        self.assertEqual(entities, 4)
+        self.assertEqual(written, SimilarEntities.objects.filter(entity_type="startup").count())
+        self.assertEqual(self._neighbours("cafe")[0], self.startups["roastery"].pk)
+        self.assertEqual(self._neighbours("robots")[0], self.startups["couriers"].pk)
+        self.assertNotIn(self.startups["cafe"].pk, self._neighbours("cafe"))
+        ranks = SimilarEntities.objects.filter(entity_id=self.startups["cafe"].pk).order_by("rank")
+        scores = list(ranks.values_list("score", flat=True))
+        self.assertEqual(scores, sorted(scores, reverse=True))
+    def test_rebuild_replaces_rows(self):
+        _entities, written = build_similarities("startup")
+        self.assertEqual(build_similarities("startup"), (4, written))
+        self.assertEqual(SimilarEntities.objects.filter(entity_type="startup").count(), written)
+    def test_similar_entities_in_rank_order(self):
+        build_similarities("startup")
+        items = similar_entities("startup", self.startups["cafe"].pk, Startups.objects.all())
+        self.assertEqual([item.pk for item in items], self._neighbours("cafe")[:len(items)])
+        self.assertEqual(items[0].pk, self.startups["roastery"].pk)
+    def test_fallback_when_card_has_no_neighbours(self):
+        build_similarities("startup")
+        fresh = Startups.objects.create(title="Новая кофейня", status="approved", logo_urls=[])
+        fallback = [self.startups["cafe"]]
+        self.assertEqual(similar_entities("startup", fresh.pk, Startups.objects.all(), fallback=lambda: fallback), fallback)
+        self.assertEqual(similar_entities("startup", fresh.pk, Startups.objects.all()), [])
@@ -107,7 +107,11 @@ urlpatterns = [
     path("invest/<int:startup_id>/", views.invest, name="invest"),
     path("search-suggestions/", views.search_suggestions, name="search_suggestions"),
     path("global-search/", views.global_search, name="global_search"),
+    path("title-autocomplete/", views.title_autocomplete, name="title_autocomplete"),
+    path("uploads/presign/", views.presign_upload, name="presign_upload"),
+    path("uploads/confirm/", views.confirm_upload, name="confirm_upload"),
     path("planetary-system/", views.planetary_system, name="planetary_system"),
+    path("planetary-system/snapshot/", views.planetary_system_snapshot, name="planetary_system_snapshot"),
     path("my_startups/", views.my_startups, name="my_startups"),
     path("my_startups/download-report/", views.download_startups_report, name="download_startups_report"),
     path(
@@ -1,13 +1,105 @@
+import base64
+import collections
+import contextvars
+import datetime
+import decimal
+import gzip
+import hashlib
+import io
+import json
 import logging
+import mimetypes
+import os
+import random
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from django.utils import timezone
 import requests
 import re
 import boto3
-from botocore.exceptions import ClientError
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
 from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db.models import F, OrderBy, Q
+from django.template.loader import render_to_string
+from django.utils.text import slugify
 from html import escape
+from urllib.parse import quote
 logger = logging.getLogger(__name__)
+_s3_client = None
+_s3_client_pid = None
+_s3_client_lock = threading.Lock()
+_s3_call_totals = collections.Counter()
+_s3_call_totals_lock = threading.Lock()
+_s3_request_calls = contextvars.ContextVar("s3_request_calls", default=None)
+_file_lru = collections.OrderedDict()
+_file_lru_lock = threading.Lock()
+_file_inflight = {}
+_file_inflight_lock = threading.Lock()
+_planet_catalog = None
+_planet_catalog_lock = threading.Lock()
+def _count_s3_call(event_name=None, **kwargs):
+    operation = (event_name or "").rsplit(".", 1)[-1] or "unknown"
+    request_calls = _s3_request_calls.get()
+    if request_calls is not None:
+        request_calls[operation] += 1
+    with _s3_call_totals_lock:
+        _s3_call_totals[operation] += 1
+def get_s3_client():
+    """
+    Возвращает общий для процесса S3-клиент с настроенным пулом соединений,
+    таймаутами и ретраями. Клиент создаётся лениво и пересоздаётся после fork.
+    """
+    global _s3_client, _s3_client_pid
+    pid = os.getpid()
+    if _s3_client is not None and _s3_client_pid == pid:
+        return _s3_client
+    with _s3_client_lock:
+        if _s3_client is None or _s3_client_pid != pid:
+            config = Config(
+                region_name=settings.AWS_S3_REGION_NAME,
+                signature_version=getattr(settings, "AWS_S3_SIGNATURE_VERSION", "s3v4"),
+                s3={"addressing_style": getattr(settings, "AWS_S3_ADDRESSING_STYLE", "virtual")},
+                max_pool_connections=getattr(settings, "AWS_S3_MAX_POOL_CONNECTIONS", 20),
+                connect_timeout=getattr(settings, "AWS_S3_CONNECT_TIMEOUT", 3),
+                read_timeout=getattr(settings, "AWS_S3_READ_TIMEOUT", 30),
+                retries={
+                    "max_attempts": getattr(settings, "AWS_S3_MAX_ATTEMPTS", 3),
+                    "mode": "standard",
+                },
+                tcp_keepalive=True,
+            )
+            session = boto3.session.Session()
+            client = session.client(
+                "s3",
+                endpoint_url=settings.AWS_S3_ENDPOINT_URL,
+                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                config=config,
+            )
+            client.meta.events.register("before-call.s3", _count_s3_call)
+            _s3_client = client
+            _s3_client_pid = pid
+            logger.info(f"Создан S3-клиент для процесса {pid}")
+    return _s3_client
+def start_s3_call_count():
+    """Начинает подсчёт S3-вызовов для текущего запроса и возвращает счётчик."""
+    request_calls = collections.Counter()
+    _s3_request_calls.set(request_calls)
+    return request_calls
+def get_s3_call_counts():
+    """Возвращает число S3-вызовов по операциям для текущего запроса и за всё время процесса."""
+    request_calls = _s3_request_calls.get()
+    with _s3_call_totals_lock:
+        totals = dict(_s3_call_totals)
+    return {
+        "request": dict(request_calls or {}),
+        "total": totals,
+    }
 def _prefix_for(entity_type: str, entity_id: int, file_type: str) -> str:
     if file_type == "avatar":
         return f"users/{entity_id}/avatar/"
@@ -19,94 +111,812 @@ def _prefix_for(entity_type: str, entity_id: int, file_type: str) -> str:
     }.get(entity_type or "startup", "startups")
     return f"{entity_root}/{entity_id}/{file_type}s/"
 
-def get_file_info(file_id, entity_id, file_type, entity_type: str = "startup"):
+def build_file_url(object_key):
     """
-    Получает URL и оригинальное имя файла из S3.
-    Возвращает словарь с 'url' и 'original_name' или None если файл не найден.
+    Строит публичный URL объекта по его ключу в бакете без обращения к S3.
     """
-    s3_client = boto3.client(
-        "s3",
-        endpoint_url=settings.AWS_S3_ENDPOINT_URL,
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        region_name=settings.AWS_S3_REGION_NAME,
-    )
+    if not object_key:
+        return None
+    base_url = getattr(settings, "S3_PUBLIC_BASE_URL", "").rstrip("/")
+    return f"{base_url}/{quote(object_key, safe='/')}"
+def original_name_from_key(object_key):
+    filename = object_key.split('/')[-1]
+    parts = filename.split('_', 2)
+    if len(parts) >= 3:
+        return parts[2]
+    return filename
+def _remember_object_key(file_id, object_key):
+    from accounts.models import FileStorage
+    try:
+        FileStorage.objects.filter(
+            file_url=str(file_id), object_key__isnull=True
+        ).update(object_key=object_key)
+    except Exception as e:
+        logger.warning(f"Не удалось сохранить ключ объекта для файла {file_id}: {e}")
+def _list_prefix_keys(prefix):
+    """
+    Листит все объекты под префиксом и возвращает словарь {file_id: ключ}.
+    """
+    s3_client = get_s3_client()
+    paginator = s3_client.get_paginator("list_objects_v2")
+    found = {}
+    for page in paginator.paginate(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            key = obj["Key"]
+            found.setdefault(key[len(prefix):].split("_", 1)[0], key)
+    return found
+def _list_object_key(file_id, entity_id, file_type, entity_type: str = "startup"):
+    """
+    Ищет ключ объекта листингом бакета. Используется только для записей,
+    у которых ещё нет сохранённого object_key.
+    """
+    s3_client = get_s3_client()
     bucket_name = settings.AWS_STORAGE_BUCKET_NAME
+    prefix = _prefix_for(entity_type, entity_id, file_type) + f"{file_id}_"
+    response = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=prefix, MaxKeys=1)
+    if "Contents" in response and len(response["Contents"]) > 0:
+        return response["Contents"][0]["Key"]
+    if entity_type != "startup" and file_type != "avatar":
+        legacy_prefix = f"startups/{entity_id}/{file_type}s/{file_id}_"
+        response2 = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=legacy_prefix, MaxKeys=1)
+        if "Contents" in response2 and len(response2["Contents"]) > 0:
+            return response2["Contents"][0]["Key"]
+    logger.warning(f"Файл не найден: prefix={prefix}")
+    return None
+def _file_cache_key(file_id, entity_id, file_type, entity_type: str = "startup"):
     if file_type == "avatar":
-        prefix = f"users/{entity_id}/avatar/{file_id}_"
+        entity_type = "user"
+    return f"file_record:{entity_type or 'startup'}:{entity_id}:{file_type}:{file_id}"
+def _lru_get(cache_key):
+    with _file_lru_lock:
+        entry = _file_lru.get(cache_key)
+        if entry is None:
+            return None
+        expires_at, record = entry
+        if expires_at < time.monotonic():
+            del _file_lru[cache_key]
+            return None
+        _file_lru.move_to_end(cache_key)
+        return record
+def _lru_set(cache_key, record):
+    ttl = getattr(settings, "FILE_URL_LRU_TIMEOUT", 60)
+    max_size = getattr(settings, "FILE_URL_LRU_SIZE", 2048)
+    with _file_lru_lock:
+        _file_lru[cache_key] = (time.monotonic() + ttl, record)
+        _file_lru.move_to_end(cache_key)
+        while len(_file_lru) > max_size:
+            _file_lru.popitem(last=False)
+def _file_cache_set(cache_key, record):
+    if record.get("key"):
+        timeout = getattr(settings, "FILE_URL_CACHE_TIMEOUT", 3600)
     else:
-
-        prefix = _prefix_for(entity_type, entity_id, file_type) + f"{file_id}_"
+        timeout = getattr(settings, "FILE_URL_NEGATIVE_CACHE_TIMEOUT", 60)
+    _lru_set(cache_key, record)
     try:
-        response = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=prefix)
-        if "Contents" in response and len(response["Contents"]) > 0:
-            key = response["Contents"][0]["Key"]
-
-            url = f"{settings.AWS_S3_ENDPOINT_URL}/{bucket_name}/{key}"
-            filename = key.split('/')[-1]
-            parts = filename.split('_', 2)
-            if len(parts) >= 3:
-                original_name = parts[2]
-            else:
-                original_name = filename
-            logger.debug(f"Найден файл {file_type}: {url}, оригинальное имя: {original_name}")
-            return {
-                'url': url,
-                'original_name': original_name
-            }
-        else:
-
-            if entity_type != "startup" and file_type != "avatar":
-                legacy_prefix = f"startups/{entity_id}/{file_type}s/{file_id}_"
-                response2 = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=legacy_prefix)
-                if "Contents" in response2 and len(response2["Contents"]) > 0:
-                    key = response2["Contents"][0]["Key"]
-
-                    url = f"{settings.AWS_S3_ENDPOINT_URL}/{bucket_name}/{key}"
-                    filename = key.split('/')[-1]
-                    parts = filename.split('_', 2)
-                    original_name = parts[2] if len(parts) >= 3 else filename
-                    return { 'url': url, 'original_name': original_name }
-            logger.warning(f"Файл не найден: prefix={prefix}")
-            return None
+        cache.set(cache_key, record, timeout)
+    except Exception as e:
+        logger.warning(f"Не удалось записать {cache_key} в кэш: {e}")
+def invalidate_file_cache(file_id, entity_id, file_type, entity_type: str = "startup"):
+    """
+    Сбрасывает закэшированные URL и имя файла после загрузки, замены или удаления.
+    """
+    if not file_id:
+        return
+    cache_key = _file_cache_key(file_id, entity_id, file_type, entity_type)
+    with _file_lru_lock:
+        _file_lru.pop(cache_key, None)
+    try:
+        cache.delete(cache_key)
+    except Exception as e:
+        logger.warning(f"Не удалось сбросить {cache_key} в кэше: {e}")
+def _load_file_record(file_id, entity_id, file_type, entity_type: str = "startup"):
+    from accounts.models import FileStorage
+    row = (
+        FileStorage.objects.filter(file_url=str(file_id))
+        .order_by(F("object_key").asc(nulls_last=True))
+        .values("object_key", "original_file_name", "has_derivatives")
+        .first()
+    ) or {}
+    object_key = row.get("object_key")
+    if not object_key:
+        object_key = _list_object_key(file_id, entity_id, file_type, entity_type=entity_type)
+        if object_key:
+            _remember_object_key(file_id, object_key)
+    return {
+        "key": object_key,
+        "name": row.get("original_file_name"),
+        "derivatives": bool(row.get("object_key") and row.get("has_derivatives")),
+    }
+def _single_flight(cache_key, loader):
+    with _file_inflight_lock:
+        call = _file_inflight.get(cache_key)
+        is_leader = call is None
+        if is_leader:
+            call = {"event": threading.Event(), "result": None, "error": None}
+            _file_inflight[cache_key] = call
+    if not is_leader:
+        call["event"].wait(getattr(settings, "AWS_S3_READ_TIMEOUT", 30))
+        if call["error"] is not None:
+            raise call["error"]
+        return call["result"]
+    try:
+        call["result"] = loader()
+        return call["result"]
+    except Exception as e:
+        call["error"] = e
+        raise
+    finally:
+        with _file_inflight_lock:
+            _file_inflight.pop(cache_key, None)
+        call["event"].set()
+def get_file_record(file_id, entity_id, file_type, entity_type: str = "startup"):
+    """
+    Возвращает {'key': ключ объекта, 'name': оригинальное имя из FileStorage}.
+    Порядок поиска: LRU процесса, кэш Django, FileStorage/листинг S3.
+    Одновременные промахи по одному файлу выполняют один запрос.
+    """
+    cache_key = _file_cache_key(file_id, entity_id, file_type, entity_type)
+    record = _lru_get(cache_key)
+    if record is not None:
+        return record
+    try:
+        record = cache.get(cache_key)
+    except Exception as e:
+        logger.warning(f"Не удалось прочитать {cache_key} из кэша: {e}")
+        record = None
+    if record is not None:
+        _lru_set(cache_key, record)
+        return record
+    def load():
+        loaded = _load_file_record(file_id, entity_id, file_type, entity_type=entity_type)
+        _file_cache_set(cache_key, loaded)
+        return loaded
+    return _single_flight(cache_key, load)
+def get_file_info(file_id, entity_id, file_type, entity_type: str = "startup"):
+    """
+    Получает URL и оригинальное имя файла.
+    Возвращает словарь с 'url' и 'original_name' или None если файл не найден.
+    """
+    try:
+        key = get_file_record(file_id, entity_id, file_type, entity_type=entity_type)["key"]
     except ClientError as e:
         logger.error(f"Ошибка при получении информации о файле: {e}")
         return None
+    if not key:
+        return None
+    url = build_file_url(key)
+    original_name = original_name_from_key(key)
+    logger.debug(f"Найден файл {file_type}: {url}, оригинальное имя: {original_name}")
+    return {
+        'url': url,
+        'original_name': original_name
+    }
 def get_file_url(file_id, entity_id, file_type, entity_type: str = "startup"):
-    s3_client = boto3.client(
-        "s3",
-        endpoint_url=settings.AWS_S3_ENDPOINT_URL,
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        region_name=settings.AWS_S3_REGION_NAME,
-    )
-    bucket_name = settings.AWS_STORAGE_BUCKET_NAME
-    if file_type == "avatar":
-        prefix = f"users/{entity_id}/avatar/{file_id}_"
-    else:
-        prefix = _prefix_for(entity_type, entity_id, file_type) + f"{file_id}_"
     try:
-        response = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=prefix)
-        if "Contents" in response and len(response["Contents"]) > 0:
-            key = response["Contents"][0]["Key"]
-
-            url = f"{settings.AWS_S3_ENDPOINT_URL}/{bucket_name}/{key}"
-            logger.debug(f"Сгенерирован URL для {file_type}: {url}")
-            return url
-        else:
-            if entity_type != "startup" and file_type != "avatar":
-                legacy_prefix = f"startups/{entity_id}/{file_type}s/{file_id}_"
-                response2 = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=legacy_prefix)
-                if "Contents" in response2 and len(response2["Contents"]) > 0:
-                    key = response2["Contents"][0]["Key"]
-
-                    url = f"{settings.AWS_S3_ENDPOINT_URL}/{bucket_name}/{key}"
-                    return url
-            logger.warning(f"Файл не найден: prefix={prefix}")
-            return None
+        key = get_file_record(file_id, entity_id, file_type, entity_type=entity_type)["key"]
     except ClientError as e:
         logger.error(f"Ошибка при генерации URL: {e}")
         return None
+    if not key:
+        return None
+    url = build_file_url(key)
+    logger.debug(f"Сгенерирован URL для {file_type}: {url}")
+    return url
+def get_original_file_name(file_id, entity_id, file_type, entity_type: str = "startup"):
+    """
+    Возвращает оригинальное имя файла: из FileStorage, иначе из ключа объекта.
+    """
+    try:
+        record = get_file_record(file_id, entity_id, file_type, entity_type=entity_type)
+    except ClientError as e:
+        logger.error(f"Ошибка при получении имени файла: {e}")
+        return None
+    if record["name"]:
+        return record["name"]
+    return original_name_from_key(record["key"]) if record["key"] else None
+def _resolve_file_records(file_refs):
+    """
+    Пакетно получает записи файлов по кортежам (file_id, entity_id, file_type, entity_type).
+    Сначала используются закэшированные записи, остальные ключи берутся одним запросом
+    к FileStorage; для файлов без сохранённого ключа выполняется не более одного
+    листинга на префикс сущности. Возвращает словарь {file_id: запись}.
+    """
+    from accounts.models import FileStorage
+    refs = {}
+    for file_id, entity_id, file_type, entity_type in file_refs:
+        if file_id and is_uuid(str(file_id)):
+            refs.setdefault(str(file_id), (entity_id, file_type, entity_type or "startup"))
+    if not refs:
+        return {}
+    cache_keys = {file_id: _file_cache_key(file_id, *ref) for file_id, ref in refs.items()}
+    records = {}
+    for file_id, cache_key in cache_keys.items():
+        record = _lru_get(cache_key)
+        if record is not None:
+            records[file_id] = record
+    pending = [cache_keys[file_id] for file_id in refs if file_id not in records]
+    if pending:
+        try:
+            shared = cache.get_many(pending)
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать записи файлов из кэша: {e}")
+            shared = {}
+        for file_id, cache_key in cache_keys.items():
+            if cache_key in shared:
+                records[file_id] = shared[cache_key]
+                _lru_set(cache_key, shared[cache_key])
+    loaded = {}
+    pending_ids = [file_id for file_id in refs if file_id not in records]
+    if pending_ids:
+        for file_url, object_key, original_file_name, has_derivatives in FileStorage.objects.filter(
+            file_url__in=pending_ids
+        ).values_list("file_url", "object_key", "original_file_name", "has_derivatives"):
+            record = loaded.setdefault(file_url, {"key": None, "name": None, "derivatives": False})
+            if object_key and not record["key"]:
+                record["key"] = object_key
+                record["derivatives"] = bool(has_derivatives)
+            record["name"] = record["name"] or original_file_name
+    missing = collections.defaultdict(set)
+    for file_id in pending_ids:
+        loaded.setdefault(file_id, {"key": None, "name": None, "derivatives": False})
+        entity_id, file_type, entity_type = refs[file_id]
+        if not loaded[file_id]["key"] and entity_id:
+            missing[(entity_type, entity_id, file_type)].add(file_id)
+    failed = set()
+    for (entity_type, entity_id, file_type), file_ids in missing.items():
+        prefix = _prefix_for(entity_type, entity_id, file_type)
+        try:
+            found = _list_prefix_keys(prefix)
+            if entity_type != "startup" and file_type != "avatar" and not file_ids <= found.keys():
+                for file_id, key in _list_prefix_keys(f"startups/{entity_id}/{file_type}s/").items():
+                    found.setdefault(file_id, key)
+        except ClientError as e:
+            logger.error(f"Ошибка листинга {prefix}: {e}")
+            failed |= file_ids
+            continue
+        for file_id in file_ids:
+            key = found.get(file_id)
+            if key:
+                loaded[file_id]["key"] = key
+                _remember_object_key(file_id, key)
+            else:
+                logger.warning(f"Файл не найден: prefix={prefix}{file_id}_")
+    for file_id, record in loaded.items():
+        if file_id not in failed:
+            _file_cache_set(cache_keys[file_id], record)
+        records[file_id] = record
+    return {file_id: record for file_id, record in records.items() if record["key"]}
+def resolve_file_urls(file_refs):
+    """
+    Пакетно строит URL файлов. Возвращает словарь {file_id: url}.
+    """
+    return {file_id: build_file_url(record["key"]) for file_id, record in _resolve_file_records(file_refs).items()}
+def resolve_file_images(file_refs, display_width=None):
+    """
+    Пакетно строит наборы URL изображений (см. build_image_set). Возвращает {file_id: набор}.
+    """
+    return {
+        file_id: build_image_set(record["key"], record.get("derivatives"), display_width)
+        for file_id, record in _resolve_file_records(file_refs).items()
+    }
+def attach_card_file_urls(entities, entity_type: str = "startup", with_owner: bool = False):
+    """
+    Проставляет карточкам страницы предвычисленные изображения логотипа
+    (entity.resolved_logo и entity.resolved_logo_url), а при with_owner — и аватара
+    владельца (owner.resolved_profile_picture_url, наименьшая подходящая миниатюра).
+    Принимает page_obj или список сущностей, возвращает список сущностей.
+    """
+    entities = list(entities)
+    file_refs = []
+    owners = []
+    for entity in entities:
+        logo_urls = entity.logo_urls if isinstance(entity.logo_urls, list) else []
+        logo_value = logo_urls[0] if logo_urls else None
+        entity.resolved_logo = build_image_set(None, url=logo_value) if logo_value and not is_uuid(str(logo_value)) else None
+        if logo_value and entity.resolved_logo is None:
+            file_refs.append((logo_value, entity.pk, "logo", entity_type))
+        owner = entity.owner if with_owner and entity.owner_id else None
+        if owner is not None:
+            owners.append(owner)
+            avatar_value = (owner.profile_picture_url or "").strip()
+            if avatar_value:
+                file_refs.append((avatar_value, owner.user_id, "avatar", "user"))
+    images = resolve_file_images(file_refs, getattr(settings, "CARD_IMAGE_WIDTH", 150))
+    for entity in entities:
+        logo_urls = entity.logo_urls if isinstance(entity.logo_urls, list) else []
+        if entity.resolved_logo is None and logo_urls:
+            entity.resolved_logo = images.get(str(logo_urls[0]))
+        entity.resolved_logo_url = entity.resolved_logo["url"] if entity.resolved_logo else None
+    for owner in owners:
+        avatar_value = (owner.profile_picture_url or "").strip()
+        if avatar_value and is_uuid(avatar_value):
+            avatar = images.get(avatar_value)
+            owner.resolved_profile_picture_url = avatar["src"] if avatar else None
+        else:
+            owner.resolved_profile_picture_url = owner.get_profile_picture_url()
+    return entities
+CARD_FRAGMENT_TEMPLATES = {
+    "startup": ("accounts/partials/_startup_card.html", "startup"),
+    "franchise": ("accounts/partials/_franchise_card.html", "franchise"),
+    "agency": ("accounts/partials/_agency_card.html", "franchise"),
+    "specialist": ("accounts/partials/_specialist_card.html", "specialist"),
+}
+CARD_STAMP_FIELDS = (
+    "updated_at", "status", "total_voters", "sum_votes", "comments_count",
+    "investors_count", "amount_raised", "resolved_logo_url",
+)
+_card_cache_totals = collections.Counter()
+_card_cache_totals_lock = threading.Lock()
+def _card_cache_key(entity_type, entity_id):
+    return f"card_fragment:{entity_type}:{entity_id}"
+def _card_stamp(entity):
+    owner = entity._state.fields_cache.get("owner")
+    values = [getattr(entity, field, None) for field in CARD_STAMP_FIELDS]
+    values.append(owner.__dict__.get("resolved_profile_picture_url") if owner is not None else None)
+    return "|".join(str(value) for value in values)
+def render_card_fragments(entities, entity_type):
+    """
+    Собирает HTML карточек каталога из закэшированных фрагментов. Фрагмент хранится
+    под ключом сущности вместе с отпечатком отображаемых полей (updated_at, счётчики,
+    URL изображений), поэтому изменённая карточка перерисовывается даже без явной
+    инвалидации. Возвращает (html, {'hits': ..., 'misses': ..., 'total': счётчики процесса}).
+    """
+    template_name, context_name = CARD_FRAGMENT_TEMPLATES[entity_type]
+    entities = list(entities)
+    keys = [_card_cache_key(entity_type, entity.pk) for entity in entities]
+    cached = cache.get_many(keys)
+    parts = []
+    rendered = {}
+    for key, entity in zip(keys, entities):
+        stamp = _card_stamp(entity)
+        entry = cached.get(key)
+        if entry and entry[0] == stamp:
+            parts.append(entry[1])
+            continue
+        html = render_to_string(
+            template_name,
+            {context_name: entity, "S3_PUBLIC_BASE_URL": getattr(settings, "S3_PUBLIC_BASE_URL", "")},
+        )
+        rendered[key] = (stamp, html)
+        parts.append(html)
+    if rendered:
+        cache.set_many(rendered, getattr(settings, "CARD_FRAGMENT_CACHE_TIMEOUT", 600))
+    stats = {"hits": len(entities) - len(rendered), "misses": len(rendered)}
+    with _card_cache_totals_lock:
+        _card_cache_totals.update(stats)
+    stats["total"] = get_card_cache_stats()
+    return "".join(parts), stats
+def invalidate_card_fragment(entity_type, entity_id):
+    """
+    Удаляет закэшированный фрагмент карточки сущности.
+    """
+    cache.delete(_card_cache_key(entity_type, entity_id))
+def get_card_cache_stats():
+    """
+    Возвращает накопленные за время жизни процесса попадания и промахи кэша карточек.
+    """
+    with _card_cache_totals_lock:
+        return {"hits": _card_cache_totals["hits"], "misses": _card_cache_totals["misses"]}
+CATALOG_AMOUNT_EDGES = (0, 100000, 500000, 1000000, 5000000, 10000000)
+CATALOG_RATING_BUCKETS = range(0, 6)
+def _catalog_facet_source(entity_type):
+    from accounts.models import Agencies, Franchises, Specialists, Startups, rating_expression
+    sources = {
+        "startup": (Startups, "direction__direction_name", "funding_goal", F("rating_avg")),
+        "franchise": (Franchises, "direction__direction_name", "investment_size", rating_expression()),
+        "agency": (Agencies, "customization_data__agency_category", None, rating_expression()),
+        "specialist": (Specialists, "customization_data__specialist_category", None, rating_expression()),
+    }
+    return sources[entity_type]
+def _catalog_facets_key(entity_type):
+    return f"catalog_facets:{entity_type}"
+def compute_catalog_facets(entity_type):
+    """
+    Считает фасеты одобренного каталога одним GROUP BY: число записей по категории,
+    по корзинам суммы (цель сбора / размер инвестиций) и по целым значениям рейтинга.
+    """
+    from django.db.models import Case, Count, IntegerField, Value, When
+    from django.db.models.functions import Floor
+    model, category_field, amount_field, rating = _catalog_facet_source(entity_type)
+    annotations = {"facet_rating": Floor(rating)}
+    group_by = [category_field, "facet_rating"]
+    if amount_field:
+        whens = [When(**{f"{amount_field}__isnull": True}, then=Value(0))]
+        whens += [
+            When(**{f"{amount_field}__lt": edge}, then=Value(index))
+            for index, edge in enumerate(CATALOG_AMOUNT_EDGES[1:])
+        ]
+        annotations["facet_amount"] = Case(
+            *whens, default=Value(len(CATALOG_AMOUNT_EDGES) - 1), output_field=IntegerField()
+        )
+        group_by.append("facet_amount")
+    rows = (
+        model.objects.filter(status="approved")
+        .annotate(**annotations)
+        .values(*group_by)
+        .annotate(count=Count("pk"))
+        .order_by()
+    )
+    total = 0
+    categories = collections.Counter()
+    amounts = collections.Counter()
+    ratings = collections.Counter()
+    for row in rows:
+        count = row["count"]
+        total += count
+        if row[category_field]:
+            categories[row[category_field]] += count
+        ratings[min(int(row["facet_rating"] or 0), CATALOG_RATING_BUCKETS[-1])] += count
+        if amount_field:
+            amounts[row["facet_amount"]] += count
+    amount_buckets = []
+    if amount_field:
+        edges = CATALOG_AMOUNT_EDGES + (None,)
+        amount_buckets = [
+            {"min": edges[index], "max": edges[index + 1], "count": amounts[index]}
+            for index in range(len(CATALOG_AMOUNT_EDGES))
+        ]
+    return {
+        "total": total,
+        "categories": dict(categories),
+        "amount": amount_buckets,
+        "rating": [{"value": value, "count": ratings[value]} for value in CATALOG_RATING_BUCKETS],
+    }
+def get_catalog_facets(entity_type):
+    """
+    Фасеты каталога из кэша; при промахе пересчитываются через compute_catalog_facets.
+    Кэш сбрасывается сигналами при одобрении, отклонении и редактировании сущностей;
+    с LocMemCache — только в текущем воркере, в остальных счётчики устаревают
+    не дольше CATALOG_FACETS_CACHE_TIMEOUT, ограниченного CACHE_PER_WORKER_MAX_TIMEOUT.
+    """
+    key = _catalog_facets_key(entity_type)
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_catalog_facets(entity_type)
+        cache.set(key, facets, getattr(settings, "CATALOG_FACETS_CACHE_TIMEOUT", 300))
+    return facets
+def invalidate_catalog_facets(entity_type):
+    """
+    Удаляет закэшированные фасеты каталога указанного типа.
+    """
+    cache.delete(_catalog_facets_key(entity_type))
+IMAGE_DERIVATIVE_TYPES = ("logo", "creative", "avatar")
+def derivative_key(object_key, width, fmt):
+    """
+    Ключ миниатюры рядом с оригиналом: {каталог}/thumbs/{uuid}_{ширина}.{формат}.
+    """
+    directory, filename = object_key.rsplit("/", 1)
+    return f"{directory}/thumbs/{filename.split('_', 1)[0]}_{width}.{fmt}"
+def build_image_set(object_key, has_derivatives=False, display_width=None, url=None):
+    """
+    Возвращает набор URL изображения: 'url' оригинала, 'src' — наименьшая JPEG-миниатюра,
+    покрывающая display_width при двойной плотности, и srcset для WebP и JPEG.
+    Без миниатюр все поля указывают на оригинал.
+    """
+    url = url or build_file_url(object_key)
+    if not (object_key and has_derivatives):
+        return {"url": url, "src": url, "webp_srcset": "", "jpeg_srcset": ""}
+    widths = sorted(getattr(settings, "IMAGE_DERIVATIVE_WIDTHS", (128, 320, 640)))
+    target = (display_width or widths[-1]) * 2
+    src_width = next((width for width in widths if width >= target), widths[-1])
+    return {
+        "url": url,
+        "src": build_file_url(derivative_key(object_key, src_width, "jpg")),
+        "webp_srcset": ", ".join(f"{build_file_url(derivative_key(object_key, w, 'webp'))} {w}w" for w in widths),
+        "jpeg_srcset": ", ".join(f"{build_file_url(derivative_key(object_key, w, 'jpg'))} {w}w" for w in widths),
+    }
+def generate_image_derivatives(file_obj, object_key):
+    """
+    Строит миниатюры изображения фиксированных ширин в WebP и JPEG и кладёт их
+    рядом с оригиналом. Возвращает True, если все миниатюры загружены.
+    """
+    from PIL import Image, ImageOps
+    if hasattr(file_obj, "seek"):
+        file_obj.seek(0)
+    s3_client = get_s3_client()
+    bucket_name = settings.AWS_STORAGE_BUCKET_NAME
+    acl = getattr(settings, "AWS_DEFAULT_ACL", "public-read")
+    with Image.open(file_obj) as source:
+        image = ImageOps.exif_transpose(source)
+        image = image.convert("RGBA") if image.mode in ("P", "LA", "RGBA") else image.convert("RGB")
+        for width in sorted(getattr(settings, "IMAGE_DERIVATIVE_WIDTHS", (128, 320, 640))):
+            resized = image.copy()
+            if resized.width > width:
+                resized = resized.resize((width, max(1, round(resized.height * width / resized.width))), Image.LANCZOS)
+            webp_buffer = io.BytesIO()
+            resized.save(webp_buffer, "WEBP", quality=80, method=4)
+            if resized.mode == "RGBA":
+                flattened = Image.new("RGB", resized.size, (255, 255, 255))
+                flattened.paste(resized, mask=resized.split()[-1])
+                resized = flattened
+            jpeg_buffer = io.BytesIO()
+            resized.save(jpeg_buffer, "JPEG", quality=82, optimize=True, progressive=True)
+            for fmt, buffer, content_type in (
+                ("webp", webp_buffer, "image/webp"),
+                ("jpg", jpeg_buffer, "image/jpeg"),
+            ):
+                s3_client.put_object(
+                    Bucket=bucket_name,
+                    Key=derivative_key(object_key, width, fmt),
+                    Body=buffer.getvalue(),
+                    ContentType=content_type,
+                    ACL=acl,
+                    CacheControl="public, max-age=31536000, immutable",
+                )
+    return True
+def try_generate_image_derivatives(file_obj, object_key):
+    try:
+        return generate_image_derivatives(file_obj, object_key)
+    except Exception as e:
+        logger.warning(f"Не удалось построить миниатюры для {object_key}: {e}")
+        return False
+DIRECT_UPLOAD_RULES = {
+    "logo": {
+        "max_size": 5 * 1024 * 1024,
+        "content_types": ("image/png", "image/jpeg", "image/webp"),
+    },
+    "creative": {
+        "max_size": 10 * 1024 * 1024,
+        "content_types": ("image/png", "image/jpeg", "image/webp"),
+    },
+    "proof": {
+        "max_size": 20 * 1024 * 1024,
+        "content_types": (
+            "application/pdf",
+            "application/msword",
+            "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+            "application/vnd.ms-excel",
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            "text/plain",
+        ),
+    },
+    "video": {
+        "max_size": 500 * 1024 * 1024,
+        "content_types": ("video/mp4", "video/quicktime", "video/webm"),
+    },
+}
+def safe_file_name(file_name):
+    """
+    Приводит имя загружаемого файла к виду, который используется в ключах объектов.
+    """
+    base_name, ext = os.path.splitext(os.path.basename(file_name or ""))
+    safe_base_name = "".join(c for c in base_name if c.isalnum() or c in ("-", "_"))
+    return slugify(safe_base_name) + ext
+def stream_upload(file_obj, object_key, content_type=None):
+    """
+    Загружает файл в бакет потоково: большие файлы уходят multipart-частями
+    по AWS_S3_TRANSFER_CONFIG, и в памяти держится лишь несколько частей.
+    """
+    extra_args = {"ACL": getattr(settings, "AWS_DEFAULT_ACL", "public-read")}
+    if content_type:
+        extra_args["ContentType"] = content_type
+    if hasattr(file_obj, "seek"):
+        file_obj.seek(0)
+    get_s3_client().upload_fileobj(
+        file_obj,
+        settings.AWS_STORAGE_BUCKET_NAME,
+        object_key,
+        ExtraArgs=extra_args,
+        Config=getattr(settings, "AWS_S3_TRANSFER_CONFIG", None),
+    )
+    return object_key
+def save_files_parallel(uploads, save_file=None):
+    """
+    Сохраняет файлы в хранилище на ограниченном пуле потоков.
+    uploads — список словарей с ключами 'field', 'file', 'path' и необязательным
+    'derivatives'; каждому проставляются 'object_key', 'error', 'has_derivatives'
+    и 'elapsed'. save_file(path, file) по умолчанию default_storage.save. Время загрузки каждого файла пишется в лог.
+    """
+    save_file = save_file or default_storage.save
+    def run(upload):
+        started = time.monotonic()
+        try:
+            upload["object_key"] = save_file(upload["path"], upload["file"])
+            upload["error"] = None if upload["object_key"] else "Не удалось сохранить файл"
+            upload["has_derivatives"] = bool(
+                upload["object_key"]
+                and upload.get("derivatives")
+                and try_generate_image_derivatives(upload["file"], upload["object_key"])
+            )
+        except Exception as e:
+            logger.error(f"Ошибка сохранения файла {upload['path']}: {e}", exc_info=True)
+            upload["object_key"] = None
+            upload["error"] = str(e)
+        upload["elapsed"] = time.monotonic() - started
+        logger.info(
+            f"Загрузка {upload['field']} {getattr(upload['file'], 'name', '')} "
+            f"({getattr(upload['file'], 'size', 0)} байт): {upload['elapsed']:.2f} с, "
+            f"{'ok' if upload['object_key'] else 'ошибка'}"
+        )
+        return upload
+    if not uploads:
+        return uploads
+    max_workers = min(len(uploads), getattr(settings, "FILE_UPLOAD_MAX_WORKERS", 4))
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="file-upload") as executor:
+        list(executor.map(run, uploads))
+    logger.info(f"Загружено {len(uploads)} файлов в {max_workers} потоков за {time.monotonic() - started:.2f} с")
+    return uploads
+def delete_uploaded_files(uploads):
+    """
+    Удаляет из бакета оригиналы и миниатюры загрузок save_files_parallel —
+    компенсация, если запись FileStorage после загрузки не удалась.
+    """
+    keys = []
+    widths = getattr(settings, "IMAGE_DERIVATIVE_WIDTHS", (128, 320, 640))
+    for upload in uploads:
+        if not upload.get("object_key"):
+            continue
+        keys.append(upload["object_key"])
+        if upload.get("has_derivatives"):
+            keys += [derivative_key(upload["object_key"], width, fmt) for width in widths for fmt in ("webp", "jpg")]
+    if not keys:
+        return
+    try:
+        s3_client = get_s3_client()
+        for start in range(0, len(keys), 1000):
+            s3_client.delete_objects(
+                Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+                Delete={"Objects": [{"Key": key} for key in keys[start:start + 1000]], "Quiet": True},
+            )
+    except (BotoCoreError, ClientError) as e:
+        logger.error(f"Не удалось удалить загруженные файлы {keys}: {e}")
+def create_presigned_upload(entity_type, entity_id, file_type, file_name, content_type, size):
+    """
+    Выдаёт presigned POST для загрузки файла из браузера напрямую в бакет
+    по схеме {entity}/{id}/{type}s/{uuid}_{name}. Ограничения на размер и тип
+    содержимого зашиваются в политику, поэтому S3 отклонит неподходящий файл.
+    """
+    rules = DIRECT_UPLOAD_RULES.get(file_type)
+    if rules is None:
+        raise ValueError(f"Недопустимый тип файла: {file_type}")
+    content_type = content_type or mimetypes.guess_type(file_name or "")[0] or ""
+    if content_type not in rules["content_types"]:
+        raise ValueError(f"Недопустимый формат файла {file_name}: {content_type}")
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise ValueError(f"Не указан размер файла {file_name}")
+    if size <= 0 or size > rules["max_size"]:
+        raise ValueError(
+            f"Размер файла {file_name} должен быть не больше {rules['max_size'] // (1024 * 1024)} МБ"
+        )
+    file_id = str(uuid.uuid4())
+    object_key = _prefix_for(entity_type, entity_id, file_type) + f"{file_id}_{safe_file_name(file_name)}"
+    acl = getattr(settings, "AWS_DEFAULT_ACL", "public-read")
+    presigned = get_s3_client().generate_presigned_post(
+        Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+        Key=object_key,
+        Fields={"acl": acl, "Content-Type": content_type},
+        Conditions=[
+            {"acl": acl},
+            {"Content-Type": content_type},
+            ["content-length-range", 1, rules["max_size"]],
+        ],
+        ExpiresIn=getattr(settings, "DIRECT_UPLOAD_EXPIRES", 900),
+    )
+    return {
+        "file_id": file_id,
+        "file_type": file_type,
+        "original_name": file_name,
+        "key": object_key,
+        "url": presigned["url"],
+        "fields": presigned["fields"],
+    }
+def _cursor_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    raise TypeError(f"Значение {value!r} нельзя положить в курсор")
+def encode_cursor(values):
+    """
+    Упаковывает значения ключа сортировки последней записи в непрозрачную строку.
+    """
+    raw = json.dumps(values, default=_cursor_default, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+def decode_cursor(cursor):
+    """
+    Распаковывает курсор; для повреждённого курсора возвращает None.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+def paginate_by_cursor(queryset, cursor=None, per_page=6):
+    """
+    Keyset-пагинация по сортировке queryset с первичным ключом в качестве
+    уникального тай-брейкера: вместо COUNT(*) и OFFSET страница выбирается
+    условием «после ключа последней записи», поэтому её стоимость не зависит
+    от глубины прокрутки. NULL идут последними при сортировке по возрастанию
+    и первыми при сортировке по убыванию. Возвращает (объекты, next_cursor или None).
+    Поддерживаются сортировки по именам полей (в том числе через «__») и по
+    F(...).asc()/desc(); для случайной сортировки и произвольных выражений
+    ключ последней записи не определён, поэтому такие queryset отклоняются ValueError.
+    """
+    pk_name = queryset.model._meta.pk.name
+    ordering = queryset.query.order_by or (queryset.model._meta.ordering if queryset.query.default_ordering else [])
+    keys = []
+    for field in ordering:
+        if isinstance(field, str) and not field.lstrip("-").startswith("?"):
+            keys.append((field.lstrip("-"), field.startswith("-")))
+        elif isinstance(field, F):
+            keys.append((field.name, False))
+        elif isinstance(field, OrderBy) and isinstance(field.expression, F):
+            keys.append((field.expression.name, field.descending))
+        else:
+            raise ValueError(f"Сортировка {field!r} не поддерживается keyset-пагинацией")
+    if not any(name in ("pk", pk_name) for name, _ in keys):
+        keys.append((pk_name, True))
+    # Значения ключа читаются из аннотаций: так одинаково работают поля связанных
+    # моделей через «__» и внешние ключи (в курсор попадает id, а не объект)
+    aliases = [f"cursor_key_{index}" for index in range(len(keys))]
+    queryset = queryset.annotate(**{alias: F(name) for alias, (name, _) in zip(aliases, keys)}).order_by(*[
+        F(name).desc(nulls_first=True) if descending else F(name).asc(nulls_last=True)
+        for name, descending in keys
+    ])
+    values = decode_cursor(cursor) if cursor else None
+    if values is not None and len(values) == len(keys):
+        after = Q(pk__in=[])
+        equal = Q()
+        for (name, descending), value in zip(keys, values):
+            if value is None:
+                step = Q(**{f"{name}__isnull": False}) if descending else Q(pk__in=[])
+                same = Q(**{f"{name}__isnull": True})
+            else:
+                step = Q(**{f"{name}__lt": value}) if descending else (
+                    Q(**{f"{name}__gt": value}) | Q(**{f"{name}__isnull": True})
+                )
+                same = Q(**{name: value})
+            after |= equal & step
+            equal &= same
+        queryset = queryset.filter(after)
+    items = list(queryset[:per_page + 1])
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        next_cursor = encode_cursor([getattr(items[-1], alias) for alias in aliases])
+    return items, next_cursor
+def sample_pks(queryset, k):
+    """
+    Выбирает до k первичных ключей queryset без ORDER BY random(): берётся
+    случайная точка в диапазоне [MIN(pk), MAX(pk)] и окно из k ближайших записей
+    не меньше неё по индексу первичного ключа (с переходом в начало диапазона).
+    Не больше трёх запросов при любом k, в том числе на отфильтрованных queryset;
+    ключи идут подряд, поэтому результат используется как пул для random_sample.
+    """
+    from django.db.models import Max, Min
+    keys = queryset.order_by().values_list("pk", flat=True)
+    bounds = keys.aggregate(low=Min("pk"), high=Max("pk"))
+    if bounds["low"] is None or k <= 0:
+        return []
+    pivot = random.randint(bounds["low"], bounds["high"])
+    picked = list(keys.filter(pk__gte=pivot).order_by("pk")[:k])
+    if len(picked) < k:
+        picked += list(keys.filter(pk__lt=pivot).order_by("pk")[:k - len(picked)])
+    return picked
+def random_sample(queryset, k, pool_key, exclude=()):
+    """
+    Возвращает до k случайных объектов queryset в случайном порядке, кроме
+    первичных ключей из exclude. Выборка делается из закэшированного пула ключей
+    (SHOWCASE_POOL_SIZE записей), который обновляется раз в SHOWCASE_POOL_TIMEOUT
+    секунд и общий для всех посетителей с тем же pool_key: на запрос остаётся
+    один выбор по pk__in. pool_key должен однозначно описывать фильтр queryset.
+    """
+    cache_key = f"showcase_pool:{hashlib.md5(pool_key.encode()).hexdigest()}"
+    pool = cache.get(cache_key)
+    if pool is None:
+        pool = sample_pks(queryset, getattr(settings, "SHOWCASE_POOL_SIZE", 60))
+        cache.set(cache_key, pool, getattr(settings, "SHOWCASE_POOL_TIMEOUT", 300))
+    excluded = set(exclude)
+    candidates = [pk for pk in pool if pk not in excluded]
+    pks = random.sample(candidates, min(k, len(candidates)))
+    if not pks:
+        return []
+    items = list(queryset.filter(pk__in=pks))
+    random.shuffle(items)
+    return items
 def is_uuid(value):
     """
     Проверяет, является ли строка UUID.
@@ -116,35 +926,180 @@ def is_uuid(value):
         return True
     except ValueError:
         return False
-def get_planet_urls():
-    s3_client = boto3.client(
-        "s3",
-        endpoint_url=settings.AWS_S3_ENDPOINT_URL,
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        region_name=settings.AWS_S3_REGION_NAME,
+PLANET_SNAPSHOT_VERSION_KEY = "planet_snapshot:version"
+PLANET_SNAPSHOT_ALL = "All"
+def resolve_planet_galaxy(categories, galaxy):
+    """
+    Приводит выбранную галактику (original_name или direction_name категории)
+    к ключу снимка; неизвестное значение означает все стартапы.
+    """
+    for category in categories:
+        if galaxy in (category["original_name"], category["direction_name"]):
+            return category["original_name"]
+    return PLANET_SNAPSHOT_ALL
+def build_planet_snapshot(categories, version=None):
+    """
+    Собирает снимок планетарной системы одним запросом: одобренные стартапы
+    с направлением и денормализованными счётчиками (rating_avg, investors_count,
+    comments_count). Для каждой галактики хранится gzip-сжатый JSON с ETag
+    и первые шесть планет для первичной отрисовки страницы. У стартапов без
+    выбранной планеты image пустой: случайная картинка подбирается при отрисовке,
+    поэтому снимок детерминирован и ETag совпадает во всех воркерах.
+    """
+    from accounts.models import Startups
+    originals = {category["direction_name"]: category["original_name"] for category in categories}
+    originals.update({category["original_name"]: category["original_name"] for category in categories})
+    startups = (
+        Startups.objects.filter(status="approved")
+        .select_related("direction")
+        .only(
+            "startup_id", "title", "short_description", "description", "planet_image", "rating_avg",
+            "total_voters", "comments_count", "investors_count", "funding_goal", "amount_raised",
+            "valuation", "both_mode", "only_buy", "direction__direction_name",
+        )
+        .order_by("-created_at")
     )
-    bucket_name = settings.AWS_STORAGE_BUCKET_NAME
-    prefix = "choosable_planets/"
+    groups = {PLANET_SNAPSHOT_ALL: []}
+    groups.update({category["original_name"]: [] for category in categories})
+    for startup in startups:
+        planet_image_url = None
+        if startup.planet_image:
+            planet_image_url = f"{settings.S3_PUBLIC_BASE_URL}/choosable_planets/{startup.planet_image}"
+        direction_original = 'Не указано'
+        if startup.direction:
+            direction_original = originals.get(startup.direction.direction_name, direction_original)
+        planet = {
+            "id": startup.startup_id,
+            "startup_id": startup.startup_id,
+            "name": startup.title,
+            "description": startup.short_description or startup.description[:200] if startup.description else "",
+            "image": planet_image_url,
+            "rating": startup.rating_avg,
+            "voters_count": startup.total_voters,
+            "comment_count": startup.comments_count,
+            "direction": direction_original,
+            "funding_goal": f"{startup.funding_goal:,.0f} ₽".replace(",", " ") if startup.funding_goal else "Не указано",
+            "valuation": f"{startup.valuation:,.0f} ₽".replace(",", " ") if startup.valuation else "Не указано",
+            "investors": startup.investors_count,
+            "progress": startup.get_progress_percentage(),
+            "investment_type": "Выкуп+инвестирование" if startup.both_mode else ("Только выкуп" if startup.only_buy else "Только инвестирование")
+        }
+        groups[PLANET_SNAPSHOT_ALL].append(planet)
+        if direction_original in groups:
+            groups[direction_original].append(planet)
+    galaxies = {}
+    for galaxy, planets in groups.items():
+        raw = json.dumps(planets, ensure_ascii=False).encode("utf-8")
+        galaxies[galaxy] = {
+            "etag": f'"{hashlib.sha1(raw).hexdigest()[:20]}"',
+            "body": gzip.compress(raw),
+            "count": len(planets),
+            "planets": planets[:6],
+        }
+    return {"version": version, "built_at": time.time(), "galaxies": galaxies}
+def with_fallback_planet_images(planets):
+    """
+    Копии планет снимка, где пустой image заменён случайной стандартной картинкой.
+    """
+    result = []
+    for index, planet in enumerate(planets):
+        planet = dict(planet)
+        if not planet["image"]:
+            if random.choice(['planets_round', 'planets_ring']) == 'planets_round':
+                planet["image"] = f"/static/accounts/images/planetary_system/planets_round/{(index % 15) + 1}.png"
+            else:
+                planet["image"] = f"/static/accounts/images/planetary_system/planets_ring/{(index % 6) + 1}.png"
+        result.append(planet)
+    return result
+def get_planet_snapshot(categories):
+    """
+    Возвращает снимок планетарной системы текущей версии из кэша, при промахе
+    собирает его через build_planet_snapshot (один сборщик на процесс).
+    Смена версии видна сразу только при общем кэше (Redis, БД); с LocMemCache
+    другие воркеры отдают прежний снимок не дольше PLANET_SNAPSHOT_TIMEOUT.
+    """
+    version = cache.get_or_set(PLANET_SNAPSHOT_VERSION_KEY, 1, None)
+    cache_key = f"planet_snapshot:{version}"
+    snapshot = cache.get(cache_key)
+    if snapshot is None:
+        snapshot = _single_flight(cache_key, lambda: build_planet_snapshot(categories, version))
+        cache.set(cache_key, snapshot, getattr(settings, "PLANET_SNAPSHOT_TIMEOUT", 60))
+    return snapshot
+def invalidate_planet_snapshot():
+    """
+    Переводит снимок планетарной системы на новую версию; он пересобирается
+    при следующем запросе. Вызывается при одобрении, правке, голосовании и инвестиции.
+    """
     try:
-        response = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=prefix)
-        if "Contents" not in response:
-            logger.warning(f"No files found in {prefix}")
-            return []
-        planets = []
-        for obj in response["Contents"]:
+        cache.incr(PLANET_SNAPSHOT_VERSION_KEY)
+    except ValueError:
+        cache.set(PLANET_SNAPSHOT_VERSION_KEY, 2, None)
+PLANET_CATALOG_PREFIX = "choosable_planets/"
+PLANET_CATALOG_CACHE_KEY = "planet_catalog"
+def _load_planet_catalog():
+    """
+    Листит choosable_planets/ постранично и возвращает имена файлов планет.
+    """
+    s3_client = get_s3_client()
+    paginator = s3_client.get_paginator("list_objects_v2")
+    planets = []
+    for page in paginator.paginate(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Prefix=PLANET_CATALOG_PREFIX):
+        for obj in page.get("Contents", []):
             key = obj.get("Key")
-            if not key or key == prefix:
+            if not key or key == PLANET_CATALOG_PREFIX:
                 continue
             filename = key.split("/")[-1]
             stem = filename.rsplit(".", 1)[0].lower()
             if stem == "0" or "plus" in stem:
                 continue
             planets.append(filename)
+    return planets
+def refresh_planet_catalog():
+    """
+    Перечитывает каталог планет из бакета и обновляет оба уровня кэша.
+    Пустой листинг (обычно сбой S3) в кэш не записывается: процесс оставляет
+    прежний каталог и повторяет листинг через PLANET_CATALOG_EMPTY_TIMEOUT.
+    """
+    global _planet_catalog
+    planets = _load_planet_catalog()
+    if not planets:
+        logger.warning(f"No files found in {PLANET_CATALOG_PREFIX}")
+        with _planet_catalog_lock:
+            previous = _planet_catalog[1] if _planet_catalog else []
+            _planet_catalog = (time.monotonic() + getattr(settings, "PLANET_CATALOG_EMPTY_TIMEOUT", 10), previous)
         return planets
-    except ClientError as e:
+    timeout = getattr(settings, "PLANET_CATALOG_CACHE_TIMEOUT", 3600)
+    with _planet_catalog_lock:
+        _planet_catalog = (time.monotonic() + timeout, planets)
+    try:
+        cache.set(PLANET_CATALOG_CACHE_KEY, planets, timeout)
+    except Exception as e:
+        logger.warning(f"Не удалось записать каталог планет в кэш: {e}")
+    return planets
+def get_planet_urls():
+    """
+    Возвращает имена файлов планет из кэша. Бакет листится только при
+    истёкшем кэше; при ошибке S3 или пустом листинге отдаётся последний известный каталог.
+    """
+    global _planet_catalog
+    with _planet_catalog_lock:
+        if _planet_catalog and _planet_catalog[0] > time.monotonic():
+            return list(_planet_catalog[1])
+        stale = list(_planet_catalog[1]) if _planet_catalog else []
+    try:
+        planets = cache.get(PLANET_CATALOG_CACHE_KEY)
+    except Exception as e:
+        logger.warning(f"Не удалось прочитать каталог планет из кэша: {e}")
+        planets = None
+    if planets is not None:
+        with _planet_catalog_lock:
+            _planet_catalog = (time.monotonic() + getattr(settings, "PLANET_CATALOG_LOCAL_TIMEOUT", 60), planets)
+        return list(planets)
+    try:
+        return list(refresh_planet_catalog()) or stale
+    except (BotoCoreError, ClientError) as e:
         logger.error(f"Error listing planets: {e}")
-        return []
+        return stale
 def update_user_from_telegram(user, sociallogin):
     """
     Forcefully updates a user model instance with data from a Telegram social login account.
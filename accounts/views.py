@@ -1,4 +1,5 @@
 import collections
+import gzip
 import json
 import logging
 import os
@@ -8,9 +9,8 @@ from random import choice, shuffle
 import time
 import datetime
 from datetime import datetime as dt
-import boto3
 import requests
-from boto3 import client
+from botocore.exceptions import ClientError
 from dateutil.relativedelta import relativedelta
 from django import forms
 from django.conf import settings
@@ -50,14 +50,15 @@ from django.db.models.functions import (
     TruncMonth,
     Floor,
 )
-from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotModified, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.template.loader import render_to_string
 from django.templatetags.static import static
 from django.urls import reverse, reverse_lazy
 from django.utils import timezone
+from django.utils.cache import patch_vary_headers
 from django.utils.decorators import method_decorator
-from django.utils.text import slugify
+from django.utils.http import parse_etags
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.contrib.messages import get_messages
@@ -114,7 +115,42 @@ from .models import (
     SpecialistComments,
     SpecialistVotes,
 )
-from .utils import send_telegram_support_message, send_telegram_contact_form_message
+from .recommendations import similar_entities
+from .search import (
+    SEARCH_RESULT_TYPES,
+    TYPEAHEAD_MAX_LIMIT,
+    autocomplete_titles,
+    cached_search,
+    get_search_cache_stats,
+    global_search_results,
+    server_timing_header,
+    typeahead_users,
+)
+from .utils import (
+    IMAGE_DERIVATIVE_TYPES,
+    _list_prefix_keys,
+    _prefix_for,
+    attach_card_file_urls,
+    create_presigned_upload,
+    delete_uploaded_files,
+    get_catalog_facets,
+    get_planet_snapshot,
+    get_s3_client,
+    invalidate_file_cache,
+    is_uuid,
+    original_name_from_key,
+    paginate_by_cursor,
+    random_sample,
+    render_card_fragments,
+    resolve_planet_galaxy,
+    safe_file_name,
+    save_files_parallel,
+    stream_upload,
+    with_fallback_planet_images,
+    try_generate_image_derivatives,
+    send_telegram_support_message,
+    send_telegram_contact_form_message,
+)
 logger = logging.getLogger(__name__)
 
 RATE_WINDOW_SECONDS = 60
@@ -220,111 +256,140 @@ def _clear_captcha_messages(request):
             kept.append((m.level, str(m)))
     for level, msg in kept:
         messages.add_message(request, level, msg)
-def safe_create_file_storage(entity_type, entity_id, file_type, file_url, uploaded_at, startup, original_file_name):
+def upload_entity_files(entity_type_name, entity_id, file_sets, original_name=None, save_file=None):
     """
-    Безопасно создает объект FileStorage, учитывая наличие/отсутствие поля original_file_name
+    Параллельно загружает наборы файлов сущности в хранилище, для изображений логотипов
+    и креативов сразу строятся миниатюры. В БД ничего не пишет, поэтому вызывается
+    вне transaction.atomic(). file_sets — список (поле формы, тип файла, файлы);
+    original_name(file_obj, file_type_name, file_path) возвращает имя для FileStorage.
+    Возвращает список загрузок для record_entity_files.
     """
-    if hasattr(FileStorage, 'original_file_name'):
-        try:
-            return FileStorage.objects.create(
-                entity_type=entity_type,
-                entity_id=entity_id,
-                file_type=file_type,
-                file_url=file_url,
-                uploaded_at=uploaded_at,
-                startup=startup,
-                original_file_name=original_file_name,
-            )
-        except Exception:
-            return FileStorage.objects.create(
-                entity_type=entity_type,
-                entity_id=entity_id,
-                file_type=file_type,
-                file_url=file_url,
-                uploaded_at=uploaded_at,
-                startup=startup,
-            )
-    else:
-        return FileStorage.objects.create(
+    uploads = []
+    for field, file_type_name, files in file_sets:
+        for file_obj in files:
+            if not hasattr(file_obj, "name"):
+                logger.warning(f"Пропущен файл {field}, так как это не файл: {file_obj}")
+                continue
+            file_id = str(uuid.uuid4())
+            file_path = _prefix_for(entity_type_name, entity_id, file_type_name) + f"{file_id}_{safe_file_name(file_obj.name)}"
+            uploads.append({
+                "field": field,
+                "file_type": file_type_name,
+                "file": file_obj,
+                "file_id": file_id,
+                "path": file_path,
+                "derivatives": (
+                    file_type_name in IMAGE_DERIVATIVE_TYPES
+                    and (getattr(file_obj, "content_type", "") or "").startswith("image/")
+                ),
+                "original_name": (
+                    original_name(file_obj, file_type_name, file_path) if original_name else os.path.basename(file_path)
+                ),
+            })
+    save_files_parallel(uploads, save_file=save_file)
+    return uploads
+def record_entity_files(entity_type_name, entity_id, file_sets, uploads, startup=None):
+    """
+    Записывает успешно загруженные файлы в FileStorage одним bulk_create.
+    Возвращает ({поле: [id файлов]}, file_save_errors).
+    """
+    ids_by_field = {field: [] for field, _, _ in file_sets}
+    file_save_errors = []
+    rows = []
+    entity_type = EntityTypes.objects.get_or_create(type_name=entity_type_name)[0] if uploads else None
+    file_types = {}
+    uploaded_at = timezone.now()
+    for upload in uploads:
+        if not upload["object_key"]:
+            file_save_errors.append({"field": upload["field"], "file": upload["file"].name, "error": upload["error"]})
+            continue
+        if upload["file_type"] not in file_types:
+            file_types[upload["file_type"]] = FileTypes.objects.get_or_create(type_name=upload["file_type"])[0]
+        rows.append(FileStorage(
             entity_type=entity_type,
             entity_id=entity_id,
-            file_type=file_type,
-            file_url=file_url,
+            file_type=file_types[upload["file_type"]],
+            file_url=upload["file_id"],
             uploaded_at=uploaded_at,
             startup=startup,
-        )
-def safe_create_file_storage_instance(entity_type, entity_id, file_type, file_url, uploaded_at, startup, original_file_name):
+            original_file_name=upload["original_name"],
+            object_key=upload["object_key"],
+            has_derivatives=upload["has_derivatives"],
+        ))
+        ids_by_field[upload["field"]].append(upload["file_id"])
+    if rows:
+        FileStorage.objects.bulk_create(rows)
+    return ids_by_field, file_save_errors
+def save_entity_files(entity_type_name, entity_id, file_sets, startup=None, original_name=None, save_file=None):
     """
-    Безопасно создает и сохраняет экземпляр FileStorage, учитывая наличие/отсутствие поля original_file_name
+    Загружает наборы файлов сущности (upload_entity_files) и записывает их в FileStorage
+    (record_entity_files). Возвращает ({поле: [id файлов]}, file_save_errors).
     """
-    if hasattr(FileStorage, 'original_file_name'):
-        try:
-            file_storage = FileStorage(
-                entity_type=entity_type,
-                entity_id=entity_id,
-                file_type=file_type,
-                file_url=file_url,
-                uploaded_at=uploaded_at,
-                startup=startup,
-                original_file_name=original_file_name,
-            )
-            file_storage.save()
-            return file_storage
-        except Exception:
-            file_storage = FileStorage(
-                entity_type=entity_type,
-                entity_id=entity_id,
-                file_type=file_type,
-                file_url=file_url,
-                uploaded_at=uploaded_at,
+    uploads = upload_entity_files(entity_type_name, entity_id, file_sets, original_name, save_file)
+    return record_entity_files(entity_type_name, entity_id, file_sets, uploads, startup=startup)
+def save_timeline_steps(startup, data, steps=5):
+    """
+    Синхронизирует этапы дорожной карты стартапа с полями step_description_N:
+    существующие этапы читаются одним запросом, новые создаются одним bulk_create,
+    изменённые обновляются одним bulk_update.
+    """
+    descriptions = {}
+    for i in range(1, steps + 1):
+        description = data.get(f"step_description_{i}", "").strip()
+        if description:
+            descriptions[i] = description
+    if not descriptions:
+        return
+    existing = {
+        entry.step_number: entry
+        for entry in StartupTimeline.objects.filter(startup=startup, step_number__in=descriptions)
+    }
+    to_create = []
+    to_update = []
+    for step_number, description in descriptions.items():
+        entry = existing.get(step_number)
+        if entry is None:
+            to_create.append(StartupTimeline(
                 startup=startup,
-            )
-            file_storage.save()
-            return file_storage
-    else:
-        file_storage = FileStorage(
-            entity_type=entity_type,
-            entity_id=entity_id,
-            file_type=file_type,
-            file_url=file_url,
-            uploaded_at=uploaded_at,
-            startup=startup,
-        )
-        file_storage.save()
-        return file_storage
-def get_unique_filename(original_name, startup_id, file_type_name):
+                step_number=step_number,
+                title=f"Этап {step_number}",
+                description=description,
+            ))
+        elif entry.description != description:
+            entry.description = description
+            to_update.append(entry)
+    if to_create:
+        StartupTimeline.objects.bulk_create(to_create)
+    if to_update:
+        StartupTimeline.objects.bulk_update(to_update, ["description"])
+def get_unique_filename(original_name, startup_id, file_type_name, reserved=None):
     """
-    Генерирует уникальное имя файла, добавляя (2), (3) и т.д. если файл с таким именем уже существует
+    Генерирует уникальное имя файла, добавляя (2), (3) и т.д. если файл с таким именем уже существует.
+    Все занятые имена с той же основой читаются одним запросом; reserved — множество имён,
+    уже выданных в текущей загрузке, пополняется выбранным именем.
     """
     name, ext = os.path.splitext(original_name)
     try:
-        file_type = FileTypes.objects.get(type_name=file_type_name)
-        if not hasattr(FileStorage, 'original_file_name'):
-            return original_name
-        try:
-            existing_files = FileStorage.objects.filter(
+        taken = set(
+            FileStorage.objects.filter(
                 startup_id=startup_id,
-                file_type=file_type,
-                original_file_name=original_name
-            )
-            if not existing_files.exists():
-                return original_name
-            counter = 2
-            while True:
-                new_name = f"{name} ({counter}){ext}"
-                existing_duplicate = FileStorage.objects.filter(
-                    startup_id=startup_id,
-                    file_type=file_type,
-                    original_file_name=new_name
-                )
-                if not existing_duplicate.exists():
-                    return new_name
-                counter += 1
-        except Exception:
-            return original_name
-    except FileTypes.DoesNotExist:
-        logger.error(f"FileType '{file_type_name}' не найден")
-        return original_name
+                file_type__type_name=file_type_name,
+                original_file_name__startswith=name,
+            ).values_list("original_file_name", flat=True)
+        )
+    except Exception as e:
+        logger.error(f"Не удалось получить имена файлов {file_type_name} стартапа {startup_id}: {e}")
+        taken = set()
+    if reserved is not None:
+        taken |= reserved
+    unique_name = original_name
+    counter = 2
+    while unique_name in taken:
+        unique_name = f"{name} ({counter}){ext}"
+        counter += 1
+    if reserved is not None:
+        reserved.add(unique_name)
+    return unique_name
 DIRECTION_TRANSLATIONS = {
     'Beauty': 'Красота', 'Technology': 'Технологии', 'Healthcare': 'Здравоохранение', 'Health': 'Здоровье',
     'Finance': 'Финансы', 'Cafe': 'Кафе/рестораны', 'Restaurant': 'Кафе/рестораны', 'Delivery': 'Доставка',
@@ -363,24 +428,16 @@ def home(request):
         from django.db.models.functions import Coalesce
         from django.templatetags.static import static
         startups_query = Startups.objects.filter(status="approved").annotate(
-            rating_avg=Coalesce(Avg("uservotes__rating"), 0.0, output_field=FloatField()),
-            voters_count=Count("uservotes", distinct=True),
-            total_investors=Count("investmenttransactions__investor", distinct=True),
-            current_funding=Coalesce(
-                Sum("investmenttransactions__amount"), 0, output_field=DecimalField()
-            ),
-            comment_count=Count("comments", distinct=True),
+            voters_count=F("total_voters"),
+            total_investors=F("investors_count"),
+            comment_count=F("comments_count"),
             progress=Case(
                 When(funding_goal__gt=0, then=(F("amount_raised") * 100.0 / F("funding_goal"))),
                 default=Value(0),
                 output_field=FloatField(),
             )
-        )
-        all_startups = list(startups_query)
-        demo_startups = []
-        if all_startups:
-            num_startups = min(6, len(all_startups))
-            demo_startups = random.sample(all_startups, num_startups)
+        ).select_related("direction")
+        demo_startups = random_sample(startups_query, 6, "approved_startups")
         startups_data = []
         for startup in demo_startups:
             folder_choice = random.choice(['planets_round', 'planets_ring'])
@@ -407,11 +464,7 @@ def home(request):
             })
 
         directions_data = FIXED_CATEGORIES.copy()
-        selected_startups = []
-        if len(all_startups) > 0:
-            selected_startups = all_startups[:6]
-        else:
-            selected_startups = []
+        selected_startups = list(startups_query[:6])
         planets_data = []
         for i, startup in enumerate(selected_startups):
             planet_image_url = None
@@ -441,13 +494,13 @@ def home(request):
                 "name": startup.title,
                 "description": startup.short_description or startup.description[:200] if startup.description else "",
                 "image": planet_image_url,
-                "rating": startup.get_average_rating(),
+                "rating": startup.rating_avg,
                 "voters_count": startup.total_voters,
-                "comment_count": startup.comments.count(),
+                "comment_count": startup.comments_count,
                 "direction": direction_original,
                 "funding_goal": f"{startup.funding_goal:,.0f} ₽".replace(",", " ") if startup.funding_goal else "Не указано",
                 "valuation": f"{startup.valuation:,.0f} ₽".replace(",", " ") if startup.valuation else "Не указано",
-                "investors": startup.get_investors_count(),
+                "investors": startup.investors_count,
                 "progress": startup.get_progress_percentage(),
                 "investment_type": "Выкуп+инвестирование" if startup.both_mode else ("Только выкуп" if startup.only_buy else "Только инвестирование")
             })
@@ -456,10 +509,10 @@ def home(request):
         random_startupers = []
         try:
 
-            startuper_users = Users.objects.filter(
+            startuper_users = random_sample(Users.objects.filter(
                 role__role_name__iexact='startuper',
                 rating__isnull=False
-            ).exclude(rating=0).order_by('?')[:3]
+            ).exclude(rating=0), 3, "rated_startupers")
 
             for user in startuper_users:
 
@@ -483,9 +536,9 @@ def home(request):
 
             if len(random_startupers) < 3:
 
-                additional_startupers = Users.objects.filter(
+                additional_startupers = random_sample(Users.objects.filter(
                     role__role_name__iexact='startuper'
-                ).exclude(user_id__in=[s.get('user_id', 0) for s in random_startupers]).order_by('?')[:3-len(random_startupers)]
+                ), 3-len(random_startupers), "home_startupers", exclude=[s.get('user_id', 0) for s in random_startupers])
 
                 for user in additional_startupers:
 
@@ -559,13 +612,13 @@ def home(request):
         random_startups = []
         try:
 
-            featured_startups = Startups.objects.filter(
+            featured_startups = random_sample(Startups.objects.filter(
                 status="approved"
-            ).order_by('?')[:3]
+            ), 3, "approved_startups")
 
 
             if len(featured_startups) == 0:
-                featured_startups = Startups.objects.all().order_by('?')[:3]
+                featured_startups = random_sample(Startups.objects.all(), 3, "all_startups")
 
             for startup in featured_startups:
 
@@ -936,6 +989,20 @@ def user_logout(request):
     messages.success(request, "Вы успешно вышли из системы.")
     return redirect("home")
 
+def cursor_page_response(request, queryset, template_name, entity_type=None, with_owner=False, per_page=6, context_name="page_obj"):
+    """
+    Отдаёт AJAX-страницу каталога в режиме keyset-пагинации: вместо page_number,
+    num_pages и count возвращается непрозрачный next_cursor для следующего запроса.
+    Карточки сущностей собираются из кэша фрагментов (см. render_card_fragments).
+    """
+    items, next_cursor = paginate_by_cursor(queryset, request.GET.get("cursor"), per_page)
+    payload = {"has_next": next_cursor is not None, "next_cursor": next_cursor}
+    if entity_type:
+        attach_card_file_urls(items, entity_type, with_owner=with_owner)
+        payload["html"], payload["card_cache"] = render_card_fragments(items, entity_type)
+    else:
+        payload["html"] = render_to_string(template_name, {context_name: items}, request=request)
+    return JsonResponse(payload)
 def startups_list(request):
     startup_directions = Directions.objects.filter(
         direction_name__in=[
@@ -947,7 +1014,7 @@ def startups_list(request):
         ]
     ).order_by('direction_name')
 
-    startups_qs = Startups.objects.filter(status="approved")
+    startups_qs = Startups.card_queryset().filter(status="approved")
     selected_categories = request.GET.getlist("category")
     micro_investment_str = request.GET.get("micro_investment", "0")
     min_goal_str = request.GET.get("min_goal", "0")
@@ -958,16 +1025,6 @@ def startups_list(request):
     min_rating_str = request.GET.get("min_rating", "0")
     max_rating_str = request.GET.get("max_rating", "5")
     sort_order = request.GET.get("sort_order", "newest")
-    page_number = request.GET.get("page", 1)
-
-    startups_qs = startups_qs.annotate(
-        total_voters_agg=Count("uservotes", distinct=True),
-        rating_agg=ExpressionWrapper(
-            Coalesce(Avg("uservotes__rating"), 0.0), output_field=FloatField()
-        ),
-        total_investors_agg=Count("investmenttransactions__investor", distinct=True),
-        rating_bucket=Floor(Coalesce(Avg("uservotes__rating"), 0.0)),
-    )
 
     categories = list(
         Directions.objects.annotate(id=F("direction_id"), name=F("direction_name"))
@@ -1013,9 +1070,9 @@ def startups_list(request):
         min_rating = float(min_rating_str)
         max_rating = float(max_rating_str)
         if min_rating > 0:
-            startups_qs = startups_qs.filter(rating_agg__gte=min_rating)
+            startups_qs = startups_qs.filter(rating_avg__gte=min_rating)
         if max_rating < 5:
-            startups_qs = startups_qs.filter(rating_agg__lte=max_rating)
+            startups_qs = startups_qs.filter(rating_avg__lte=max_rating)
     except ValueError:
         min_rating = 0
         max_rating = 5
@@ -1032,11 +1089,11 @@ def startups_list(request):
     goal_active = (min_goal > 0 or max_goal < 10000000)
     micro_active = (min_micro > 0 or max_micro < 1000000)
     if goal_active:
-        startups_qs = startups_qs.order_by("funding_goal", "rating_bucket", "rating_agg", "-created_at")
+        startups_qs = startups_qs.order_by("funding_goal", "rating_avg", "-created_at")
     elif micro_active:
-        startups_qs = startups_qs.order_by("percent_amount", "rating_bucket", "rating_agg", "-created_at")
+        startups_qs = startups_qs.order_by("percent_amount", "rating_avg", "-created_at")
     elif rating_active:
-        startups_qs = startups_qs.order_by("rating_bucket", "rating_agg", "-created_at")
+        startups_qs = startups_qs.order_by("rating_avg", "-created_at")
     elif filters_active:
         startups_qs = startups_qs.order_by("-created_at")
     else:
@@ -1045,28 +1102,16 @@ def startups_list(request):
         elif sort_order == "oldest":
             startups_qs = startups_qs.order_by("created_at")
 
-    paginator = Paginator(startups_qs, 6)
-    page_obj = paginator.get_page(page_number)
-
     is_ajax = request.headers.get("x-requested-with") == "XMLHttpRequest"
     if is_ajax:
-        html = render_to_string(
-            "accounts/partials/_startup_cards.html", {"page_obj": page_obj}
-        )
-        return JsonResponse(
-            {
-                "html": html,
-                "has_next": page_obj.has_next(),
-                "page_number": page_obj.number,
-                "num_pages": paginator.num_pages,
-                "count": paginator.count,
-            }
-        )
+        return cursor_page_response(request, startups_qs, "accounts/partials/_startup_cards.html", "startup")
     else:
+        page_obj, next_cursor = paginate_by_cursor(startups_qs, per_page=6)
+        attach_card_file_urls(page_obj, "startup")
         context = {
             "page_obj": page_obj,
-            "paginator": paginator,
-            "initial_has_next": page_obj.has_next(),
+            "next_cursor": next_cursor,
+            "initial_has_next": next_cursor is not None,
             "selected_categories": selected_categories,
             "search_query": search_query,
             "min_rating": min_rating,
@@ -1078,70 +1123,16 @@ def startups_list(request):
             "micro_investment": micro_investment,
             "sort_order": sort_order,
             "directions": startup_directions,
+            "facets": get_catalog_facets("startup"),
         }
         return render(request, "accounts/startups_list.html", context)
 
 def franchises_list(request):
 
-    existing_dir_ids = (
-        Franchises.objects.filter(status="approved", direction__isnull=False)
-        .values_list("direction_id", flat=True)
-        .distinct()
-    )
-    franchise_directions = Directions.objects.filter(direction_id__in=existing_dir_ids).order_by("direction_name")
-
-    if not Franchises.objects.exists():
-        franchise_names = [
-            "БургерХаус", "КофеМир", "ПиццаПлюс", "СушиБар", "ШаурмаСтар", "КебабКинг",
-            "БлинХаус", "ПельменХаус", "СупБар", "СалатСтар", "ДесертХаус", "МороженоМир",
-            "ЧайХаус", "СокБар", "КоктейльХаус", "СмузиСтар", "МилкшейкБар", "ЛимонадХаус",
-            "СпортХаус", "ФитнесСтар", "ЙогаБар", "ТанцыХаус", "БоксСтар", "ПлаваниеБар",
-            "БегХаус", "ВелосипедСтар", "ТренажерБар", "БассейнХаус", "СаунаСтар", "МассажБар",
-            "КрасотаХаус", "СалонСтар", "ПарикмахерБар", "МаникюрХаус", "ПедикюрСтар", "СПАБар",
-            "КосметикаХаус", "ПарфюмСтар", "УходБар", "МакияжХаус", "ПрическаСтар", "СтильБар",
-            "ОдеждаХаус", "ОбувьСтар", "АксессуарБар", "СумкаХаус", "РеменьСтар", "ЧасыБар",
-            "УкрашениеХаус", "БижутерияСтар", "ЗолотоБар", "СереброХаус", "ПлатинаСтар", "БриллиантБар"
-        ]
+    facets = get_catalog_facets("franchise")
+    franchise_directions = Directions.objects.filter(direction_name__in=list(facets["categories"])).order_by("direction_name")
 
-        startups = Startups.objects.filter(status="approved")
-        for i, startup in enumerate(startups):
-            franchise_name = franchise_names[i % len(franchise_names)]
-            franchise_direction = franchise_directions[i % len(franchise_directions)] if franchise_directions.exists() else None
-
-            franchise = Franchises.objects.create(
-                title=franchise_name,
-                short_description=startup.short_description,
-                description=startup.description,
-                terms=startup.terms,
-                direction=franchise_direction,
-                stage=startup.stage,
-                investment_size=startup.funding_goal,
-                payback_period=12,
-                own_businesses=5,
-                franchise_businesses=15,
-                valuation=startup.valuation,
-                pitch_deck_url=startup.pitch_deck_url,
-                created_at=startup.created_at,
-                updated_at=startup.updated_at,
-                status="approved",
-                total_invested=startup.total_invested,
-                info_url=startup.info_url,
-                percent_amount=startup.percent_amount,
-                customization_data=startup.customization_data,
-                total_voters=startup.total_voters,
-                sum_votes=startup.sum_votes,
-                is_edited=startup.is_edited,
-                moderator_comment=startup.moderator_comment,
-                step_number=startup.step_number,
-                logo_urls=startup.logo_urls,
-                creatives_urls=startup.creatives_urls,
-                proofs_urls=startup.proofs_urls,
-                video_urls=startup.video_urls,
-                planet_image=startup.planet_image,
-                owner=startup.owner
-            )
-
-    franchises_qs = Franchises.objects.filter(status="approved")
+    franchises_qs = Franchises.card_queryset().filter(status="approved")
     selected_categories = request.GET.getlist("category")
     min_payback_str = request.GET.get("min_payback", "0")
     max_payback_str = request.GET.get("max_payback", "60")
@@ -1151,7 +1142,6 @@ def franchises_list(request):
     min_rating_str = request.GET.get("min_rating", "0")
     max_rating_str = request.GET.get("max_rating", "5")
     sort_order = request.GET.get("sort_order", "newest")
-    page_number = request.GET.get("page", 1)
 
     franchises_qs = franchises_qs.annotate(
         rating_agg=ExpressionWrapper(
@@ -1244,89 +1234,16 @@ def franchises_list(request):
         elif sort_order == "oldest":
             franchises_qs = franchises_qs.order_by("created_at")
 
-    try:
-        approved_count = Franchises.objects.filter(status="approved").count()
-        if approved_count < 18:
-            from .models import Startups
-            available_startups = list(Startups.objects.filter(status="approved")[:100])
-            seed_names = [
-                "Orbit Digital", "NovaLab Studio", "Cometix", "PixelFoundry",
-                "NeuroCraft", "Skyline Media", "Quantum Works", "AstroBrand",
-                "DeepWave", "Hyperlink", "BlueOrbit", "MetaForge",
-                "Brandverse", "CodeSmiths", "UXia Lab", "Visionary",
-                "IdeaGarden", "EchoPixel", "CraftLabs", "MotionQuark",
-            ]
-            import random
-            missing = 18 - approved_count
-            for i in range(max(0, missing)):
-                base_title = seed_names[i % len(seed_names)]
-                title = f"{base_title} {random.randint(100, 999)}"
-                st = available_startups[i % len(available_startups)] if available_startups else None
-                try:
-                    Franchises.objects.create(
-                        title=title,
-                        short_description=(st.short_description if st else "Агентство полного цикла"),
-                        description=(st.description if st else "Услуги: разработка, дизайн, маркетинг."),
-                        terms=(st.terms if st else "Условия обсуждаются индивидуально."),
-                        direction=(st.direction if st else None),
-                        stage=(st.stage if st else None),
-                        investment_size=(st.funding_goal if st else 0),
-                        payback_period=12,
-                        own_businesses=0,
-                        franchise_businesses=0,
-                        valuation=(st.valuation if st else 0),
-                        pitch_deck_url=(st.pitch_deck_url if st else None),
-                        created_at=timezone.now(),
-                        updated_at=timezone.now(),
-                        status="approved",
-                        total_invested=0,
-                        info_url=(st.info_url if st else None),
-                        percent_amount=(st.percent_amount if st else 0),
-                        customization_data={"agency_category": random.choice([
-                            "Веб-разработка", "Мобильная разработка", "Дизайн",
-                            "Маркетинг", "ИИ", "Брендинг", "Видео и мультимедиа"
-                        ])},
-                        total_voters=0,
-                        sum_votes=0,
-                        is_edited=False,
-                        moderator_comment=None,
-                        step_number=1,
-                        logo_urls=(st.logo_urls if st else []),
-                        creatives_urls=(st.creatives_urls if st else []),
-                        proofs_urls=(st.proofs_urls if st else []),
-                        video_urls=(st.video_urls if st else []),
-                        planet_image=(st.planet_image if st else None),
-                        owner=(st.owner if st else None),
-                        franchise_cost=0,
-                        profit_calculation=None,
-                    )
-                except Exception:
-                    pass
-    except Exception:
-        pass
-
-    paginator = Paginator(franchises_qs, 6)
-    page_obj = paginator.get_page(page_number)
-
     is_ajax = request.headers.get("x-requested-with") == "XMLHttpRequest"
     if is_ajax:
-        html = render_to_string(
-            "accounts/partials/_franchise_cards.html", {"page_obj": page_obj}
-        )
-        return JsonResponse(
-            {
-                "html": html,
-                "has_next": page_obj.has_next(),
-                "page_number": page_obj.number,
-                "num_pages": paginator.num_pages,
-                "count": paginator.count,
-            }
-        )
+        return cursor_page_response(request, franchises_qs, "accounts/partials/_franchise_cards.html", "franchise", with_owner=True)
     else:
+        page_obj, next_cursor = paginate_by_cursor(franchises_qs, per_page=6)
+        attach_card_file_urls(page_obj, "franchise", with_owner=True)
         context = {
             "page_obj": page_obj,
-            "paginator": paginator,
-            "initial_has_next": page_obj.has_next(),
+            "next_cursor": next_cursor,
+            "initial_has_next": next_cursor is not None,
             "selected_categories": selected_categories,
             "search_query": search_query,
             "min_rating": min_rating,
@@ -1337,11 +1254,12 @@ def franchises_list(request):
             "max_investment": max_investment,
             "sort_order": sort_order,
             "franchise_directions": franchise_directions,
+            "facets": facets,
         }
         return render(request, "accounts/franchises_list.html", context)
 def agencies_list(request):
 
-    agencies_qs = Agencies.objects.filter(status="approved")
+    agencies_qs = Agencies.card_queryset().filter(status="approved")
     agency_categories = [
         "Веб-разработка",
         "Мобильная разработка",
@@ -1357,7 +1275,6 @@ def agencies_list(request):
     min_rating_str = request.GET.get("min_rating", "0")
     max_rating_str = request.GET.get("max_rating", "5")
     sort_order = request.GET.get("sort_order", "newest")
-    page_number = request.GET.get("page", 1)
 
     agencies_qs = agencies_qs.annotate(
         rating_agg=ExpressionWrapper(
@@ -1412,39 +1329,28 @@ def agencies_list(request):
         elif sort_order == "oldest":
             agencies_qs = agencies_qs.order_by("created_at")
 
-    paginator = Paginator(agencies_qs, 6)
-    page_obj = paginator.get_page(page_number)
-
     is_ajax = request.headers.get("x-requested-with") == "XMLHttpRequest"
     if is_ajax:
-        html = render_to_string(
-            "accounts/partials/_agency_cards.html", {"page_obj": page_obj}
-        )
-        return JsonResponse(
-            {
-                "html": html,
-                "has_next": page_obj.has_next(),
-                "page_number": page_obj.number,
-                "num_pages": paginator.num_pages,
-                "count": paginator.count,
-            }
-        )
+        return cursor_page_response(request, agencies_qs, "accounts/partials/_agency_cards.html", "agency", with_owner=True)
     else:
+        page_obj, next_cursor = paginate_by_cursor(agencies_qs, per_page=6)
+        attach_card_file_urls(page_obj, "agency", with_owner=True)
         context = {
             "page_obj": page_obj,
-            "paginator": paginator,
-            "initial_has_next": page_obj.has_next(),
+            "next_cursor": next_cursor,
+            "initial_has_next": next_cursor is not None,
             "selected_categories": selected_categories,
             "search_query": search_query,
             "min_rating": min_rating,
             "max_rating": max_rating,
             "sort_order": sort_order,
             "agency_categories": agency_categories,
+            "facets": get_catalog_facets("agency"),
         }
         return render(request, "accounts/agencies_list.html", context)
 
 def specialists_list(request):
-    specialists_qs = Specialists.objects.filter(status="approved")
+    specialists_qs = Specialists.card_queryset().filter(status="approved")
     specialist_categories = [
         "Веб-разработка",
         "Мобильная разработка",
@@ -1460,7 +1366,6 @@ def specialists_list(request):
     min_rating_str = request.GET.get("min_rating", "0")
     max_rating_str = request.GET.get("max_rating", "5")
     sort_order = request.GET.get("sort_order", "newest")
-    page_number = request.GET.get("page", 1)
 
     specialists_qs = specialists_qs.annotate(
         rating_agg=ExpressionWrapper(
@@ -1515,34 +1420,23 @@ def specialists_list(request):
         elif sort_order == "oldest":
             specialists_qs = specialists_qs.order_by("created_at")
 
-    paginator = Paginator(specialists_qs, 6)
-    page_obj = paginator.get_page(page_number)
-
     is_ajax = request.headers.get("x-requested-with") == "XMLHttpRequest"
     if is_ajax:
-        html = render_to_string(
-            "accounts/partials/_specialist_cards.html", {"page_obj": page_obj}
-        )
-        return JsonResponse(
-            {
-                "html": html,
-                "has_next": page_obj.has_next(),
-                "page_number": page_obj.number,
-                "num_pages": paginator.num_pages,
-                "count": paginator.count,
-            }
-        )
+        return cursor_page_response(request, specialists_qs, "accounts/partials/_specialist_cards.html", "specialist", with_owner=True)
     else:
+        page_obj, next_cursor = paginate_by_cursor(specialists_qs, per_page=6)
+        attach_card_file_urls(page_obj, "specialist", with_owner=True)
         context = {
             "page_obj": page_obj,
-            "paginator": paginator,
-            "initial_has_next": page_obj.has_next(),
+            "next_cursor": next_cursor,
+            "initial_has_next": next_cursor is not None,
             "selected_categories": selected_categories,
             "search_query": search_query,
             "min_rating": min_rating,
             "max_rating": max_rating,
             "sort_order": sort_order,
             "specialist_categories": specialist_categories,
+            "facets": get_catalog_facets("specialist"),
         }
         return render(request, "accounts/specialists_list.html", context)
 def agency_detail(request, franchise_id):
@@ -1605,7 +1499,12 @@ def agency_detail(request, franchise_id):
         candidates_qs = Agencies.objects.filter(
             status="approved",
         ).exclude(agency_id=franchise_id)
-    similar_franchises = candidates_qs.order_by("-created_at")[:4]
+    similar_franchises = similar_entities(
+        "agency",
+        franchise_id,
+        Agencies.objects.filter(status="approved"),
+        lambda: candidates_qs.order_by("-created_at")[:4],
+    )
 
     comments_with_rating = (
         AgencyComments.objects.filter(agency=franchise, parent_comment__isnull=True)
@@ -1708,7 +1607,12 @@ def specialist_detail(request, specialist_id):
         candidates_qs = Specialists.objects.filter(
             status="approved",
         ).exclude(specialist_id=specialist_id)
-    similar_specialists = candidates_qs.order_by("-created_at")[:4]
+    similar_specialists = similar_entities(
+        "specialist",
+        specialist_id,
+        Specialists.objects.filter(status="approved"),
+        lambda: candidates_qs.order_by("-created_at")[:4],
+    )
 
     comments_with_rating = (
         SpecialistComments.objects.filter(specialist=specialist, parent_comment__isnull=True)
@@ -1798,7 +1702,12 @@ def franchise_detail(request, franchise_id):
         direction=franchise.direction,
         status="approved",
     ).exclude(franchise_id=franchise_id)
-    similar_franchises = candidates_qs.order_by("-created_at")[:4]
+    similar_franchises = similar_entities(
+        "franchise",
+        franchise_id,
+        Franchises.objects.filter(status="approved"),
+        lambda: candidates_qs.order_by("-created_at")[:4],
+    )
 
     from .models import FranchiseComments
     comments_with_rating = (
@@ -1845,189 +1754,46 @@ def franchise_detail(request, franchise_id):
 def search_suggestions(request):
     query = request.GET.get("q", "").strip()
     users = []
+    cache_status = None
     if len(query) >= 2:
-        search_results = Users.objects.filter(
-            Q(first_name__icontains=query)
-            | Q(last_name__icontains=query)
-            | Q(email__icontains=query)
-        ).distinct()[:10]
-        users = [
-            {
-                "id": user.user_id,
-                "name": f"{user.first_name or ''} {user.last_name or ''} ({user.email})".strip(),
-            }
-            for user in search_results
-        ]
-    return JsonResponse({"suggestions": users})
+        def compute():
+            search_results = typeahead_users(
+                Users.objects.only("user_id", "first_name", "last_name", "email"), query
+            )
+            suggestions = [
+                {
+                    "id": user.user_id,
+                    "name": f"{user.first_name or ''} {user.last_name or ''} ({user.email})".strip(),
+                }
+                for user in search_results
+            ]
+            return suggestions, not suggestions, True
+        users, cache_status = cached_search("search_suggestions", query, compute)
+    payload = {"suggestions": users}
+    if cache_status:
+        payload["search_cache"] = {"status": cache_status, **get_search_cache_stats().get("search_suggestions", {})}
+    return JsonResponse(payload)
 
 def global_search(request):
     """Глобальный поиск по всем типам карточек"""
     try:
         query = request.GET.get("q", "").strip()
-
-        if len(query) < 2:
-            return JsonResponse({
-                "users": [],
-                "startups": [],
-                "franchises": [],
-                "agencies": [],
-                "specialists": []
-            })
-
-        results = {
-            "users": [],
-            "startups": [],
-            "franchises": [],
-            "agencies": [],
-            "specialists": []
-        }
-
-
-        try:
-            users = Users.objects.filter(
-                Q(first_name__icontains=query) |
-                Q(last_name__icontains=query) |
-                Q(email__icontains=query)
-            ).distinct()[:5]
-
-            for user in users:
-                try:
-                    results["users"].append({
-                        "id": user.user_id,
-                        "name": f"{user.first_name or ''} {user.last_name or ''}".strip() or user.email,
-                        "type": "user",
-                        "url": reverse('profile', kwargs={'user_id': user.user_id})
-                    })
-                except Exception as e:
-                    logger.error(f"Ошибка при обработке пользователя {user.user_id}: {e}")
-                    continue
-        except Exception as e:
-            logger.error(f"Ошибка при поиске пользователей: {e}")
-
-
-        try:
-
-            try:
-
-                approved_status = ReviewStatuses.objects.get(status_name="Approved")
-                startups = Startups.objects.filter(
-                    Q(title__icontains=query) |
-                    Q(short_description__icontains=query)
-                ).filter(status_id=approved_status).distinct()[:5]
-            except ReviewStatuses.DoesNotExist:
-
-                startups = Startups.objects.filter(
-                    Q(title__icontains=query) |
-                    Q(short_description__icontains=query)
-                ).filter(status="approved").distinct()[:5]
-
-            for startup in startups:
-                try:
-
-                    if not startup.title:
-                        continue
-
-                    results["startups"].append({
-                        "id": startup.startup_id,
-                        "name": startup.title,
-                        "type": "startup",
-                        "url": reverse('startup_detail', kwargs={'startup_id': startup.startup_id})
-                    })
-                except Exception as e:
-                    logger.error(f"Ошибка при обработке стартапа {startup.startup_id}: {e}")
-                    continue
-        except Exception as e:
-            logger.error(f"Ошибка при поиске стартапов: {e}")
-
-
-        try:
-
-            try:
-
-                approved_status = ReviewStatuses.objects.get(status_name="Approved")
-                franchises = Franchises.objects.filter(
-                    Q(title__icontains=query) |
-                    Q(short_description__icontains=query)
-                ).filter(status_id=approved_status).distinct()[:5]
-            except ReviewStatuses.DoesNotExist:
-
-                franchises = Franchises.objects.filter(
-                    Q(title__icontains=query) |
-                    Q(short_description__icontains=query)
-                ).filter(status="approved").distinct()[:5]
-
-            for franchise in franchises:
-                try:
-
-                    if not franchise.title:
-                        continue
-
-                    results["franchises"].append({
-                        "id": franchise.franchise_id,
-                        "name": franchise.title,
-                        "type": "franchise",
-                        "url": reverse('franchise_detail', kwargs={'franchise_id': franchise.franchise_id})
-                    })
-                except Exception as e:
-                    logger.error(f"Ошибка при обработке франшизы {franchise.franchise_id}: {e}")
-                    continue
-        except Exception as e:
-            logger.error(f"Ошибка при поиске франшиз: {e}")
-
-
-        try:
-
-            agencies = Agencies.objects.filter(
-                Q(title__icontains=query) |
-                Q(short_description__icontains=query)
-            ).filter(status="approved").distinct()[:5]
-
-            for agency in agencies:
-                try:
-
-                    if not agency.title:
-                        continue
-
-                    results["agencies"].append({
-                        "id": agency.agency_id,
-                        "name": agency.title,
-                        "type": "agency",
-                        "url": reverse('agency_detail', kwargs={'agency_id': agency.agency_id})
-                    })
-                except Exception as e:
-                    logger.error(f"Ошибка при обработке агентства {agency.agency_id}: {e}")
-                    continue
-        except Exception as e:
-            logger.error(f"Ошибка при поиске агентств: {e}")
-
-
-        try:
-
-            specialists = Specialists.objects.filter(
-                Q(title__icontains=query) |
-                Q(short_description__icontains=query)
-            ).filter(status="approved").distinct()[:5]
-
-            for specialist in specialists:
-                try:
-
-                    if not specialist.title:
-                        continue
-
-                    results["specialists"].append({
-                        "id": specialist.specialist_id,
-                        "name": specialist.title,
-                        "type": "specialist",
-                        "url": reverse('specialist_detail', kwargs={'specialist_id': specialist.specialist_id})
-                    })
-                except Exception as e:
-                    logger.error(f"Ошибка при обработке специалиста {specialist.specialist_id}: {e}")
-                    continue
-        except Exception as e:
-            logger.error(f"Ошибка при поиске специалистов: {e}")
-
-        return JsonResponse(results)
-
+        started = time.perf_counter()
+        timings = {}
+        def compute():
+            results, section_timings = global_search_results(query)
+            timings.update(section_timings)
+            empty = not any(results[section] for section in SEARCH_RESULT_TYPES)
+            return results, empty, not results["partial"]
+        results, cache_status = cached_search("global_search", query, compute)
+        response = JsonResponse({
+            **results,
+            "search_cache": {"status": cache_status, **get_search_cache_stats().get("global_search", {})},
+        })
+        timings["total"] = ((time.perf_counter() - started) * 1000, "ok")
+        timings["cache"] = (0.0, cache_status)
+        response["Server-Timing"] = server_timing_header(timings)
+        return response
     except Exception as e:
         logger.error(f"Критическая ошибка в global_search: {e}")
         return JsonResponse({
@@ -2035,6 +1801,17 @@ def global_search(request):
             "details": str(e) if settings.DEBUG else "Внутренняя ошибка сервера"
         }, status=500)
 
+def title_autocomplete(request):
+    """Автодополнение названий карточек из индекса в памяти, без запросов к БД на каждый ввод"""
+    query = request.GET.get("q", "").strip()
+    if not query:
+        return JsonResponse({"suggestions": []})
+    try:
+        limit = max(1, min(int(request.GET.get("limit", 10)), TYPEAHEAD_MAX_LIMIT))
+    except ValueError:
+        limit = 10
+    return JsonResponse({"suggestions": autocomplete_titles(query, limit)})
+
 def startup_detail(request, startup_id):
     try:
         startup = Startups.objects.select_related("owner", "direction", "stage").get(
@@ -2084,20 +1861,19 @@ def startup_detail(request, startup_id):
                 comment.user_rating = new_rating
                 if user_vote:
                     if user_vote.rating != new_rating:
-                        startup.sum_votes = (startup.sum_votes or 0) + (new_rating - int(user_vote.rating or 0))
+                        previous_rating = user_vote.rating
                         user_vote.rating = new_rating
                         user_vote.save(update_fields=["rating"])
-                        startup.save(update_fields=["sum_votes"])
+                        startup.add_vote(new_rating, previous_rating=previous_rating)
                 else:
                     UserVotes.objects.create(user=request.user, startup=startup, rating=new_rating)
-                    startup.total_voters = (startup.total_voters or 0) + 1
-                    startup.sum_votes = (startup.sum_votes or 0) + new_rating
-                    startup.save(update_fields=["total_voters", "sum_votes"])
+                    startup.add_vote(new_rating)
             else:
                 if user_vote:
                     comment.user_rating = user_vote.rating
 
             comment.save()
+            startup.update_counters("comments_count")
             messages.success(request, "Ваш комментарий был добавлен.")
             return redirect("startup_detail", startup_id=startup.startup_id)
         else:
@@ -2140,20 +1916,17 @@ def startup_detail(request, startup_id):
     }
     for i in range(1, 6):
         rating_distribution.setdefault(i, 0)
-    similar_startups = (
-        Startups.objects.filter(status="approved")
-        .exclude(startup_id=startup.startup_id)
-        .order_by("?")[:4]
+    similar_startups = similar_entities(
+        "startup",
+        startup.startup_id,
+        Startups.card_queryset().filter(status="approved"),
+        lambda: random_sample(
+            Startups.card_queryset().filter(status="approved"),
+            4,
+            "approved_startups",
+            exclude=[startup.startup_id],
+        ),
     )
-    similar_startups = similar_startups.annotate(
-        average_rating_calc=Avg(
-            models.ExpressionWrapper(
-                models.F("sum_votes") * 1.0 / models.F("total_voters"),
-                output_field=FloatField(),
-            ),
-            filter=models.Q(total_voters__gt=0),
-        )
-    ).annotate(average_rating=Coalesce("average_rating_calc", 0.0))
     logo_urls = startup.logo_urls if isinstance(startup.logo_urls, list) else []
     creatives_urls = (
         startup.creatives_urls if isinstance(startup.creatives_urls, list) else []
@@ -2209,20 +1982,18 @@ def startup_detail(request, startup_id):
     return render(request, "accounts/startup_detail.html", context)
 def load_similar_startups(request, startup_id: int):
     current_startup_id = startup_id
-    similar_startups = (
-        Startups.objects.filter(status="approved")
-        .exclude(startup_id=current_startup_id)
-        .order_by("?")[:4]
+    similar_startups = similar_entities(
+        "startup",
+        current_startup_id,
+        Startups.card_queryset().filter(status="approved"),
+        lambda: random_sample(
+            Startups.card_queryset().filter(status="approved"),
+            4,
+            "approved_startups",
+            exclude=[current_startup_id],
+        ),
     )
-    similar_startups = similar_startups.annotate(
-        average_rating_calc=Avg(
-            models.ExpressionWrapper(
-                models.F("sum_votes") * 1.0 / models.F("total_voters"),
-                output_field=FloatField(),
-            ),
-            filter=models.Q(total_voters__gt=0),
-        )
-    ).annotate(average_rating=Coalesce("average_rating_calc", 0.0))
+    similar_startups = attach_card_file_urls(similar_startups, "startup")
     html = render_to_string(
         "accounts/_similar_startup_cards.html",
         {"similar_startups": similar_startups, "request": request},
@@ -2396,13 +2167,7 @@ def investments(request):
             f"[investments] Final structured chart data list: {chart_data_list}"
         )
         try:
-            s3_client = client(
-                "s3",
-                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                endpoint_url=settings.AWS_S3_ENDPOINT_URL,
-                region_name=settings.AWS_S3_REGION_NAME,
-            )
+            s3_client = get_s3_client()
         except Exception as s3_init_err:
             logger.error(f"[investments] S3 client init failed: {s3_init_err}")
             s3_client = None
@@ -2430,20 +2195,8 @@ def investments(request):
             Startups.objects.filter(owner_id=request.user.user_id, status="approved")
             .select_related("direction")
             .annotate(
-                average_rating=Avg(
-                    ExpressionWrapper(
-                        Coalesce(F("sum_votes"), 0)
-                        * 1.0
-                        / Coalesce(F("total_voters"), 1),
-                        output_field=FloatField(),
-                    ),
-                    filter=Q(total_voters__gt=0),
-                    default=0.0,
-                ),
-                comment_count=Count("comments", distinct=True),
-                investors_count=Count(
-                    "investmenttransactions__investor", distinct=True
-                ),
+                average_rating=F("rating_avg"),
+                comment_count=F("comments_count"),
             )
             .order_by("-amount_raised")[:5]
         )
@@ -2801,13 +2554,7 @@ def delete_avatar(request):
             avatar_id = str(uuid.uuid4())
             file_path = f"users/{request.user.user_id}/avatar/{avatar_id}_{avatar.name}"
             try:
-                s3_client = boto3.client(
-                    "s3",
-                    endpoint_url=settings.AWS_S3_ENDPOINT_URL,
-                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                    region_name=settings.AWS_S3_REGION_NAME,
-                )
+                s3_client = get_s3_client()
                 bucket_name = settings.AWS_STORAGE_BUCKET_NAME
                 prefix = f"users/{request.user.user_id}/avatar/"
                 response = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=prefix)
@@ -2820,7 +2567,10 @@ def delete_avatar(request):
                     entity_id=request.user.user_id,
                     file_type__type_name="avatar",
                 ).delete()
-                default_storage.save(file_path, avatar)
+                invalidate_file_cache(
+                    (request.user.profile_picture_url or "").strip(), request.user.user_id, "avatar", "user"
+                )
+                object_key = default_storage.save(file_path, avatar)
                 request.user.profile_picture_url = avatar_id
                 request.user.save()
                 entity_type, _ = EntityTypes.objects.get_or_create(type_name="user")
@@ -2831,6 +2581,8 @@ def delete_avatar(request):
                     file_url=avatar_id,
                     file_type=file_type,
                     uploaded_at=timezone.now(),
+                    object_key=object_key,
+                    has_derivatives=try_generate_image_derivatives(avatar, object_key),
                 )
                 logger.info(
                     f"Аватар сохранён для user_id {request.user.user_id} по пути: {file_path}, UUID: {avatar_id}"
@@ -3244,215 +2996,83 @@ def create_startup(request):
                 startup.both_mode = True
             startup.step_number = int(request.POST.get("step_number", 1))
             startup.planet_image = form.cleaned_data.get("planet_image")
-            logger.info("Сохранение стартапа перед обработкой файлов...")
-            startup.save()
-            logger.info(f"Стартап сохранен, startup_id: {startup.startup_id}")
-            if not startup.startup_id:
-                logger.error("Ошибка: startup_id не сгенерирован после сохранения!")
-                messages.error(
-                    request,
-                    "Произошла ошибка при создании стартапа: ID не сгенерирован.",
-                )
-                return render(
-                    request,
-                    "accounts/create_startup.html",
-                    {"form": form, "timeline_steps": request.POST},
-                )
-            for i in range(1, 6):
-                description = request.POST.get(f"step_description_{i}", "").strip()
-                if description:
-                    StartupTimeline.objects.create(
-                        startup=startup,
-                        step_number=i,
-                        title=f"Этап {i}",
-                        description=description,
+            with transaction.atomic():
+                logger.info("Сохранение стартапа перед обработкой файлов...")
+                startup.save()
+                logger.info(f"Стартап сохранен, startup_id: {startup.startup_id}")
+                if not startup.startup_id:
+                    logger.error("Ошибка: startup_id не сгенерирован после сохранения!")
+                    messages.error(
+                        request,
+                        "Произошла ошибка при создании стартапа: ID не сгенерирован.",
+                    )
+                    return render(
+                        request,
+                        "accounts/create_startup.html",
+                        {"form": form, "timeline_steps": request.POST},
                     )
-            logo_ids = []
-            creatives_ids = []
-            proofs_ids = []
-            video_ids = []
-            file_save_errors = []
+                save_timeline_steps(startup, request.POST)
             def try_save_file(file_obj, file_path):
                 try:
-                    default_storage.save(file_path, file_obj)
-                    return True
+                    return default_storage.save(file_path, file_obj)
                 except Exception as e:
                     logger.error(f"Ошибка default_storage.save для {file_path}: {e}", exc_info=True)
                     try:
-                        s3 = boto3.client(
-                            's3',
-                            endpoint_url=getattr(settings, 'AWS_S3_ENDPOINT_URL', None),
-                            aws_access_key_id=getattr(settings, 'AWS_ACCESS_KEY_ID', None),
-                            aws_secret_access_key=getattr(settings, 'AWS_SECRET_ACCESS_KEY', None),
-                            region_name=getattr(settings, 'AWS_S3_REGION_NAME', None),
-                            config=boto3.session.Config(s3={'addressing_style': getattr(settings, 'AWS_S3_ADDRESSING_STYLE', 'virtual')})
-                        )
-                        bucket = getattr(settings, 'AWS_STORAGE_BUCKET_NAME', None)
-                        content_type = getattr(file_obj, 'content_type', 'application/octet-stream')
-                        body_bytes = file_obj.read()
-                        try:
-                            s3.put_object(Bucket=bucket, Key=file_path, Body=body_bytes, ContentType=content_type)
-                        except Exception:
-                            s3.put_object(Bucket=bucket, Key=file_path, Body=body_bytes)
-                        return True
+                        return stream_upload(file_obj, file_path, getattr(file_obj, 'content_type', None))
                     except Exception as e2:
                         logger.error(f"Ошибка прямой загрузки в S3 для {file_path}: {e2}", exc_info=True)
-                        return False
+                        return None
+            reserved_names = {}
             logo = form.cleaned_data.get("logo") or request.FILES.get("logo")
-            if logo:
-                logo_id = str(uuid.uuid4())
-                base_name = os.path.splitext(logo.name)[0]
-                ext = os.path.splitext(logo.name)[1]
-                safe_base_name = "".join(
-                    c for c in base_name if c.isalnum() or c in ("-", "_")
-                )
-                safe_name = slugify(safe_base_name) + ext
-                file_path = f"startups/{startup.startup_id}/logos/{logo_id}_{safe_name}"
-                logo_type, _ = FileTypes.objects.get_or_create(type_name="logo")
-                entity_type, _ = EntityTypes.objects.get_or_create(type_name="startup")
-                try:
-                    logger.info(f"Попытка сохранить логотип по пути: {file_path}")
-                    if not try_save_file(logo, file_path):
-                        raise Exception("Не удалось сохранить логотип")
-                    logger.info(f"Логотип успешно сохранён по пути: {file_path}")
-                    logo_ids.append(logo_id)
-                    FileStorage.objects.create(
-                        entity_type=entity_type,
-                        entity_id=startup.startup_id,
-                        file_type=logo_type,
-                        file_url=logo_id,
-                        uploaded_at=timezone.now(),
-                        startup=startup,
-                    )
-                    logger.info(f"Логотип сохранён: {file_path}")
-                except Exception as e:
-                    logger.error(f"Ошибка сохранения логотипа: {e}", exc_info=True)
-                    messages.warning(request, "Не удалось сохранить логотип, но стартап создан.")
-                    file_save_errors.append({"field": "logo", "error": str(e)})
-            creatives = form.cleaned_data.get("creatives", [])
-            if not creatives:
-                creatives = request.FILES.getlist("creatives")
-            if creatives:
-                creative_type, _ = FileTypes.objects.get_or_create(type_name="creative")
-                entity_type, _ = EntityTypes.objects.get_or_create(type_name="startup")
-                for creative_file in creatives:
-                    if not hasattr(creative_file, "name"):
-                        logger.warning(f"Пропущен креатив: {creative_file}")
-                        continue
-                    unique_filename = get_unique_filename(creative_file.name, startup.startup_id, "creative")
-                    creative_id = str(uuid.uuid4())
-                    base_name = os.path.splitext(creative_file.name)[0]
-                    ext = os.path.splitext(creative_file.name)[1]
-                    safe_base_name = "".join(
-                        c for c in base_name if c.isalnum() or c in ("-", "_")
-                    )
-                    safe_name = slugify(safe_base_name) + ext
-                    file_path = f"startups/{startup.startup_id}/creatives/{creative_id}_{safe_name}"
-                    try:
-                        logger.info(f"Попытка сохранить креатив по пути: {file_path}")
-                        if not try_save_file(creative_file, file_path):
-                            raise Exception("Не удалось сохранить креатив")
-                        logger.info(f"Креатив успешно сохранён по пути: {file_path}")
-                        creatives_ids.append(creative_id)
-                        safe_create_file_storage(
-                            entity_type=entity_type,
-                            entity_id=startup.startup_id,
-                            file_type=creative_type,
-                            file_url=creative_id,
-                            uploaded_at=timezone.now(),
-                            startup=startup,
-                            original_file_name=unique_filename,
-                        )
-                        logger.info(f"Креатив сохранён: {file_path}")
-                    except Exception as e:
-                        logger.error(f"Ошибка сохранения креатива: {e}", exc_info=True)
-                        messages.warning(request, "Не удалось сохранить один из креативов, но стартап создан.")
-                        file_save_errors.append({"field": "creatives", "file": getattr(creative_file, "name", ""), "error": str(e)})
-            proofs = form.cleaned_data.get("proofs", [])
-            if not proofs:
-                proofs = request.FILES.getlist("proofs")
-            if proofs:
-                proof_type, _ = FileTypes.objects.get_or_create(type_name="proof")
-                entity_type, _ = EntityTypes.objects.get_or_create(type_name="startup")
-                for proof_file in proofs:
-                    if not hasattr(proof_file, "name"):
-                        logger.warning(f"Пропущен пруф: {proof_file}")
-                        continue
-                    unique_filename = get_unique_filename(proof_file.name, startup.startup_id, "proof")
-                    proof_id = str(uuid.uuid4())
-                    base_name = os.path.splitext(proof_file.name)[0]
-                    ext = os.path.splitext(proof_file.name)[1]
-                    safe_base_name = "".join(
-                        c for c in base_name if c.isalnum() or c in ("-", "_")
-                    )
-                    safe_name = slugify(safe_base_name) + ext
-                    file_path = (
-                        f"startups/{startup.startup_id}/proofs/{proof_id}_{safe_name}"
+            creatives = form.cleaned_data.get("creatives", []) or request.FILES.getlist("creatives")
+            proofs = form.cleaned_data.get("proofs", []) or request.FILES.getlist("proofs")
+            videos = form.cleaned_data.get("video", []) or request.FILES.getlist("video")
+            file_sets = [
+                ("logo", "logo", [logo] if logo else []),
+                ("creatives", "creative", creatives),
+                ("proofs", "proof", proofs),
+                ("video", "video", videos),
+            ]
+            # Загрузки в S3 идут без открытой транзакции: ключи файлов строятся
+            # по startup_id, поэтому стартап и дорожная карта фиксируются раньше
+            uploads = upload_entity_files(
+                "startup",
+                startup.startup_id,
+                file_sets,
+                original_name=lambda file_obj, file_type_name, file_path: (
+                    None if file_type_name == "logo"
+                    else get_unique_filename(
+                        file_obj.name, startup.startup_id, file_type_name,
+                        reserved=reserved_names.setdefault(file_type_name, set()),
                     )
-                    try:
-                        logger.info(f"Попытка сохранить пруф по пути: {file_path}")
-                        if not try_save_file(proof_file, file_path):
-                            raise Exception("Не удалось сохранить документ")
-                        logger.info(f"Пруф успешно сохранён по пути: {file_path}")
-                        proofs_ids.append(proof_id)
-                        safe_create_file_storage(
-                            entity_type=entity_type,
-                            entity_id=startup.startup_id,
-                            file_type=proof_type,
-                            file_url=proof_id,
-                            uploaded_at=timezone.now(),
-                            startup=startup,
-                            original_file_name=unique_filename,
-                        )
-                        logger.info(f"Пруф сохранён: {file_path}, оригинальное название: {unique_filename}")
-                    except Exception as e:
-                        logger.error(f"Ошибка сохранения пруфа: {e}", exc_info=True)
-                        messages.warning(request, "Не удалось сохранить один из документов, но стартап создан.")
-                        file_save_errors.append({"field": "proofs", "file": getattr(proof_file, "name", ""), "error": str(e)})
-            videos = form.cleaned_data.get("video", [])
-            if not videos:
-                videos = request.FILES.getlist("video")
-            if videos:
-                video_type, _ = FileTypes.objects.get_or_create(type_name="video")
-                entity_type, _ = EntityTypes.objects.get_or_create(type_name="startup")
-                for video in videos:
-                    if not hasattr(video, "name"):
-                        logger.warning(f"Пропущено видео: {video}")
-                        continue
-                    unique_filename = get_unique_filename(video.name, startup.startup_id, "video")
-                    video_id = str(uuid.uuid4())
-                    base_name = os.path.splitext(video.name)[0]
-                    ext = os.path.splitext(video.name)[1]
-                    safe_base_name = "".join(
-                        c for c in base_name if c.isalnum() or c in ("-", "_")
+                ),
+                save_file=lambda file_path, file_obj: try_save_file(file_obj, file_path),
+            )
+            try:
+                with transaction.atomic():
+                    ids_by_field, file_save_errors = record_entity_files(
+                        "startup", startup.startup_id, file_sets, uploads, startup=startup
                     )
-                    safe_name = slugify(safe_base_name) + ext
-                    file_path = f"startups/{startup.startup_id}/videos/{video_id}_{safe_name}"
-                    try:
-                        logger.info(f"Попытка сохранить видео по пути: {file_path}")
-                        if not try_save_file(video, file_path):
-                            raise Exception("Не удалось сохранить видео")
-                        logger.info(f"Видео успешно сохранено по пути: {file_path}")
-                        video_ids.append(video_id)
-                        safe_create_file_storage(
-                            entity_type=entity_type,
-                            entity_id=startup.startup_id,
-                            file_type=video_type,
-                            file_url=video_id,
-                            uploaded_at=timezone.now(),
-                            startup=startup,
-                            original_file_name=unique_filename,
-                        )
-                        logger.info(f"Видео сохранено: {file_path}")
-                    except Exception as e:
-                        logger.error(f"Ошибка сохранения видео: {e}", exc_info=True)
-                        messages.warning(request, "Не удалось сохранить одно из видео, но стартап создан.")
-                        file_save_errors.append({"field": "video", "file": getattr(video, "name", ""), "error": str(e)})
-            startup.logo_urls = logo_ids
-            startup.creatives_urls = creatives_ids
-            startup.proofs_urls = proofs_ids
-            startup.video_urls = video_ids
-            startup.save()
+                    startup.logo_urls = ids_by_field["logo"]
+                    startup.creatives_urls = ids_by_field["creatives"]
+                    startup.proofs_urls = ids_by_field["proofs"]
+                    startup.video_urls = ids_by_field["video"]
+                    startup.save(update_fields=["logo_urls", "creatives_urls", "proofs_urls", "video_urls"])
+            except Exception:
+                logger.error(f"Не удалось записать файлы стартапа {startup.startup_id}, стартап удаляется", exc_info=True)
+                delete_uploaded_files(uploads)
+                with transaction.atomic():
+                    StartupTimeline.objects.filter(startup=startup).delete()
+                    startup.delete()
+                raise
+            file_warnings = {
+                "logo": "Не удалось сохранить логотип, но стартап создан.",
+                "creatives": "Не удалось сохранить один из креативов, но стартап создан.",
+                "proofs": "Не удалось сохранить один из документов, но стартап создан.",
+                "video": "Не удалось сохранить одно из видео, но стартап создан.",
+            }
+            for error in file_save_errors:
+                messages.warning(request, file_warnings[error["field"]])
             logger.info(
                 f"Стартап создан: ID={startup.startup_id}, Planet={startup.planet_image}"
             )
@@ -3461,6 +3081,8 @@ def create_startup(request):
                     "success": True,
                     "redirect_url": reverse("startup_creation_success"),
                     "file_save_errors": file_save_errors,
+                    "entity_type": "startup",
+                    "entity_id": startup.startup_id,
                 })
             messages.success(
                 request,
@@ -3506,112 +3128,30 @@ def create_franchise(request):
             franchise.planet_image = form.cleaned_data.get("planet_image")
             franchise.save()
 
-            logo_ids, creatives_ids, proofs_ids, video_ids = [], [], [], []
             logo = form.cleaned_data.get("logo")
-            if logo:
-                logo_id = str(uuid.uuid4())
-                base_name = os.path.splitext(logo.name)[0]
-                ext = os.path.splitext(logo.name)[1]
-                safe_base_name = "".join(c for c in base_name if c.isalnum() or c in ("-", "_"))
-                safe_name = slugify(safe_base_name) + ext
-                file_path = f"franchises/{franchise.franchise_id}/logos/{logo_id}_{safe_name}"
-                logo_type, _ = FileTypes.objects.get_or_create(type_name="logo")
-                entity_type, _ = EntityTypes.objects.get_or_create(type_name="franchise")
-                try:
-                    default_storage.save(file_path, logo)
-                    logo_ids.append(logo_id)
-                    safe_create_file_storage(
-                        entity_type=entity_type,
-                        entity_id=franchise.franchise_id,
-                        file_type=logo_type,
-                        file_url=logo_id,
-                        uploaded_at=timezone.now(),
-                        startup=None,
-                        original_file_name=os.path.basename(file_path),
-                    )
-                except Exception:
-                    messages.warning(request, "Не удалось сохранить логотип, но франшиза создана.")
-
-            creatives = form.cleaned_data.get("creatives", [])
-            if creatives:
-                creative_type, _ = FileTypes.objects.get_or_create(type_name="creative")
-                entity_type, _ = EntityTypes.objects.get_or_create(type_name="franchise")
-                for creative_file in creatives:
-                    if not hasattr(creative_file, "name"):
-                        continue
-                    creative_id = str(uuid.uuid4())
-                    base_name = os.path.splitext(creative_file.name)[0]
-                    ext = os.path.splitext(creative_file.name)[1]
-                    safe_base_name = "".join(c for c in base_name if c.isalnum() or c in ("-", "_"))
-                    safe_name = slugify(safe_base_name) + ext
-                    file_path = f"franchises/{franchise.franchise_id}/creatives/{creative_id}_{safe_name}"
-                    try:
-                        default_storage.save(file_path, creative_file)
-                        creatives_ids.append(creative_id)
-                        safe_create_file_storage(
-                            entity_type=entity_type,
-                            entity_id=franchise.franchise_id,
-                            file_type=creative_type,
-                            file_url=creative_id,
-                            uploaded_at=timezone.now(),
-                            startup=None,
-                            original_file_name=os.path.basename(file_path),
-                        )
-                    except Exception:
-                        messages.warning(request, "Не удалось сохранить один из креативов, но франшиза создана.")
-
-            proofs = form.cleaned_data.get("proofs", [])
-            if proofs:
-                proof_type, _ = FileTypes.objects.get_or_create(type_name="proof")
-                entity_type, _ = EntityTypes.objects.get_or_create(type_name="franchise")
-                for proof_file in proofs:
-                    if not hasattr(proof_file, "name"):
-                        continue
-                    proof_id = str(uuid.uuid4())
-                    base_name = os.path.splitext(proof_file.name)[0]
-                    ext = os.path.splitext(proof_file.name)[1]
-                    safe_base_name = "".join(c for c in base_name if c.isalnum() or c in ("-", "_"))
-                    safe_name = slugify(safe_base_name) + ext
-                    file_path = f"franchises/{franchise.franchise_id}/proofs/{proof_id}_{safe_name}"
-                    try:
-                        default_storage.save(file_path, proof_file)
-                        proofs_ids.append(proof_id)
-                        safe_create_file_storage(
-                            entity_type=entity_type,
-                            entity_id=franchise.franchise_id,
-                            file_type=proof_type,
-                            file_url=proof_id,
-                            uploaded_at=timezone.now(),
-                            startup=None,
-                            original_file_name=os.path.basename(file_path),
-                        )
-                    except Exception:
-                        messages.warning(request, "Не удалось сохранить один из документов, но франшиза создана.")
-
             video = form.cleaned_data.get("video")
-            if video:
-                video_type, _ = FileTypes.objects.get_or_create(type_name="video")
-                entity_type, _ = EntityTypes.objects.get_or_create(type_name="franchise")
-                video_id = str(uuid.uuid4())
-                base_name = os.path.splitext(video.name)[0]
-                ext = os.path.splitext(video.name)[1]
-                safe_base_name = "".join(c for c in base_name if c.isalnum() or c in ("-", "_"))
-                safe_name = slugify(safe_base_name) + ext
-                file_path = f"franchises/{franchise.franchise_id}/videos/{video_id}_{safe_name}"
-                try:
-                    default_storage.save(file_path, video)
-                    video_ids.append(video_id)
-                    safe_create_file_storage(
-                        entity_type=entity_type,
-                        entity_id=franchise.franchise_id,
-                        file_type=video_type,
-                        file_url=video_id,
-                        uploaded_at=timezone.now(),
-                        startup=None,
-                        original_file_name=os.path.basename(file_path),
-                    )
-                except Exception:
-                    messages.warning(request, "Не удалось сохранить видео, но франшиза создана.")
+            ids_by_field, file_save_errors = save_entity_files(
+                "franchise",
+                franchise.franchise_id,
+                [
+                    ("logo", "logo", [logo] if logo else []),
+                    ("creatives", "creative", form.cleaned_data.get("creatives", [])),
+                    ("proofs", "proof", form.cleaned_data.get("proofs", [])),
+                    ("video", "video", [video] if video else []),
+                ],
+            )
+            file_warnings = {
+                "logo": "Не удалось сохранить логотип, но франшиза создана.",
+                "creatives": "Не удалось сохранить один из креативов, но франшиза создана.",
+                "proofs": "Не удалось сохранить один из документов, но франшиза создана.",
+                "video": "Не удалось сохранить видео, но франшиза создана.",
+            }
+            for error in file_save_errors:
+                messages.warning(request, file_warnings[error["field"]])
+            logo_ids = ids_by_field["logo"]
+            creatives_ids = ids_by_field["creatives"]
+            proofs_ids = ids_by_field["proofs"]
+            video_ids = ids_by_field["video"]
 
             franchise.logo_urls = logo_ids
             franchise.creatives_urls = creatives_ids
@@ -3619,8 +3159,22 @@ def create_franchise(request):
             franchise.video_urls = video_ids
             franchise.save()
             messages.success(request, f'Франшиза "{franchise.title}" успешно создана и отправлена на модерацию!')
+            if request.headers.get("x-requested-with") == "XMLHttpRequest":
+                return JsonResponse({
+                    "success": True,
+                    "redirect_url": reverse("franchises_list"),
+                    "file_save_errors": file_save_errors,
+                    "entity_type": "franchise",
+                    "entity_id": franchise.franchise_id,
+                })
             return redirect("franchises_list")
         else:
+            if request.headers.get("x-requested-with") == "XMLHttpRequest":
+                return JsonResponse({
+                    "success": False,
+                    "errors": form.errors,
+                    "non_field_errors": form.non_field_errors(),
+                }, status=400)
             messages.error(request, "Форма содержит ошибки.")
             return render(request, "accounts/create_franchise.html", {"form": form})
     else:
@@ -3650,43 +3204,24 @@ def create_agency(request):
                 agency.customization_data = data
                 agency.save(update_fields=["customization_data"])
 
-            logo_ids, creatives_ids, proofs_ids, video_ids = [], [], [], []
-
-            def save_file_set(files, type_name, subdir, ids_collector):
-                file_type, _ = FileTypes.objects.get_or_create(type_name=type_name)
-                entity_type, _ = EntityTypes.objects.get_or_create(type_name="agency")
-                for f in files:
-                    if not hasattr(f, "name"):
-                        continue
-                    file_id = str(uuid.uuid4())
-                    base_name = os.path.splitext(f.name)[0]
-                    ext = os.path.splitext(f.name)[1]
-                    safe_base = "".join(c for c in base_name if c.isalnum() or c in ("-", "_"))
-                    safe_name = slugify(safe_base) + ext
-                    file_path = f"agencies/{agency.agency_id}/{subdir}/{file_id}_{safe_name}"
-                    try:
-                        default_storage.save(file_path, f)
-                        ids_collector.append(file_id)
-                        safe_create_file_storage(
-                            entity_type=entity_type,
-                            entity_id=agency.agency_id,
-                            file_type=file_type,
-                            file_url=file_id,
-                            uploaded_at=timezone.now(),
-                            startup=None,
-                            original_file_name=os.path.basename(file_path),
-                        )
-                    except Exception:
-                        pass
-
             logo = form.cleaned_data.get("logo")
-            if logo:
-                save_file_set([logo], "logo", "logos", logo_ids)
-            save_file_set(form.cleaned_data.get("creatives", []), "creative", "creatives", creatives_ids)
-            save_file_set(form.cleaned_data.get("proofs", []), "proof", "proofs", proofs_ids)
             video = form.cleaned_data.get("video")
-            if video:
-                save_file_set([video], "video", "videos", video_ids)
+            ids_by_field, file_save_errors = save_entity_files(
+                "agency",
+                agency.agency_id,
+                [
+                    ("logo", "logo", [logo] if logo else []),
+                    ("creatives", "creative", form.cleaned_data.get("creatives", [])),
+                    ("proofs", "proof", form.cleaned_data.get("proofs", [])),
+                    ("video", "video", [video] if video else []),
+                ],
+            )
+            for error in file_save_errors:
+                messages.warning(request, f"Не удалось сохранить файл {error['file']}, но агентство создано.")
+            logo_ids = ids_by_field["logo"]
+            creatives_ids = ids_by_field["creatives"]
+            proofs_ids = ids_by_field["proofs"]
+            video_ids = ids_by_field["video"]
 
             agency.logo_urls = logo_ids
             agency.creatives_urls = creatives_ids
@@ -3694,8 +3229,22 @@ def create_agency(request):
             agency.video_urls = video_ids
             agency.save()
             messages.success(request, f'Агентство "{agency.title}" успешно создано и отправлено на модерацию!')
+            if request.headers.get("x-requested-with") == "XMLHttpRequest":
+                return JsonResponse({
+                    "success": True,
+                    "redirect_url": reverse("agencies_list"),
+                    "file_save_errors": file_save_errors,
+                    "entity_type": "agency",
+                    "entity_id": agency.agency_id,
+                })
             return redirect("agencies_list")
         else:
+            if request.headers.get("x-requested-with") == "XMLHttpRequest":
+                return JsonResponse({
+                    "success": False,
+                    "errors": form.errors,
+                    "non_field_errors": form.non_field_errors(),
+                }, status=400)
             messages.error(request, "Форма содержит ошибки.")
             return render(request, "accounts/create_agency.html", {"form": form})
     else:
@@ -3725,41 +3274,24 @@ def create_specialist(request):
                 spec.customization_data = data
                 spec.save(update_fields=["customization_data"])
 
-            logo_ids, creatives_ids, proofs_ids, video_ids = [], [], [], []
-            def save_file_set(files, type_name, subdir, ids_collector):
-                file_type, _ = FileTypes.objects.get_or_create(type_name=type_name)
-                entity_type, _ = EntityTypes.objects.get_or_create(type_name="specialist")
-                for f in files:
-                    if not hasattr(f, "name"):
-                        continue
-                    file_id = str(uuid.uuid4())
-                    base_name = os.path.splitext(f.name)[0]
-                    ext = os.path.splitext(f.name)[1]
-                    safe_base = "".join(c for c in base_name if c.isalnum() or c in ("-", "_"))
-                    safe_name = slugify(safe_base) + ext
-                    file_path = f"specialists/{spec.specialist_id}/{subdir}/{file_id}_{safe_name}"
-                    try:
-                        default_storage.save(file_path, f)
-                        ids_collector.append(file_id)
-                        safe_create_file_storage(
-                            entity_type=entity_type,
-                            entity_id=spec.specialist_id,
-                            file_type=file_type,
-                            file_url=file_id,
-                            uploaded_at=timezone.now(),
-                            startup=None,
-                            original_file_name=os.path.basename(file_path),
-                        )
-                    except Exception:
-                        pass
             logo = form.cleaned_data.get("logo")
-            if logo:
-                save_file_set([logo], "logo", "logos", logo_ids)
-            save_file_set(form.cleaned_data.get("creatives", []), "creative", "creatives", creatives_ids)
-            save_file_set(form.cleaned_data.get("proofs", []), "proof", "proofs", proofs_ids)
             video = form.cleaned_data.get("video")
-            if video:
-                save_file_set([video], "video", "videos", video_ids)
+            ids_by_field, file_save_errors = save_entity_files(
+                "specialist",
+                spec.specialist_id,
+                [
+                    ("logo", "logo", [logo] if logo else []),
+                    ("creatives", "creative", form.cleaned_data.get("creatives", [])),
+                    ("proofs", "proof", form.cleaned_data.get("proofs", [])),
+                    ("video", "video", [video] if video else []),
+                ],
+            )
+            for error in file_save_errors:
+                messages.warning(request, f"Не удалось сохранить файл {error['file']}, но профиль специалиста создан.")
+            logo_ids = ids_by_field["logo"]
+            creatives_ids = ids_by_field["creatives"]
+            proofs_ids = ids_by_field["proofs"]
+            video_ids = ids_by_field["video"]
 
             spec.logo_urls = logo_ids
             spec.creatives_urls = creatives_ids
@@ -3767,13 +3299,178 @@ def create_specialist(request):
             spec.video_urls = video_ids
             spec.save()
             messages.success(request, f'Профиль специалиста "{spec.title}" успешно создан и отправлен на модерацию!')
+            if request.headers.get("x-requested-with") == "XMLHttpRequest":
+                return JsonResponse({
+                    "success": True,
+                    "redirect_url": reverse("specialists_list"),
+                    "file_save_errors": file_save_errors,
+                    "entity_type": "specialist",
+                    "entity_id": spec.specialist_id,
+                })
             return redirect("specialists_list")
         else:
+            if request.headers.get("x-requested-with") == "XMLHttpRequest":
+                return JsonResponse({
+                    "success": False,
+                    "errors": form.errors,
+                    "non_field_errors": form.non_field_errors(),
+                }, status=400)
             messages.error(request, "Форма содержит ошибки.")
             return render(request, "accounts/create_specialist.html", {"form": form})
     else:
         form = SpecialistForm()
     return render(request, "accounts/create_specialist.html", {"form": form})
+DIRECT_UPLOAD_ENTITIES = {
+    "startup": (Startups, "startup_id"),
+    "franchise": (Franchises, "franchise_id"),
+    "agency": (Agencies, "agency_id"),
+    "specialist": (Specialists, "specialist_id"),
+}
+DIRECT_UPLOAD_FIELDS = {
+    "logo": "logo_urls",
+    "creative": "creatives_urls",
+    "proof": "proofs_urls",
+    "video": "video_urls",
+}
+def _get_direct_upload_entity(request, data):
+    """
+    Возвращает (entity_type, entity) для загрузки файлов, если пользователь
+    владелец сущности или модератор, иначе (entity_type, None).
+    """
+    entity_type = data.get("entity_type")
+    if entity_type not in DIRECT_UPLOAD_ENTITIES:
+        return entity_type, None
+    model, pk_name = DIRECT_UPLOAD_ENTITIES[entity_type]
+    entity = model.objects.filter(**{pk_name: data.get("entity_id")}).first()
+    if entity is None:
+        return entity_type, None
+    is_moderator = hasattr(request.user, "role") and request.user.role and request.user.role.role_name == "moderator"
+    if entity.owner_id != request.user.user_id and not is_moderator:
+        return entity_type, None
+    return entity_type, entity
+@login_required
+@require_POST
+def presign_upload(request):
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({"success": False, "error": "Некорректный JSON"}, status=400)
+    entity_type, entity = _get_direct_upload_entity(request, data)
+    if entity is None:
+        return JsonResponse({"success": False, "error": "Объект не найден или нет доступа"}, status=403)
+    uploads = []
+    errors = []
+    for item in data.get("files", []):
+        try:
+            uploads.append(
+                create_presigned_upload(
+                    entity_type,
+                    entity.pk,
+                    item.get("file_type"),
+                    item.get("name", ""),
+                    item.get("content_type", ""),
+                    item.get("size"),
+                )
+            )
+        except ValueError as e:
+            errors.append({"field": item.get("file_type"), "file": item.get("name", ""), "error": str(e)})
+        except Exception as e:
+            logger.error(f"Ошибка выдачи presigned POST для {item.get('name')}: {e}", exc_info=True)
+            errors.append({"field": item.get("file_type"), "file": item.get("name", ""), "error": "Не удалось подготовить загрузку"})
+    return JsonResponse({"success": True, "uploads": uploads, "errors": errors})
+@login_required
+@require_POST
+def confirm_upload(request):
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({"success": False, "error": "Некорректный JSON"}, status=400)
+    entity_type, entity = _get_direct_upload_entity(request, data)
+    if entity is None:
+        return JsonResponse({"success": False, "error": "Объект не найден или нет доступа"}, status=403)
+    pending = collections.defaultdict(list)
+    errors = []
+    seen_file_ids = set()
+    for item in data.get("files", []):
+        file_id = str(item.get("file_id", ""))
+        file_type = item.get("file_type")
+        key = item.get("key", "")
+        prefix = _prefix_for(entity_type, entity.pk, file_type)
+        if file_type not in DIRECT_UPLOAD_FIELDS or not is_uuid(file_id) or not key.startswith(f"{prefix}{file_id}_"):
+            errors.append({"field": file_type, "file": item.get("name", ""), "error": "Некорректные данные файла"})
+            continue
+        if file_id in seen_file_ids:
+            continue
+        seen_file_ids.add(file_id)
+        name = os.path.basename(item.get("name") or "") or original_name_from_key(key)
+        pending[prefix].append((file_id, file_type, key, name[:255]))
+    confirmed = []
+    for prefix, items in pending.items():
+        try:
+            stored_keys = set(_list_prefix_keys(prefix).values())
+        except ClientError as e:
+            logger.error(f"Ошибка листинга {prefix} при подтверждении загрузки: {e}")
+            stored_keys = set()
+        for file_id, file_type, key, name in items:
+            if key in stored_keys:
+                confirmed.append((file_id, file_type, key, name))
+            else:
+                errors.append({"field": file_type, "file": name, "error": "Файл не найден в хранилище"})
+    if confirmed:
+        entity_type_obj, _ = EntityTypes.objects.get_or_create(type_name=entity_type)
+        file_types = {
+            type_name: FileTypes.objects.get_or_create(type_name=type_name)[0]
+            for type_name in {file_type for _, file_type, _, _ in confirmed}
+        }
+        uploaded_at = timezone.now()
+        with transaction.atomic():
+            # Блокировка строки сущности сериализует параллельные подтверждения
+            # (повторы запроса клиентом): проверка уже записанных файлов и
+            # дописывание id в *_urls идут без гонки чтение-изменение-запись
+            entity = type(entity).objects.select_for_update().get(pk=entity.pk)
+            recorded = set(
+                FileStorage.objects.filter(entity_type=entity_type_obj, entity_id=entity.pk)
+                .filter(
+                    Q(file_url__in=[file_id for file_id, _, _, _ in confirmed])
+                    | Q(object_key__in=[key for _, _, key, _ in confirmed])
+                )
+                .values_list("file_url", flat=True)
+            )
+            created = [item for item in confirmed if item[0] not in recorded]
+            FileStorage.objects.bulk_create([
+                FileStorage(
+                    entity_type=entity_type_obj,
+                    entity_id=entity.pk,
+                    file_type=file_types[file_type],
+                    file_url=file_id,
+                    uploaded_at=uploaded_at,
+                    startup=entity if entity_type == "startup" else None,
+                    original_file_name=name,
+                    object_key=key,
+                )
+                for file_id, file_type, key, name in created
+            ])
+            updated_fields = set()
+            for file_id, file_type, key, name in confirmed:
+                field_name = DIRECT_UPLOAD_FIELDS[file_type]
+                current = list(getattr(entity, field_name) or [])
+                if file_type == "logo":
+                    if current != [file_id]:
+                        setattr(entity, field_name, [file_id])
+                        updated_fields.add(field_name)
+                elif file_id not in current:
+                    setattr(entity, field_name, current + [file_id])
+                    updated_fields.add(field_name)
+            if updated_fields:
+                entity.save(update_fields=sorted(updated_fields))
+        for file_id, file_type, key, name in created:
+            invalidate_file_cache(file_id, entity.pk, file_type, entity_type)
+        logger.info(f"Подтверждено {len(confirmed)} прямых загрузок для {entity_type} {entity.pk}, новых {len(created)}")
+    return JsonResponse({
+        "success": True,
+        "confirmed": [file_id for file_id, _, _, _ in confirmed],
+        "file_save_errors": errors,
+    })
 @login_required
 def startup_creation_success(request):
     return render(request, "accounts/startup_creation_success.html")
@@ -3886,6 +3583,7 @@ def edit_startup(request, startup_id):
                             startup=startup,
                             file_url=file_id
                         ).delete()
+                        invalidate_file_cache(file_id, startup.startup_id, file_type, "startup")
                         if file_type == 'creative' and startup.creatives_urls:
                             startup.creatives_urls = [url for url in startup.creatives_urls if url != file_id]
                         elif file_type == 'proof' and startup.proofs_urls:
@@ -3895,191 +3593,44 @@ def edit_startup(request, startup_id):
                         logger.info(f"Удален файл {file_type}: {file_id}")
             except json.JSONDecodeError:
                 logger.warning("Ошибка при разборе deleted_files JSON")
-            for i in range(1, 6):
-                description = request.POST.get(f"step_description_{i}", "").strip()
-                if description:
-                    timeline_entry, created = StartupTimeline.objects.get_or_create(
-                        startup=startup,
-                        step_number=i,
-                        defaults={"title": f"Этап {i}", "description": description},
-                    )
-                    if not created and timeline_entry.description != description:
-                        timeline_entry.description = description
-                        timeline_entry.save()
+            save_timeline_steps(startup, request.POST)
             logo_ids = startup.logo_urls or []
             creatives_ids = startup.creatives_urls or []
             proofs_ids = startup.proofs_urls or []
             video_ids = startup.video_urls or []
+            reserved_names = {}
             logo = form.cleaned_data.get("logo")
-            if logo:
-                logo_id = str(uuid.uuid4())
-                file_path = f"startups/{startup.startup_id}/logos/{logo_id}_{logo.name}"
-                default_storage.save(file_path, logo)
-                logo_ids = [logo_id]
-                logger.info(f"Логотип сохранён с ID: {logo_id}")
-            creatives = form.cleaned_data.get("creatives", [])
-            if creatives:
-                creative_type = FileTypes.objects.get(type_name="creative")
-                entity_type = EntityTypes.objects.get(type_name="startup")
-                creatives_ids = []
-                for creative_file in creatives:
-                    if not hasattr(creative_file, "name"):
-                        logger.warning(
-                            f"Пропущен креатив, так как это не файл: {creative_file}"
-                        )
-                        continue
-                    unique_filename = get_unique_filename(creative_file.name, startup.startup_id, "creative")
-                    creative_id = str(uuid.uuid4())
-                    file_path = f"startups/{startup.startup_id}/creatives/{creative_id}_{creative_file.name}"
-                    default_storage.save(file_path, creative_file)
-                    creatives_ids.append(creative_id)
-                    safe_create_file_storage_instance(
-                        entity_type=entity_type,
-                        entity_id=startup.startup_id,
-                        file_type=creative_type,
-                        file_url=creative_id,
-                        uploaded_at=timezone.now(),
-                        startup=startup,
-                        original_file_name=unique_filename,
-                    )
-                    logger.info(f"Креатив сохранён с ID: {creative_id}")
-            proofs = form.cleaned_data.get("proofs", [])
-            if proofs:
-                proof_type = FileTypes.objects.get(type_name="proof")
-                entity_type = EntityTypes.objects.get(type_name="startup")
-                proofs_ids = []
-                for proof_file in proofs:
-                    if not hasattr(proof_file, "name"):
-                        logger.warning(
-                            f"Пропущен пруф, так как это не файл: {proof_file}"
-                        )
-                        continue
-                    unique_filename = get_unique_filename(proof_file.name, startup.startup_id, "proof")
-                    proof_id = str(uuid.uuid4())
-                    file_path = f"startups/{startup.startup_id}/proofs/{proof_id}_{proof_file.name}"
-                    default_storage.save(file_path, proof_file)
-                    proofs_ids.append(proof_id)
-                    safe_create_file_storage_instance(
-                        entity_type=entity_type,
-                        entity_id=startup.startup_id,
-                        file_type=proof_type,
-                        file_url=proof_id,
-                        uploaded_at=timezone.now(),
-                        startup=startup,
-                        original_file_name=unique_filename,
+            video = form.cleaned_data.get("video") or []
+            ids_by_field, file_save_errors = save_entity_files(
+                "startup",
+                startup.startup_id,
+                [
+                    ("logo", "logo", [logo] if logo else []),
+                    ("creatives", "creative", form.cleaned_data.get("creatives", [])),
+                    ("proofs", "proof", form.cleaned_data.get("proofs", [])),
+                    ("video", "video", video if isinstance(video, list) else [video]),
+                ],
+                startup=startup,
+                original_name=lambda file_obj, file_type_name, file_path: (
+                    file_obj.name if file_type_name == "logo"
+                    else get_unique_filename(
+                        file_obj.name, startup.startup_id, file_type_name,
+                        reserved=reserved_names.setdefault(file_type_name, set()),
                     )
-                    logger.info(f"Пруф сохранён с ID: {proof_id}")
-            video = form.cleaned_data.get("video")
-            if video:
-                unique_filename = get_unique_filename(video.name, startup.startup_id, "video")
-                video_id = str(uuid.uuid4())
-                file_path = (
-                    f"startups/{startup.startup_id}/videos/{video_id}_{video.name}"
-                )
-                default_storage.save(file_path, video)
-                video_ids = [video_id]
-                video_type, _ = FileTypes.objects.get_or_create(type_name="video")
-                entity_type = EntityTypes.objects.get(type_name="startup")
-                safe_create_file_storage_instance(
-                    entity_type=entity_type,
-                    entity_id=startup.startup_id,
-                    file_type=video_type,
-                    file_url=video_id,
-                    uploaded_at=timezone.now(),
-                    startup=startup,
-                    original_file_name=unique_filename,
-                )
-                logger.info(f"Видео сохранено с ID: {video_id}")
+                ),
+            )
+            for error in file_save_errors:
+                messages.warning(request, f"Не удалось сохранить файл {error['file']}.")
+            logo_ids = ids_by_field["logo"] or logo_ids
+            creatives_ids = ids_by_field["creatives"] or creatives_ids
+            proofs_ids = ids_by_field["proofs"] or proofs_ids
+            video_ids = ids_by_field["video"] or video_ids
             startup.logo_urls = logo_ids
             startup.creatives_urls = creatives_ids
             startup.proofs_urls = proofs_ids
             startup.video_urls = video_ids
             startup.save()
-            logger.info("=== Обновление стартапа ===")
-            logger.info(f"Стартап ID: {startup.startup_id}")
-            if logo:
-                logger.info(f"Логотип: {logo.name}, размер: {logo.size} байт")
-                logger.info(
-                    f"ID логотипа: {logo_ids[0] if logo_ids else 'Не сохранён'}"
-                )
-            else:
-                logger.info("Логотип не загружен")
-            if creatives:
-                logger.info(f"Креативы: {len(creatives)} файлов")
-                for i, creative_file in enumerate(creatives, 1):
-                    if hasattr(creative_file, "name"):
-                        logger.info(
-                            f"Креатив {i}: {creative_file.name}, размер: {creative_file.size} байт"
-                        )
-                    else:
-                        logger.info(
-                            f"Креатив {i}: Неверный формат (не файл): {creative_file}"
-                        )
-            else:
-                logger.info("Креативы не загружены")
-            if proofs:
-                logger.info(f"Пруфы: {len(proofs)} файлов")
-                for i, proof_file in enumerate(proofs, 1):
-                    if hasattr(proof_file, "name"):
-                        logger.info(
-                            f"Пруф {i}: {proof_file.name}, размер: {proof_file.size} байт"
-                        )
-                    else:
-                        logger.info(
-                            f"Пруф {i}: Неверный формат (не файл): {proof_file}"
-                        )
-            else:
-                logger.info("Пруфы не загружены")
-            if video:
-                logger.info(f"Видео: {video.name}, размер: {video.size} байт")
-                logger.info(f"ID видео: {video_ids[0] if video_ids else 'Не сохранён'}")
-            else:
-                logger.info("Видео не загружено")
-            logger.info("=== Переменные окружения ===")
-            for key, value in os.environ.items():
-                logger.info(f"{key}: {value}")
-            logger.info("=== Настройки Yandex Object Storage ===")
-            logger.info(
-                f"AWS_ACCESS_KEY_ID: {getattr(settings, 'AWS_ACCESS_KEY_ID', 'Не задано')}"
-            )
-            logger.info(
-                f"AWS_SECRET_ACCESS_KEY: {getattr(settings, 'AWS_SECRET_ACCESS_KEY', 'Не задано')}"
-            )
-            logger.info(
-                f"AWS_STORAGE_BUCKET_NAME: {getattr(settings, 'AWS_STORAGE_BUCKET_NAME', 'Не задано')}"
-            )
-            logger.info(
-                f"AWS_S3_ENDPOINT_URL: {getattr(settings, 'AWS_S3_ENDPOINT_URL', 'Не задано')}"
-            )
-            logger.info(
-                f"AWS_DEFAULT_ACL: {getattr(settings, 'AWS_DEFAULT_ACL', 'Не задано')}"
-            )
-            logger.info("=== Проверка STORAGES ===")
-            logger.info(
-                f"STORAGES['default']['BACKEND']: {settings.STORAGES['default']['BACKEND']}"
-            )
-            logger.info(f"default_storage: {default_storage.__class__.__name__}")
-            logger.info("=== Проверка подключения к Yandex Object Storage ===")
-            try:
-                from django.core.files.base import ContentFile
-                from storages.backends.s3boto3 import S3Boto3Storage
-                storage = S3Boto3Storage()
-                test_file_name = f"test/test_file_{startup.startup_id}.txt"
-                test_content = (
-                    "This is a test file to check Yandex Object Storage connection."
-                )
-                test_file = ContentFile(test_content.encode("utf-8"))
-                storage.save(test_file_name, test_file)
-                logger.info(f"Тестовый файл успешно сохранён: {test_file_name}")
-                test_file_url = storage.url(test_file_name)
-                logger.info(f"URL тестового файла: {test_file_url}")
-                storage.delete(test_file_name)
-                logger.info(f"Тестовый файл удалён: {test_file_name}")
-            except Exception as e:
-                logger.error(
-                    f"Ошибка подключения к Yandex Object Storage: {str(e)}",
-                    exc_info=True,
-                )
+            logger.info(f"Стартап {startup.startup_id} обновлён, файлов загружено: {sum(len(ids) for ids in ids_by_field.values())}")
             messages.success(
                 request,
                 f'Стартап "{startup.title}" успешно отредактирован и отправлен на модерацию!',
@@ -4123,13 +3674,9 @@ def investor_main(request):
     directions_data_json = FIXED_CATEGORIES.copy()
     selected_direction_name = request.GET.get("direction", "All")
     startups_query = Startups.objects.filter(status="approved").annotate(
-        rating_avg=Coalesce(Avg("uservotes__rating"), 0.0, output_field=FloatField()),
-        voters_count=Count("uservotes", distinct=True),
-        total_investors=Count("investmenttransactions", distinct=True),
-        current_funding=Coalesce(
-            Sum("investmenttransactions__amount"), 0, output_field=DecimalField()
-        ),
-        comment_count=Count("comments", distinct=True),
+        voters_count=F("total_voters"),
+        total_investors=F("investors_count"),
+        comment_count=F("comments_count"),
     )
     if selected_direction_name != "All" and selected_direction_name != "Все":
         from django.db.models import Q
@@ -4199,13 +3746,9 @@ def investor_main(request):
     is_startuper = is_authenticated and hasattr(request.user, 'role') and request.user.role and request.user.role.role_name == 'startuper'
     logo_data = {"image": static("accounts/images/planetary_system/gi.svg")}
     all_startups_query = Startups.objects.filter(status="approved").annotate(
-        rating_avg=Coalesce(Avg("uservotes__rating"), 0.0, output_field=FloatField()),
-        voters_count=Count("uservotes", distinct=True),
-        total_investors=Count("investmenttransactions", distinct=True),
-        current_funding=Coalesce(
-            Sum("investmenttransactions__amount"), 0, output_field=DecimalField()
-        ),
-        comment_count=Count("comments", distinct=True),
+        voters_count=F("total_voters"),
+        total_investors=F("investors_count"),
+        comment_count=F("comments_count"),
         progress=Case(
             When(funding_goal__gt=0, then=(F("amount_raised") * 100.0 / F("funding_goal"))),
             default=Value(0),
@@ -4274,13 +3817,9 @@ def startuper_main(request):
     selected_direction_name = request.GET.get("direction", "All")
     print(f"🔍 STARTUPPER_MAIN: Запрошено направление: '{selected_direction_name}'")
     startups_query = Startups.objects.filter(status="approved").annotate(
-        rating_avg=Coalesce(Avg("uservotes__rating"), 0.0, output_field=FloatField()),
-        voters_count=Count("uservotes", distinct=True),
-        total_investors=Count("investmenttransactions", distinct=True),
-        current_funding=Coalesce(
-            Sum("investmenttransactions__amount"), 0, output_field=DecimalField()
-        ),
-        comment_count=Count("comments", distinct=True),
+        voters_count=F("total_voters"),
+        total_investors=F("investors_count"),
+        comment_count=F("comments_count"),
     )
     print(f"🔍 STARTUPPER_MAIN: Всего одобренных стартапов: {startups_query.count()}")
 
@@ -4375,13 +3914,9 @@ def startuper_main(request):
     is_startuper = is_authenticated and hasattr(request.user, 'role') and request.user.role and request.user.role.role_name == 'startuper'
     logo_data = {"image": static("accounts/images/planetary_system/gi.svg")}
     all_startups_query = Startups.objects.filter(status="approved").annotate(
-        rating_avg=Coalesce(Avg("uservotes__rating"), 0.0, output_field=FloatField()),
-        voters_count=Count("uservotes", distinct=True),
-        total_investors=Count("investmenttransactions", distinct=True),
-        current_funding=Coalesce(
-            Sum("investmenttransactions__amount"), 0, output_field=DecimalField()
-        ),
-        comment_count=Count("comments", distinct=True),
+        voters_count=F("total_voters"),
+        total_investors=F("investors_count"),
+        comment_count=F("comments_count"),
         progress=Case(
             When(funding_goal__gt=0, then=(F("amount_raised") * 100.0 / F("funding_goal"))),
             default=Value(0),
@@ -4433,7 +3968,7 @@ def startuper_main(request):
         })
 
     try:
-        random_startups = Startups.objects.filter(status="approved").order_by('?')[:3]
+        random_startups = random_sample(Startups.objects.filter(status="approved"), 3, "approved_startups")
         random_startups_data = []
 
         for startup in random_startups:
@@ -4517,7 +4052,7 @@ def startuper_main(request):
 
 
     try:
-        random_startupers = Users.objects.filter(role__role_name='startuper').order_by('?')[:3]
+        random_startupers = random_sample(Users.objects.filter(role__role_name='startuper'), 3, "startupers")
         random_startupers_data = []
 
         for startuper in random_startupers:
@@ -4652,6 +4187,7 @@ def approve_startup(request, startup_id):
         moderator_comment = request.POST.get("moderator_comment", "")
         startup.moderator_comment = moderator_comment
         startup.status = "approved"
+        startup.updated_at = timezone.now()
         try:
             startup.status_id = ReviewStatuses.objects.get(status_name="Approved")
         except ReviewStatuses.DoesNotExist:
@@ -4668,6 +4204,7 @@ def reject_startup(request, startup_id):
         moderator_comment = request.POST.get("moderator_comment", "")
         startup.moderator_comment = moderator_comment
         startup.status = "rejected"
+        startup.updated_at = timezone.now()
         try:
             startup.status_id = ReviewStatuses.objects.get(status_name="Rejected")
         except ReviewStatuses.DoesNotExist:
@@ -4692,13 +4229,8 @@ def vote_startup(request, startup_id):
     UserVotes.objects.create(
         user=request.user, startup=startup, rating=rating, created_at=timezone.now()
     )
-    startup.total_voters += 1
-    startup.sum_votes += rating
-    startup.save()
-    average_rating = (
-        startup.sum_votes / startup.total_voters if startup.total_voters > 0 else 0
-    )
-    return JsonResponse({"success": True, "average_rating": average_rating})
+    startup.add_vote(rating)
+    return JsonResponse({"success": True, "average_rating": startup.rating_avg})
 @login_required
 def invest(request, startup_id):
     if request.method != "POST":
@@ -4736,7 +4268,8 @@ def invest(request, startup_id):
         startup.amount_raised = (startup.amount_raised or Decimal("0")) + amount
         startup.total_invested = (startup.total_invested or Decimal("0")) + amount
         startup.save()
-        investors_count = startup.get_investors_count()
+        startup.update_counters("investors_count")
+        investors_count = startup.investors_count
         progress_percentage = startup.get_progress_percentage()
         return JsonResponse(
             {
@@ -4839,25 +4372,16 @@ def news(request):
         )
 
 
-    try:
-        page_number = int(request.GET.get("page", 1))
-        if page_number < 1:
-            page_number = 1
-    except (ValueError, TypeError):
-        page_number = 1
-
-    paginator = Paginator(articles, 12)
-
-
-    if page_number > paginator.num_pages and paginator.num_pages > 0:
-        page_number = paginator.num_pages
-
-    page_obj = paginator.get_page(page_number)
+    is_ajax = request.headers.get("x-requested-with") == "XMLHttpRequest"
+    if is_ajax and "cursor" in request.GET:
+        return cursor_page_response(
+            request, articles, "accounts/partials/_news_card_items.html", per_page=12, context_name="articles"
+        )
+    articles_page, next_cursor = paginate_by_cursor(articles, per_page=12)
 
     context = {
-        "articles": page_obj,
-        "page_obj": page_obj,
-        "paginator": paginator,
+        "articles": articles_page,
+        "next_cursor": next_cursor,
         "sort_order": sort_order,
         "selected_categories": selected_categories,
         "micro_investment": micro_investment == "1",
@@ -4866,10 +4390,9 @@ def news(request):
         "search_query": search_query,
     }
 
-    is_ajax = request.headers.get("x-requested-with") == "XMLHttpRequest"
     if is_ajax:
         html = render_to_string("accounts/partials/_news_cards.html", context, request=request)
-        return JsonResponse({"html": html})
+        return JsonResponse({"html": html, "has_next": next_cursor is not None, "next_cursor": next_cursor})
 
     return render(request, "accounts/news.html", context)
 def news_detail(request, article_id):
@@ -4986,15 +4509,10 @@ def cosmochat(request):
                 chat.display_avatar = None
     search_form = UserSearchForm(request.GET)
     users = Users.objects.all()
+    query = ""
     if search_form.is_valid():
         query = search_form.cleaned_data.get("query", "")
         roles = search_form.cleaned_data.get("roles", [])
-        if query:
-            users = users.filter(
-                Q(email__icontains=query)
-                | Q(first_name__icontains=query)
-                | Q(last_name__icontains=query)
-            )
         if roles:
             users = users.filter(role__role_name__in=roles)
     users = users.exclude(user_id=request.user.user_id)
@@ -5011,6 +4529,8 @@ def cosmochat(request):
                 return JsonResponse(
                     {"success": False, "error": "Чат не найден"}, status=404
                 )
+    if query:
+        users = typeahead_users(users.select_related("role"), query, TYPEAHEAD_MAX_LIMIT)
     for user in users[:5]:
         profile_url = (
             user.get_profile_picture_url() if user.profile_picture_url else "None"
@@ -5570,6 +5090,10 @@ def available_users_for_chat(request, chat_id):
         users = users.filter(
             role__role_name__in=["startuper", "investor", "moderator"]
         ).exclude(role__role_name__in=current_roles)
+    users = users.select_related("role")
+    query = request.GET.get("q", "").strip()
+    if query:
+        users = typeahead_users(users, query, request.GET.get("limit") or TYPEAHEAD_MAX_LIMIT)
     users_data = [
         {
             "user_id": user.user_id,
@@ -5612,135 +5136,47 @@ def leave_chat(request, chat_id):
 
 def planetary_system(request):
     """
-    Планетарная система - отображает стартапы как планеты на орбитах
+    Планетарная система - отображает стартапы как планеты на орбитах.
+    Полный список планет браузер забирает отдельным запросом из planetary_system_snapshot.
     """
     directions_data = FIXED_CATEGORIES.copy()
     selected_direction_name = request.GET.get("direction", "All")
     logger.info(f"🪐 Планетарная система: выбрано направление '{selected_direction_name}'")
-    startups_query = Startups.objects.filter(
-        status="approved"
-    ).select_related("direction", "owner").order_by("-created_at")
-    if selected_direction_name != "All" and selected_direction_name != "Все":
-        from django.db.models import Q
-        direction_filter = Q()
-        for category in FIXED_CATEGORIES:
-            if category['original_name'] == selected_direction_name or category['direction_name'] == selected_direction_name:
-                direction_filter |= Q(direction__direction_name=category['direction_name'])
-        if direction_filter:
-            startups_query = startups_query.filter(direction_filter)
-    startups_list = list(startups_query)
-    print(f"🚀 ПЛАНЕТАРНАЯ СИСТЕМА DEBUG:")
-    print(f"🚀 Выбрано направление: '{selected_direction_name}'")
-    print(f"🚀 Всего одобренных стартапов в БД: {Startups.objects.filter(status='approved').count()}")
-    print(f"🚀 Загружено стартапов после фильтрации: {len(startups_list)}")
-    if startups_list:
-        for i, startup in enumerate(startups_list[:3]):
-            print(f"🚀   {i+1}. {startup.title} - направление: {startup.direction.direction_name if startup.direction else 'Нет'}")
-    logger.info(f"🪐 Загружено стартапов: {len(startups_list)}")
-    selected_startups = []
-    if len(startups_list) > 0:
-        selected_startups = startups_list[:6]
-    else:
-        selected_startups = []
-    planets_data = []
-    for i, startup in enumerate(selected_startups):
-        planet_image_url = None
-
-        if startup.planet_image:
-            planet_image_url = f"{settings.S3_PUBLIC_BASE_URL}/choosable_planets/{startup.planet_image}"
-
-        if not planet_image_url:
-            import random
-            folder_choice = random.choice(['planets_round', 'planets_ring'])
-            if folder_choice == 'planets_round':
-                planet_image_num = (i % 15) + 1
-                planet_image_url = f"/static/accounts/images/planetary_system/planets_round/{planet_image_num}.png"
-            else:
-                planet_image_num = (i % 6) + 1
-                planet_image_url = f"/static/accounts/images/planetary_system/planets_ring/{planet_image_num}.png"
-
-        direction_original = 'Не указано'
-        if startup.direction:
-            for cat in directions_data:
-                if cat['direction_name'] == startup.direction.direction_name or cat['original_name'] == getattr(startup.direction, 'original_name', None):
-                    direction_original = cat['original_name']
-                    break
-        planets_data.append({
-            "id": startup.startup_id,
-            "startup_id": startup.startup_id,
-            "name": startup.title,
-            "description": startup.short_description or startup.description[:200] if startup.description else "",
-            "image": planet_image_url,
-            "rating": startup.get_average_rating(),
-            "voters_count": startup.total_voters,
-            "comment_count": startup.comments.count(),
-            "direction": direction_original,
-            "funding_goal": f"{startup.funding_goal:,.0f} ₽".replace(",", " ") if startup.funding_goal else "Не указано",
-            "valuation": f"{startup.valuation:,.0f} ₽".replace(",", " ") if startup.valuation else "Не указано",
-            "investors": startup.get_investors_count(),
-            "progress": startup.get_progress_percentage(),
-            "investment_type": "Выкуп+инвестирование" if startup.both_mode else ("Только выкуп" if startup.only_buy else "Только инвестирование")
-        })
-    all_approved_startups = list(Startups.objects.filter(status="approved").select_related("direction", "owner").order_by("-created_at"))
-    all_startups_data = []
-    for idx, startup in enumerate(all_approved_startups):
-        planet_image_url = None
-
-        if startup.planet_image:
-            planet_image_url = f"{settings.S3_PUBLIC_BASE_URL}/choosable_planets/{startup.planet_image}"
-
-        if not planet_image_url:
-            import random
-            folder_choice = random.choice(['planets_round', 'planets_ring'])
-            if folder_choice == 'planets_round':
-                planet_image_num = (idx % 15) + 1
-                planet_image_url = f"/static/accounts/images/planetary_system/planets_round/{planet_image_num}.png"
-            else:
-                planet_image_num = (idx % 6) + 1
-                planet_image_url = f"/static/accounts/images/planetary_system/planets_ring/{planet_image_num}.png"
-
-        direction_original = 'Не указано'
-        if startup.direction:
-            for cat in directions_data:
-                if cat['direction_name'] == startup.direction.direction_name or cat['original_name'] == getattr(startup.direction, 'original_name', None):
-                    direction_original = cat['original_name']
-                    break
-        all_startups_data.append({
-            "id": startup.startup_id,
-            "startup_id": startup.startup_id,
-            "name": startup.title,
-            "description": startup.short_description or startup.description[:200] if startup.description else "",
-            "image": planet_image_url,
-            "rating": startup.get_average_rating(),
-            "voters_count": startup.total_voters,
-            "comment_count": startup.comments.count(),
-            "direction": direction_original,
-            "funding_goal": f"{startup.funding_goal:,.0f} ₽".replace(",", " ") if startup.funding_goal else "Не указано",
-            "valuation": f"{startup.valuation:,.0f} ₽".replace(",", " ") if startup.valuation else "Не указано",
-            "investors": startup.get_investors_count(),
-            "progress": startup.get_progress_percentage(),
-            "investment_type": "Выкуп+инвестирование" if startup.both_mode else ("Только выкуп" if startup.only_buy else "Только инвестирование")
-        })
+    snapshot = get_planet_snapshot(FIXED_CATEGORIES)
+    galaxy = snapshot["galaxies"][resolve_planet_galaxy(FIXED_CATEGORIES, selected_direction_name)]
+    planets_data = with_fallback_planet_images(galaxy["planets"])
+    logger.info(f"🪐 Загружено стартапов: {galaxy['count']}")
     logo_data = {
         "image": "/static/accounts/images/logo.png"
     }
-    print(f"🚀 ПЕРЕДАЕТСЯ В ШАБЛОН:")
-    print(f"🚀 Планет для отображения: {len(planets_data)}")
-    print(f"🚀 Всех стартапов для фильтрации: {len(all_startups_data)}")
-    print(f"🚀 Направлений: {len(directions_data)}")
-    print(f"🚀 Выбранная галактика: '{selected_direction_name}'")
-    print(f"🚀 Первые 3 планеты: {[p.get('name', 'Нет названия') for p in planets_data[:3]]}")
-    print(f"🚀 Переводы направлений: {[(d.get('original_name'), d.get('direction_name')) for d in directions_data[:5]]}")
     context = {
         "planets_data_json": json.dumps(planets_data, ensure_ascii=False),
         "directions_data_json": json.dumps(directions_data, ensure_ascii=False),
-        "all_startups_data_json": json.dumps(all_startups_data, ensure_ascii=False),
         "logo_data": logo_data,
         "directions": directions_data,
         "selected_galaxy": selected_direction_name,
     }
     return render(request, "accounts/planetary_system.html", context)
 
+def planetary_system_snapshot(request):
+    """
+    Снимок планет (одобренных стартапов) галактики ?direction= в виде JSON.
+    Отдаётся заранее сжатым gzip, с ETag: при совпадении If-None-Match возвращается 304.
+    """
+    snapshot = get_planet_snapshot(FIXED_CATEGORIES)
+    galaxy = snapshot["galaxies"][resolve_planet_galaxy(FIXED_CATEGORIES, request.GET.get("direction", "All"))]
+    if galaxy["etag"] in parse_etags(request.headers.get("If-None-Match", "")):
+        response = HttpResponseNotModified()
+    elif "gzip" in request.headers.get("Accept-Encoding", ""):
+        response = HttpResponse(galaxy["body"], content_type="application/json")
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = HttpResponse(gzip.decompress(galaxy["body"]), content_type="application/json")
+    response["ETag"] = galaxy["etag"]
+    response["Cache-Control"] = "public, no-cache"
+    patch_vary_headers(response, ["Accept-Encoding"])
+    return response
+
 
 @login_required
 def my_startups(request):
@@ -5919,13 +5355,6 @@ def my_startups(request):
         except Exception as e:
             logger.error(f"Ошибка при получении одобренных стартапов: {str(e)}")
             approved_startups_annotated = []
-        s3_client = boto3.client(
-            "s3",
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            endpoint_url=settings.AWS_S3_ENDPOINT_URL,
-            region_name=settings.AWS_S3_REGION_NAME,
-        )
         planetary_startups = []
         print(f"🚀 DEBUG: approved_startups_annotated count: {len(approved_startups_annotated)}")
         for idx, startup in enumerate(approved_startups_annotated, start=1):
@@ -6225,7 +5654,8 @@ def add_investor(request, startup_id):
                 total=Sum("amount")
             )["total"] or Decimal("0")
             startup.save(update_fields=["amount_raised"])
-            new_investor_count = startup.get_investors_count()
+            startup.update_counters("investors_count")
+            new_investor_count = startup.investors_count
 
             logger.info(f"Successfully added investor to startup {startup_id}. New amount: {startup.amount_raised}, investors: {new_investor_count}")
 
@@ -6309,7 +5739,8 @@ def delete_investment(request, startup_id, user_id):
                 )["total"] or Decimal("0")
                 startup.amount_raised = new_total
                 startup.save(update_fields=["amount_raised"])
-                new_investor_count = startup.get_investors_count()
+                startup.update_counters("investors_count")
+                new_investor_count = startup.investors_count
 
                 logger.info(f"Successfully deleted investment. New total: {new_total}, investors: {new_investor_count}")
 
@@ -6515,7 +5946,10 @@ def rename_chat(request, chat_id):
 def available_users(request):
     users = Users.objects.exclude(user_id=request.user.user_id).exclude(
         role__role_name="moderator"
-    )
+    ).select_related("role")
+    query = request.GET.get("q", "").strip()
+    if query:
+        users = typeahead_users(users, query, request.GET.get("limit") or TYPEAHEAD_MAX_LIMIT)
     users_data = [
         {
             "user_id": user.user_id,
@@ -6804,6 +6238,7 @@ def approve_franchise(request, franchise_id):
         moderator_comment = request.POST.get("moderator_comment", "")
         franchise.moderator_comment = moderator_comment
         franchise.status = "approved"
+        franchise.updated_at = timezone.now()
         try:
             franchise.status_id = ReviewStatuses.objects.get(status_name="Approved")
         except ReviewStatuses.DoesNotExist:
@@ -6822,6 +6257,7 @@ def reject_franchise(request, franchise_id):
         moderator_comment = request.POST.get("moderator_comment", "")
         franchise.moderator_comment = moderator_comment
         franchise.status = "rejected"
+        franchise.updated_at = timezone.now()
         try:
             franchise.status_id = ReviewStatuses.objects.get(status_name="Rejected")
         except ReviewStatuses.DoesNotExist:
@@ -6840,6 +6276,7 @@ def approve_agency(request, franchise_id):
         moderator_comment = request.POST.get("moderator_comment", "")
         agency.moderator_comment = moderator_comment
         agency.status = "approved"
+        agency.updated_at = timezone.now()
         agency.save()
         messages.success(request, "Агентство одобрено.")
     return redirect("moderator_dashboard")
@@ -6854,6 +6291,7 @@ def reject_agency(request, franchise_id):
         moderator_comment = request.POST.get("moderator_comment", "")
         agency.moderator_comment = moderator_comment
         agency.status = "rejected"
+        agency.updated_at = timezone.now()
         agency.save()
         messages.success(request, "Агентство отклонено.")
     return redirect("moderator_dashboard")
@@ -6868,6 +6306,7 @@ def approve_specialist(request, specialist_id):
         moderator_comment = request.POST.get("moderator_comment", "")
         spec.moderator_comment = moderator_comment
         spec.status = "approved"
+        spec.updated_at = timezone.now()
         spec.save()
         messages.success(request, "Специалист одобрен.")
     return redirect("moderator_dashboard")
@@ -6882,6 +6321,7 @@ def reject_specialist(request, specialist_id):
         moderator_comment = request.POST.get("moderator_comment", "")
         spec.moderator_comment = moderator_comment
         spec.status = "rejected"
+        spec.updated_at = timezone.now()
         spec.save()
         messages.success(request, "Специалист отклонен.")
     return redirect("moderator_dashboard")
@@ -6949,20 +6389,29 @@ def vote_specialist(request, specialist_id):
 
 def load_similar_franchises(request, franchise_id: int):
     try:
-        franchise = get_object_or_404(Franchises, franchise_id=franchise_id)
-        similar_franchises = (
-            Franchises.objects.filter(
-                direction=franchise.direction,
-                status="approved",
+        def fallback():
+            franchise = get_object_or_404(Franchises, franchise_id=franchise_id)
+            return random_sample(
+                Franchises.card_queryset().filter(
+                    direction=franchise.direction,
+                    status="approved",
+                ),
+                4,
+                f"approved_franchises:direction:{franchise.direction_id}",
+                exclude=[franchise_id],
             )
-            .exclude(franchise_id=franchise_id)
-            .order_by("?")[:4]
+        similar_franchises = similar_entities(
+            "franchise",
+            franchise_id,
+            Franchises.card_queryset().filter(status="approved"),
+            fallback,
         )
 
+        similar_franchises = attach_card_file_urls(similar_franchises, "franchise")
         context = {
             "similar_franchises": similar_franchises,
         }
-        if similar_franchises.count() < 4:
+        if len(similar_franchises) < 4:
             return HttpResponse("")
         return render(request, "accounts/partials/_similar_franchise_cards.html", context)
     except Exception as e:
@@ -6972,18 +6421,23 @@ def load_similar_franchises(request, franchise_id: int):
 @login_required
 def load_similar_agencies(request, franchise_id: int):
     try:
-        agency = get_object_or_404(Agencies, agency_id=franchise_id)
-        if agency.customization_data and "agency_category" in agency.customization_data:
-            similar_qs = (
-                Agencies.objects.filter(
+        def fallback():
+            agency = get_object_or_404(Agencies, agency_id=franchise_id)
+            candidates_qs = Agencies.card_queryset().filter(status="approved")
+            pool_key = "approved_agencies"
+            if agency.customization_data and "agency_category" in agency.customization_data:
+                candidates_qs = candidates_qs.filter(
                     customization_data__agency_category=agency.customization_data.get("agency_category"),
-                    status="approved",
                 )
-                .exclude(agency_id=agency.agency_id)
-                .order_by("?")[:4]
-            )
-        else:
-            similar_qs = Agencies.objects.filter(status="approved").exclude(agency_id=agency.agency_id).order_by("?")[:4]
+                pool_key += f":category:{agency.customization_data.get('agency_category')}"
+            return random_sample(candidates_qs, 4, pool_key, exclude=[agency.agency_id])
+        similar_qs = similar_entities(
+            "agency",
+            franchise_id,
+            Agencies.card_queryset().filter(status="approved"),
+            fallback,
+        )
+        similar_qs = attach_card_file_urls(similar_qs, "agency")
         html = render_to_string(
             "accounts/partials/_similar_agency_cards.html",
             {"similar_franchises": similar_qs, "request": request},
@@ -6996,18 +6450,23 @@ def load_similar_agencies(request, franchise_id: int):
 @login_required
 def load_similar_specialists(request, specialist_id: int):
     try:
-        specialist = get_object_or_404(Specialists, specialist_id=specialist_id)
-        if specialist.customization_data and "specialist_category" in specialist.customization_data:
-            similar_qs = (
-                Specialists.objects.filter(
+        def fallback():
+            specialist = get_object_or_404(Specialists, specialist_id=specialist_id)
+            candidates_qs = Specialists.card_queryset().filter(status="approved")
+            pool_key = "approved_specialists"
+            if specialist.customization_data and "specialist_category" in specialist.customization_data:
+                candidates_qs = candidates_qs.filter(
                     customization_data__specialist_category=specialist.customization_data.get("specialist_category"),
-                    status="approved",
                 )
-                .exclude(specialist_id=specialist.specialist_id)
-                .order_by("?")[:4]
-            )
-        else:
-            similar_qs = Specialists.objects.filter(status="approved").exclude(specialist_id=specialist.specialist_id).order_by("?")[:4]
+                pool_key += f":category:{specialist.customization_data.get('specialist_category')}"
+            return random_sample(candidates_qs, 4, pool_key, exclude=[specialist.specialist_id])
+        similar_qs = similar_entities(
+            "specialist",
+            specialist_id,
+            Specialists.card_queryset().filter(status="approved"),
+            fallback,
+        )
+        similar_qs = attach_card_file_urls(similar_qs, "specialist")
         html = render_to_string(
             "accounts/partials/_similar_specialist_cards.html",
             {"similar_specialists": similar_qs, "request": request},
@@ -7024,7 +6483,9 @@ def delete_startup_comment(request, comment_id: int):
     if not hasattr(request.user, "role") or (request.user.role.role_name or "") != "moderator":
         return JsonResponse({"success": False, "error": "Нет прав"}, status=403)
     comment = get_object_or_404(Comments, pk=comment_id)
+    startup = comment.startup_id
     comment.delete()
+    startup.update_counters("comments_count")
     return JsonResponse({"success": True})
 
 @login_required
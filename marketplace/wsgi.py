@@ -11,6 +11,8 @@ from django.core.wsgi import get_wsgi_application
 from whitenoise import WhiteNoise
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "marketplace.settings")
 application = get_wsgi_application()
+from accounts.search import start_title_index_warmup
+start_title_index_warmup()
 application = WhiteNoise(
     application, root=os.path.join(os.path.dirname(__file__), "..", "staticfiles")
 )
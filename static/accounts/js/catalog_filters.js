@@ -27,7 +27,7 @@
     var seenKeys = new Set();
     formData.forEach(function (value, key) {
       if (value !== null && value !== undefined && String(value).length > 0) {
-        if (key === 'page') {
+        if (key === 'page' || key === 'cursor') {
           return;
         }
         if (key === 'sort_order' && String(value) === 'newest') {
@@ -207,7 +207,7 @@
     history.pushState({}, '', newUrl);
 
 
-    bindPaginationHandlers();
+    bindLoadMoreHandler();
     bindFormHandlers();
     attachSliderListenersWithRetry(20, 200);
     clearButtonElement = document.getElementById('clearFiltersBtn');
@@ -237,6 +237,7 @@
 
 
     if (!keepPageParam) merged.delete('page');
+    merged.delete('cursor');
 
 
     try {
@@ -417,27 +418,37 @@
     });
   }
 
-  function bindPaginationHandlers() {
-    var container = document.querySelector('.pagination-numbers');
-    if (!container) return;
-    var links = container.querySelectorAll('a[href]');
-    links.forEach(function (link) {
-      link.addEventListener('click', function (e) {
-        e.preventDefault();
-        var targetUrl = new URL(link.href);
-        var targetParams = new URLSearchParams(targetUrl.search);
-
-
-        var formParams = serializeFormToParams(filterFormElement);
-
-        var pageValue = targetParams.get('page');
-        if (pageValue !== null) {
-          formParams.set('page', pageValue);
-        }
-
-        var finalUrl = buildUrlWithParams(formParams, true);
-        fetchAndUpdate(finalUrl);
-      });
+  function bindLoadMoreHandler() {
+    var container = paginationContainerElement || findPaginationContainer(document);
+    var button = container ? container.querySelector('.show-more-btn[data-next-cursor]') : null;
+    if (!button) return;
+    button.addEventListener('click', function () {
+      var params = serializeFormToParams(filterFormElement);
+      params.set('cursor', button.getAttribute('data-next-cursor'));
+      button.disabled = true;
+
+      fetch(buildUrlWithParams(params, false), {
+        credentials: 'same-origin',
+        headers: { 'X-Requested-With': 'XMLHttpRequest' }
+      })
+        .then(function (response) {
+          if (!response.ok) throw new Error('HTTP ' + response.status);
+          return response.json();
+        })
+        .then(function (data) {
+          var grid = gridElement || findGridElement(document);
+          if (grid && data.html) {
+            grid.insertAdjacentHTML('beforeend', data.html);
+            document.dispatchEvent(new CustomEvent('catalog:cards-appended', { detail: { container: grid } }));
+          }
+          if (data.next_cursor) {
+            button.setAttribute('data-next-cursor', data.next_cursor);
+            button.disabled = false;
+          } else {
+            button.remove();
+          }
+        })
+        .catch(function () { button.disabled = false; });
     });
   }
 
@@ -456,7 +467,7 @@
     }, 0);
 
     bindFormHandlers();
-    bindPaginationHandlers();
+    bindLoadMoreHandler();
     attachSliderListenersWithRetry(20, 200);
     clearButtonElement = document.getElementById('clearFiltersBtn');
     bindClearButton();
@@ -0,0 +1,71 @@
+// Прямая загрузка файлов в бакет по presigned POST: файлы не проходят через сервер приложения
+window.DirectUpload = (function () {
+  function postJSON(url, payload, csrfToken) {
+    return fetch(url, {
+      method: 'POST',
+      headers: Object.assign(
+        { 'Content-Type': 'application/json', 'X-Requested-With': 'XMLHttpRequest' },
+        csrfToken ? { 'X-CSRFToken': csrfToken } : {}
+      ),
+      body: JSON.stringify(payload),
+      credentials: 'same-origin',
+    }).then(function (res) {
+      return res.json().then(function (data) {
+        if (!res.ok) throw data
+        return data
+      })
+    })
+  }
+  function sendToStorage(upload, file) {
+    var formData = new FormData()
+    Object.keys(upload.fields).forEach(function (name) {
+      formData.append(name, upload.fields[name])
+    })
+    formData.append('file', file)
+    return fetch(upload.url, { method: 'POST', body: formData }).then(function (res) {
+      if (!res.ok) throw new Error('HTTP ' + res.status)
+      return upload
+    })
+  }
+  // options: presignUrl, confirmUrl, csrfToken, entityType, entityId, files: [{ fileType, file }]
+  function uploadAll(options) {
+    var entity = { entity_type: options.entityType, entity_id: options.entityId }
+    var files = options.files || []
+    if (!files.length) return Promise.resolve({ confirmed: [], file_save_errors: [] })
+    var errors = []
+    return postJSON(options.presignUrl, Object.assign({
+      files: files.map(function (it) {
+        return { file_type: it.fileType, name: it.file.name, content_type: it.file.type, size: it.file.size }
+      }),
+    }, entity), options.csrfToken).then(function (data) {
+      errors = errors.concat(data.errors || [])
+      var byName = {}
+      files.forEach(function (it) {
+        var key = it.fileType + '/' + it.file.name
+        byName[key] = byName[key] || []
+        byName[key].push(it.file)
+      })
+      return Promise.all((data.uploads || []).map(function (upload) {
+        var candidates = byName[upload.file_type + '/' + (upload.original_name || '')] || []
+        var file = candidates.shift()
+        if (!file) {
+          errors.push({ field: upload.file_type, file: upload.original_name, error: 'Файл не найден' })
+          return null
+        }
+        return sendToStorage(upload, file).then(function () {
+          return { file_id: upload.file_id, file_type: upload.file_type, key: upload.key, name: file.name }
+        }).catch(function () {
+          errors.push({ field: upload.file_type, file: file.name, error: 'Не удалось загрузить файл' })
+          return null
+        })
+      }))
+    }).then(function (uploaded) {
+      var done = uploaded.filter(Boolean)
+      if (!done.length) return { confirmed: [], file_save_errors: errors }
+      return postJSON(options.confirmUrl, Object.assign({ files: done }, entity), options.csrfToken).then(function (data) {
+        return { confirmed: data.confirmed || [], file_save_errors: errors.concat(data.file_save_errors || []) }
+      })
+    })
+  }
+  return { uploadAll: uploadAll }
+})()
@@ -0,0 +1,64 @@
+// Прямая загрузка файлов для форм создания франшизы, агентства и специалиста: форма уходит
+// AJAX-ом без файлов, после создания записи файлы загружаются в бакет через DirectUpload.
+// Если запись не создана (ошибки полей, сбой сети), форма отправляется обычным способом с файлами.
+document.addEventListener('DOMContentLoaded', function () {
+  var FILE_FIELDS = [['logo', 'logo'], ['creatives', 'creative'], ['proofs', 'proof'], ['video', 'video']]
+  function redirectAfterUpload(form, data, directFiles, csrfToken) {
+    return window.DirectUpload.uploadAll({
+      presignUrl: form.dataset.presignUrl,
+      confirmUrl: form.dataset.confirmUrl,
+      csrfToken: csrfToken,
+      entityType: data.entity_type,
+      entityId: data.entity_id,
+      files: directFiles,
+    }).then(function (result) {
+      return (data.file_save_errors || []).concat(result.file_save_errors)
+    }, function () {
+      return (data.file_save_errors || []).concat(directFiles.map(function (it) {
+        return { field: it.fileType, file: it.file.name }
+      }))
+    }).then(function (errors) {
+      if (errors.length && typeof window.showNotification === 'function') {
+        var names = errors.map(function (it) { return it.file || it.field }).join(', ')
+        window.showNotification('Часть файлов не сохранилась: ' + names, 'error', 5000)
+        setTimeout(function () { window.location.assign(data.redirect_url) }, 3000)
+        return
+      }
+      window.location.assign(data.redirect_url)
+    })
+  }
+  document.querySelectorAll('form[data-presign-url][data-confirm-url]').forEach(function (form) {
+    // обработчик регистрируется после встроенной валидации страницы и пропускает отклонённые ею отправки
+    form.addEventListener('submit', function (e) {
+      if (e.defaultPrevented || !window.DirectUpload || !window.fetch) return
+      e.preventDefault()
+      var formData = new FormData(form)
+      var directFiles = []
+      FILE_FIELDS.forEach(function (pair) {
+        formData.getAll(pair[0]).forEach(function (file) {
+          if (file && file.name) directFiles.push({ fileType: pair[1], file: file })
+        })
+        formData.delete(pair[0])
+      })
+      formData.append('direct_upload', '1')
+      var csrfInput = form.querySelector('input[name="csrfmiddlewaretoken"]')
+      var csrfToken = csrfInput ? csrfInput.value : null
+      fetch(form.action || window.location.href, {
+        method: 'POST',
+        headers: Object.assign({ 'X-Requested-With': 'XMLHttpRequest' }, csrfToken ? { 'X-CSRFToken': csrfToken } : {}),
+        body: formData,
+        credentials: 'same-origin',
+      }).then(function (res) {
+        return res.json().then(function (data) {
+          if (!res.ok || !data.success || !data.entity_id) throw data
+          return data
+        })
+      }).then(function (data) {
+        return redirectAfterUpload(form, data, directFiles, csrfToken)
+      }, function () {
+        // обычная отправка вместе с файлами: сервер покажет ошибки полей в форме
+        form.submit()
+      })
+    })
+  })
+})
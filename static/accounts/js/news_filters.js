@@ -66,6 +66,7 @@
 
 
     if (!keepPageParam) merged.delete('page');
+    merged.delete('cursor');
 
 
     params.forEach(function (value, key) {
@@ -97,7 +98,7 @@
     history.pushState({}, '', newUrl);
 
 
-    bindNewsPaginationHandlers();
+    bindNewsLoadMoreHandler();
     bindFormHandlers();
     bindDeleteNewsHandlers();
   }
@@ -119,13 +120,13 @@
       if (!response.ok) {
         throw new Error('HTTP error! status: ' + response.status);
       }
-      return response.text();
+      return response.json();
     })
-    .then(function (htmlText) {
-      if (!htmlText || htmlText.trim().length === 0) {
+    .then(function (data) {
+      if (!data || !data.html) {
         throw new Error('Empty response received');
       }
-      updateNewsFromHtmlResponse(htmlText, url);
+      updateNewsFromHtmlResponse(data.html, url);
     })
     .catch(function (error) {
       if (error && error.name === 'AbortError') return;
@@ -189,31 +190,44 @@
     }
   }
 
-  function bindNewsPaginationHandlers() {
-    var paginationContainer = document.querySelector('.pagination');
-    if (!paginationContainer) return;
+  function bindNewsLoadMoreHandler() {
+    var loadMoreButton = document.querySelector('.pagination .show-more-btn');
+    if (!loadMoreButton) return;
 
-    var pageLinks = paginationContainer.querySelectorAll('a[href]');
-    pageLinks.forEach(function(link) {
+    loadMoreButton.addEventListener('click', function () {
+      var url = new URL(window.location.href);
+      url.searchParams.set('cursor', loadMoreButton.getAttribute('data-next-cursor'));
+      loadMoreButton.disabled = true;
 
-      link.removeEventListener('click', link._paginationHandler);
-
-      var handler = function(e) {
-        e.preventDefault();
-        var href = this.getAttribute('href');
-        if (href && href.includes('page=')) {
-          var url = new URL(window.location.href);
-          var pageParam = new URLSearchParams(href.substring(1)).get('page');
-          if (pageParam) {
-            url.searchParams.set('page', pageParam);
-            fetchAndUpdate(url.toString());
-          }
+      fetch(url.toString(), {
+        credentials: 'same-origin',
+        headers: {
+          'X-Requested-With': 'XMLHttpRequest'
         }
-      };
-
-
-      link._paginationHandler = handler;
-      link.addEventListener('click', handler);
+      })
+      .then(function (response) {
+        if (!response.ok) {
+          throw new Error('HTTP error! status: ' + response.status);
+        }
+        return response.json();
+      })
+      .then(function (data) {
+        var grid = newsGridElement || findNewsGrid(document);
+        if (grid && data.html) {
+          grid.insertAdjacentHTML('beforeend', data.html);
+        }
+        if (data.next_cursor) {
+          loadMoreButton.setAttribute('data-next-cursor', data.next_cursor);
+          loadMoreButton.disabled = false;
+        } else {
+          loadMoreButton.remove();
+        }
+        bindDeleteNewsHandlers();
+      })
+      .catch(function (error) {
+        console.error('Error loading more news:', error);
+        loadMoreButton.disabled = false;
+      });
     });
   }
 
@@ -245,7 +259,7 @@
     }
 
     bindFormHandlers();
-    bindNewsPaginationHandlers();
+    bindNewsLoadMoreHandler();
     bindDeleteNewsHandlers();
 
 
@@ -257,9 +271,9 @@
           'X-Requested-With': 'XMLHttpRequest'
         }
       })
-      .then(function (r) { return r.text(); })
-      .then(function (htmlText) {
-        updateNewsFromHtmlResponse(htmlText, url);
+      .then(function (r) { return r.json(); })
+      .then(function (data) {
+        updateNewsFromHtmlResponse(data.html, url);
       })
       .catch(function () { window.location.reload(); });
     });
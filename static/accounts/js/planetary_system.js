@@ -106,6 +106,14 @@
       ultraNewPlanetaryIsStartuper = data.isStartuper || false;
       ultraNewPlanetaryLogoImage = data.logoImage || '';
       ultraNewPlanetaryAllStartupsData = data.allStartupsData || [];
+      if (ultraNewPlanetaryUrls.planetsSnapshot) {
+        fetch(ultraNewPlanetaryUrls.planetsSnapshot)
+          .then(response => response.json())
+          .then(startups => {
+            ultraNewPlanetaryAllStartupsData = startups;
+          })
+          .catch(error => console.warn('Planets snapshot loading error:', error));
+      }
       ultraNewPlanetaryCategoriesTotal = ultraNewPlanetaryDirectionsData.length;
       setTimeout(() => {
         ultraNewPlanetaryUpdateArrowStates();
@@ -345,6 +345,18 @@ document.addEventListener('DOMContentLoaded', function () {
         var formData = new FormData(startupForm)
         var csrfInput = startupForm.querySelector('input[name="csrfmiddlewaretoken"]')
         var csrfToken = csrfInput ? csrfInput.value : null
+        // файлы уходят напрямую в хранилище после создания стартапа
+        var directFiles = []
+        var useDirectUpload = !!(window.DirectUpload && startupForm.dataset.presignUrl && startupForm.dataset.confirmUrl)
+        if (useDirectUpload) {
+          [['logo', 'logo'], ['creatives', 'creative'], ['proofs', 'proof'], ['video', 'video']].forEach(function (pair) {
+            formData.getAll(pair[0]).forEach(function (file) {
+              if (file && file.name) directFiles.push({ fileType: pair[1], file: file })
+            })
+            formData.delete(pair[0])
+          })
+          formData.append('direct_upload', '1')
+        }
         fetch(startupForm.action || window.location.href, {
           method: 'POST',
           headers: Object.assign({ 'X-Requested-With': 'XMLHttpRequest' }, csrfToken ? { 'X-CSRFToken': csrfToken } : {}),
@@ -353,6 +365,24 @@ document.addEventListener('DOMContentLoaded', function () {
         }).then(function (res) {
           if (!res.ok) return res.json().then(function (data) { throw data })
           return res.json()
+        }).then(function (data) {
+          if (!useDirectUpload || !data || !data.success || !data.entity_id) return data
+          return window.DirectUpload.uploadAll({
+            presignUrl: startupForm.dataset.presignUrl,
+            confirmUrl: startupForm.dataset.confirmUrl,
+            csrfToken: csrfToken,
+            entityType: data.entity_type,
+            entityId: data.entity_id,
+            files: directFiles,
+          }).then(function (result) {
+            data.file_save_errors = (data.file_save_errors || []).concat(result.file_save_errors)
+            return data
+          }, function () {
+            data.file_save_errors = (data.file_save_errors || []).concat(directFiles.map(function (it) {
+              return { field: it.fileType, file: it.file.name }
+            }))
+            return data
+          })
         }).then(function (data) {
           if (data && data.success && data.redirect_url) {
             if (data.file_save_errors && data.file_save_errors.length) {